@@ -0,0 +1,572 @@
+# Benchmark API dengan data seed dalam jumlah besar.
+# Contoh:
+#   python bench.py seed --penjualan 1000000 --tahun 5
+#   python bench.py run --output hasil.json
+#   python bench.py run --mock --penjualan 20000 --tahun 1 --output hasil.json   (tanpa MongoDB)
+#   python bench.py bandingkan lama.json baru.json
+#   python bench.py cek-cache --url http://localhost:8001   (server dengan --workers > 1)
+#
+# Database default "tempe_bench" (BENCH_DB_NAME), jangan arahkan ke database produksi.
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+import typer
+
+cli = typer.Typer(help="Benchmark API backend Oma Tempe Ayu")
+
+SEED_BATCH = 10000
+KATEGORI_PENGELUARAN = ["kedelai", "plastik", "ragi", "air", "listrik"]
+
+
+@dataclass
+class Volume:
+    tahun: int
+    penjualan: int
+    rasio_return: float
+    pengeluaran_per_hari: int
+    karyawan: int
+    pekerja_per_hari: int
+    pembeli: int
+
+
+def siapkan_server(mock: bool, db_name: str):
+    # server.py membaca env saat import, jadi env & patch mock harus dipasang sebelum import
+    os.environ["DB_NAME"] = db_name
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    if mock:
+        try:
+            from tests.mock_mongo import pasang_mongomock
+            pasang_mongomock()
+        except ImportError:
+            raise typer.BadParameter("--mock butuh paket mongomock-motor (pip install mongomock-motor)")
+    import server
+    return server
+
+
+def rng_uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def rng_timestamp(rng: random.Random, tanggal: date) -> str:
+    jam = datetime(tanggal.year, tanggal.month, tanggal.day, tzinfo=timezone.utc) + timedelta(seconds=rng.randrange(86400))
+    return jam.isoformat()
+
+
+async def insert_bertahap(koleksi, docs):
+    # docs berupa generator; ditulis per SEED_BATCH supaya memori tetap kecil
+    batch = []
+    total = 0
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= SEED_BATCH:
+            await koleksi.insert_many(batch, ordered=False)
+            total += len(batch)
+            batch = []
+    if batch:
+        await koleksi.insert_many(batch, ordered=False)
+        total += len(batch)
+    return total
+
+
+async def seed_data(server, vol: Volume, seed: int, sampai: date) -> dict:
+    # Semua data dibuat dari satu Random(seed) -> isi database identik di setiap run
+    from harga import HARGA_AWAL
+    from kalender import kolom_tanggal
+    from pembeli import migrasi_pembeli
+    from piutang import rebuild_piutang
+    from stok import rebuild_stok_harian
+
+    db = server.db
+    rng = random.Random(seed)
+    hari = [sampai - timedelta(days=i) for i in range(vol.tahun * 365 - 1, -1, -1)]
+
+    # Data + semua turunan/penanda: penanda migrasi, versi ETag, audit & rollup dari run sebelumnya
+    # ikut dibuang supaya setiap seed mulai dari kondisi yang sama persis
+    for nama in ("penjualan", "return_penjualan", "produksi_harian", "pengeluaran", "karyawan", "gaji",
+                 "stok_harian", "stok_berjalan", "piutang", "piutang_harian", "pembeli", "laba_rollup", "harga",
+                 "migrasi", "versi", "audit"):
+        await db[nama].drop()
+    await server.startup_event()
+
+    karyawan = [{
+        "id": rng_uuid(rng),
+        "id_user": rng_uuid(rng),
+        "nama": f"Karyawan {i + 1}",
+        "nomor": f"08{rng.randrange(10**9, 10**10)}",
+        "gaji_harian": rng.choice([50000, 60000, 75000]),
+        "status_aktif": True,
+        "created_at": rng_timestamp(rng, hari[0]),
+    } for i in range(vol.karyawan)]
+    if karyawan:
+        await db.karyawan.insert_many(karyawan)
+
+    produksi = [{
+        "id": rng_uuid(rng),
+        **kolom_tanggal(t),
+        "kedelai_kg": round(rng.uniform(20, 60), 1),
+        "tempe_3k_produksi": rng.randrange(100, 400),
+        "tempe_5k_produksi": rng.randrange(100, 400),
+        "tempe_10k_produksi": rng.randrange(50, 200),
+        "stat_exp": t < sampai - timedelta(days=3),
+        "created_at": rng_timestamp(rng, t),
+    } for t in hari]
+    for p in produksi:
+        p["total_produksi"] = p["tempe_3k_produksi"] + p["tempe_5k_produksi"] + p["tempe_10k_produksi"]
+    await insert_bertahap(db.produksi_harian, iter(produksi))
+
+    def gen_gaji():
+        for p in produksi:
+            for k in rng.sample(karyawan, min(vol.pekerja_per_hari, len(karyawan))):
+                lunas = p["tanggal"] < (sampai - timedelta(days=14)).isoformat()
+                yield {
+                    "id": rng_uuid(rng),
+                    "id_produksi": p["id"],
+                    "id_karyawan": k["id"],
+                    "tanggal_produksi": p["tanggal"],
+                    "nominal": k["gaji_harian"] if lunas else 0,
+                    "status_bayar": lunas,
+                    "created_at": rng_timestamp(rng, date.fromisoformat(p["tanggal"])),
+                }
+
+    def gen_pengeluaran():
+        for t in hari:
+            for _ in range(vol.pengeluaran_per_hari):
+                yield {
+                    "id": rng_uuid(rng),
+                    **kolom_tanggal(t),
+                    "kategori_pengeluaran": rng.choice(KATEGORI_PENGELUARAN),
+                    "jumlah": rng.randrange(10, 500) * 1000,
+                    "keterangan": "",
+                    "created_at": rng_timestamp(rng, t),
+                }
+
+    nama_pembeli = [f"Pembeli {i + 1}" for i in range(vol.pembeli)]
+    retur = []
+
+    def gen_penjualan():
+        for _ in range(vol.penjualan):
+            t = rng.choice(hari)
+            kategori = "Grosir" if rng.random() < 0.3 else "Eceran"
+            harga = HARGA_AWAL[kategori]
+            pcs = {sku: rng.randrange(0, 20) for sku in ("3k", "5k", "10k")}
+            subtotal = {sku: pcs[sku] * harga[sku] for sku in pcs}
+            doc = {
+                "id": rng_uuid(rng),
+                **kolom_tanggal(t),
+                "tanggal_penjualan": t.isoformat(),
+                "pembeli": rng.choice(nama_pembeli),
+                "kategori_pembeli": kategori,
+                **{f"tempe_{sku}_pcs": n for sku, n in pcs.items()},
+                **{f"subtotal_{sku}": n for sku, n in subtotal.items()},
+                "total_penjualan": sum(subtotal.values()),
+                "harga_versi": 1,
+                "status_pembayaran": "Tempo" if rng.random() < 0.15 else "Lunas",
+                "created_at": rng_timestamp(rng, t),
+            }
+            if rng.random() < vol.rasio_return and any(pcs.values()):
+                qty = {sku: rng.randrange(0, n + 1) for sku, n in pcs.items()}
+                t_ret = min(t + timedelta(days=rng.randrange(0, 3)), sampai)
+                retur.append({
+                    "id": rng_uuid(rng),
+                    **kolom_tanggal(t_ret),
+                    "penjualan_id": doc["id"],
+                    **{f"tempe_{sku}_return": n for sku, n in qty.items()},
+                    "total_return": sum(qty[sku] * harga[sku] for sku in qty),
+                    "keterangan": "",
+                    "created_at": rng_timestamp(rng, t_ret),
+                })
+            yield doc
+
+    hasil = {
+        "produksi_harian": len(produksi),
+        "karyawan": len(karyawan),
+        "gaji": await insert_bertahap(db.gaji, gen_gaji()),
+        "pengeluaran": await insert_bertahap(db.pengeluaran, gen_pengeluaran()),
+        "penjualan": await insert_bertahap(db.penjualan, gen_penjualan()),
+    }
+    hasil["return_penjualan"] = await insert_bertahap(db.return_penjualan, iter(retur))
+
+    # Ledger & turunan dibangun dengan jalur yang sama seperti deploy sungguhan
+    await server.backfill_retur_penjualan()
+    await migrasi_pembeli(db)
+    await rebuild_stok_harian(db)
+    await rebuild_piutang(db)
+    return hasil
+
+
+async def ambil_sampel(db, seed: int) -> dict:
+    # Id yang dipakai route dengan path parameter / filter
+    async def ids(koleksi, filter_=None, n=200):
+        return [d["id"] async for d in db[koleksi].find(filter_ or {}, {"_id": 0, "id": 1}).limit(n)]
+
+    sampel = {
+        "penjualan": await ids("penjualan"),
+        "gaji": await ids("gaji", {"status_bayar": False}),
+        "karyawan": await db.karyawan.find({}, {"_id": 0}).to_list(None),
+        "produksi": await db.produksi_harian.find({}, {"_id": 0, "id": 1, "tanggal": 1}).sort("tanggal", -1).to_list(50),
+        "pembeli": await ids("pembeli"),
+    }
+    ujung = await db.produksi_harian.find_one({}, {"_id": 0, "tanggal": 1}, sort=[("tanggal", -1)])
+    sampel["hari_terakhir"] = date.fromisoformat(ujung["tanggal"]) if ujung else date.today()
+    return sampel
+
+
+@dataclass
+class Rute:
+    nama: str
+    method: str
+    # fungsi (rng, sampel, nomor_request) -> (path, kwargs httpx)
+    buat: Callable
+
+
+def daftar_rute() -> List[Rute]:
+    def get(path, **params):
+        return lambda rng, s, i: (path, {"params": params} if params else {})
+
+    def hari(rng, s, maks=365):
+        return (s["hari_terakhir"] - timedelta(days=rng.randrange(maks))).isoformat()
+
+    def penjualan_baru(rng, s, i):
+        return "/penjualan", {"json": {
+            "tanggal": s["hari_terakhir"].isoformat(), "pembeli": f"Pembeli {rng.randrange(1, 50)}",
+            "kategori_pembeli": "Eceran", "tempe_3k_pcs": 1, "tempe_5k_pcs": 1, "tempe_10k_pcs": 1,
+            "status_pembayaran": rng.choice(["Lunas", "Tempo"]),
+        }}
+
+    def import_penjualan(rng, s, i):
+        baris = [json.dumps({
+            "tanggal": hari(rng, s, 30), "pembeli": f"Pembeli {rng.randrange(1, 50)}", "kategori_pembeli": "Grosir",
+            "tempe_3k_pcs": 2, "status_pembayaran": "Lunas",
+        }) for _ in range(100)]
+        return "/penjualan/import", {"content": "\n".join(baris), "headers": {"content-type": "application/x-ndjson"}}
+
+    def produksi_baru(rng, s, i):
+        # Tanggal acak jauh di masa depan supaya tidak bentrok dengan index unik tanggal
+        # (juga antar run di database yang sama)
+        t = s["hari_terakhir"] + timedelta(days=1000 + uuid.uuid4().int % 2_000_000)
+        return "/produksi", {"json": {
+            "tanggal": t.isoformat(), "kedelai_kg": 30, "tempe_3k_produksi": 100, "tempe_5k_produksi": 100,
+            "tempe_10k_produksi": 50, "pekerja": [k["id"] for k in s["karyawan"][:3]],
+        }}
+
+    def produksi_ubah(rng, s, i):
+        p = rng.choice(s["produksi"])
+        return f"/produksi/{p['id']}", {"json": {
+            "tanggal": p["tanggal"], "kedelai_kg": 30, "tempe_3k_produksi": rng.randrange(100, 400),
+            "tempe_5k_produksi": 100, "tempe_10k_produksi": 50,
+            "pekerja": [k["id"] for k in rng.sample(s["karyawan"], min(3, len(s["karyawan"])))],
+        }}
+
+    def karyawan_ubah(rng, s, i):
+        k = rng.choice(s["karyawan"])
+        return f"/karyawan/{k['id']}", {"json": {
+            "nama": k["nama"], "nomor": k["nomor"], "gaji_harian": k["gaji_harian"], "status_aktif": True,
+        }}
+
+    return [
+        # Baca
+        Rute("GET /penjualan", "GET", get("/penjualan")),
+        Rute("GET /penjualan?id_pembeli", "GET", lambda rng, s, i: ("/penjualan", {"params": {"id_pembeli": rng.choice(s["pembeli"])}})),
+        Rute("GET /penjualan?from&to", "GET", lambda rng, s, i: ("/penjualan", {"params": {"from": hari(rng, s, 60), "to": s["hari_terakhir"].isoformat()}})),
+        Rute("GET /return", "GET", get("/return")),
+        Rute("GET /produksi", "GET", get("/produksi")),
+        Rute("GET /pengeluaran", "GET", get("/pengeluaran")),
+        Rute("GET /karyawan", "GET", get("/karyawan")),
+        Rute("GET /gaji", "GET", get("/gaji")),
+        Rute("GET /gaji?id_karyawan", "GET", lambda rng, s, i: ("/gaji", {"params": {"id_karyawan": rng.choice(s["karyawan"])["id"]}})),
+        Rute("GET /stok", "GET", get("/stok")),
+        Rute("GET /stok/mon", "GET", get("/stok/mon")),
+        Rute("GET /stok/riwayat", "GET", get("/stok/riwayat")),
+        Rute("GET /stok/produk", "GET", get("/stok/produk")),
+        Rute("GET /dashboard/summary", "GET", lambda rng, s, i: ("/dashboard/summary", {"params": {"tanggal": hari(rng, s)}})),
+        Rute("GET /laporan/laba?period=daily", "GET", get("/laporan/laba", period="daily", limit=90)),
+        Rute("GET /laporan/laba?period=weekly", "GET", get("/laporan/laba", period="weekly", limit=52)),
+        Rute("GET /laporan/laba?period=monthly", "GET", get("/laporan/laba", period="monthly", limit=60)),
+        Rute("GET /harga", "GET", get("/harga")),
+        Rute("GET /pembeli?q", "GET", lambda rng, s, i: ("/pembeli", {"params": {"q": f"pembeli {rng.randrange(1, 10)}"}})),
+        Rute("GET /piutang", "GET", get("/piutang")),
+        Rute("GET /export/penjualan", "GET", lambda rng, s, i: ("/export/penjualan", {"params": {"from": hari(rng, s, 30), "to": s["hari_terakhir"].isoformat()}})),
+        # Tulis
+        Rute("POST /auth/login", "POST", lambda rng, s, i: ("/auth/login", {"json": {"username": "admin", "password": "admin123"}})),
+        Rute("POST /penjualan", "POST", penjualan_baru),
+        Rute("POST /penjualan/import (100 baris)", "POST", import_penjualan),
+        Rute("PATCH /penjualan/{id}/toggle-status", "PATCH", lambda rng, s, i: (f"/penjualan/{rng.choice(s['penjualan'])}/toggle-status", {})),
+        Rute("POST /return", "POST", lambda rng, s, i: ("/return", {"json": {"tanggal": s["hari_terakhir"].isoformat(), "penjualan_id": rng.choice(s["penjualan"]), "tempe_3k_return": 1}})),
+        Rute("POST /pengeluaran", "POST", lambda rng, s, i: ("/pengeluaran", {"json": {"tanggal": hari(rng, s, 30), "kategori_pengeluaran": "plastik", "jumlah": 15000}})),
+        Rute("POST /produksi", "POST", produksi_baru),
+        Rute("PUT /produksi/{id}", "PUT", produksi_ubah),
+        Rute("PATCH /produksi/{id}/update-exp", "PATCH", lambda rng, s, i: (f"/produksi/{rng.choice(s['produksi'])['id']}/update-exp", {"json": {"stat_exp": rng.random() < 0.5}})),
+        Rute("PUT /karyawan/{id}", "PUT", karyawan_ubah),
+        Rute("PATCH /gaji/{id}/verifikasi", "PATCH", lambda rng, s, i: (f"/gaji/{rng.choice(s['gaji'])}/verifikasi", {})),
+        Rute("PATCH /gaji/{id}/bayar", "PATCH", lambda rng, s, i: (f"/gaji/{rng.choice(s['gaji'])}/bayar", {})),
+        Rute("POST /gaji/bayar-batch", "POST", lambda rng, s, i: ("/gaji/bayar-batch", {"json": {"ids": rng.sample(s["gaji"], min(5, len(s["gaji"]))), "total_nominal": 300000, "nama_karyawan": "Karyawan 1"}})),
+    ]
+
+
+def persentil(nilai: List[float], p: float) -> float:
+    # Nearest-rank, cukup untuk perbandingan antar run
+    if not nilai:
+        return 0.0
+    urut = sorted(nilai)
+    k = max(0, min(len(urut) - 1, int(round(p / 100 * len(urut) + 0.5)) - 1))
+    return urut[k]
+
+
+async def ukur_rute(client, rute: Rute, sampel: dict, jumlah: int, concurrency: int, warmup: int, seed: int) -> dict:
+    rng = random.Random(f"{seed}:{rute.nama}")
+    antrian = iter(range(warmup + jumlah))
+    latensi = []
+    status: Dict[str, int] = {}
+    error = 0
+
+    async def worker():
+        nonlocal error
+        for i in antrian:
+            path, kwargs = rute.buat(rng, sampel, i)
+            mulai = time.perf_counter()
+            try:
+                r = await client.request(rute.method, "/api" + path, **kwargs)
+                await r.aread()
+                kode = str(r.status_code)
+            except Exception as e:
+                kode = type(e).__name__
+            durasi = (time.perf_counter() - mulai) * 1000
+            if i < warmup:
+                continue
+            latensi.append(durasi)
+            status[kode] = status.get(kode, 0) + 1
+            if not kode.startswith("2"):
+                error += 1
+
+    mulai = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    # Waktu total termasuk warm-up dikoreksi dengan proporsi request terukur
+    durasi = (time.perf_counter() - mulai) * jumlah / (warmup + jumlah)
+    return {
+        "requests": len(latensi),
+        "errors": error,
+        "status": status,
+        "p50_ms": round(persentil(latensi, 50), 2),
+        "p95_ms": round(persentil(latensi, 95), 2),
+        "p99_ms": round(persentil(latensi, 99), 2),
+        "mean_ms": round(sum(latensi) / len(latensi), 2) if latensi else 0.0,
+        "max_ms": round(max(latensi), 2) if latensi else 0.0,
+        "rps": round(len(latensi) / durasi, 1) if durasi > 0 else 0.0,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def opsi_volume(tahun, penjualan, rasio_return, pengeluaran_per_hari, karyawan, pekerja_per_hari, pembeli) -> Volume:
+    return Volume(tahun, penjualan, rasio_return, pengeluaran_per_hari, karyawan, pekerja_per_hari, pembeli)
+
+
+OPT_DB = typer.Option(os.environ.get("BENCH_DB_NAME", "tempe_bench"), "--db-name", help="Database khusus benchmark")
+OPT_MOCK = typer.Option(False, "--mock", help="Pakai mongomock-motor in-memory (tanpa MongoDB)")
+OPT_SEED = typer.Option(42, "--seed", help="Seed random (data & urutan request)")
+OPT_TAHUN = typer.Option(5, help="Jumlah tahun produksi harian")
+OPT_PENJUALAN = typer.Option(1_000_000, help="Jumlah dokumen penjualan")
+OPT_RASIO_RETURN = typer.Option(0.05, help="Proporsi penjualan yang punya return")
+OPT_PENGELUARAN = typer.Option(2, help="Pengeluaran per hari")
+OPT_KARYAWAN = typer.Option(15, help="Jumlah karyawan")
+OPT_PEKERJA = typer.Option(5, help="Pekerja (baris gaji) per hari produksi")
+OPT_PEMBELI = typer.Option(500, help="Jumlah pembeli berbeda")
+OPT_SAMPAI = typer.Option("2025-12-31", help="Tanggal terakhir data seed (tetap, supaya run bisa dibandingkan)")
+
+
+@cli.command()
+def seed(
+    db_name: str = OPT_DB, mock: bool = OPT_MOCK, seed: int = OPT_SEED,
+    tahun: int = OPT_TAHUN, penjualan: int = OPT_PENJUALAN, rasio_return: float = OPT_RASIO_RETURN,
+    pengeluaran_per_hari: int = OPT_PENGELUARAN, karyawan: int = OPT_KARYAWAN,
+    pekerja_per_hari: int = OPT_PEKERJA, pembeli: int = OPT_PEMBELI, sampai: str = OPT_SAMPAI,
+):
+    """Isi ulang database benchmark dengan data seed."""
+    server = siapkan_server(mock, db_name)
+    vol = opsi_volume(tahun, penjualan, rasio_return, pengeluaran_per_hari, karyawan, pekerja_per_hari, pembeli)
+
+    async def _run():
+        try:
+            return await seed_data(server, vol, seed, date.fromisoformat(sampai))
+        finally:
+            server.client.close()
+
+    typer.echo(json.dumps(asyncio.run(_run()), indent=2))
+
+
+@cli.command()
+def run(
+    db_name: str = OPT_DB, mock: bool = OPT_MOCK, seed: int = OPT_SEED,
+    url: Optional[str] = typer.Option(None, help="Base URL server yang sudah jalan (default: in-process)"),
+    reseed: bool = typer.Option(False, "--reseed", help="Seed ulang sebelum benchmark (otomatis jika --mock)"),
+    concurrency: int = typer.Option(10, help="Request paralel per route"),
+    requests: int = typer.Option(200, "--requests", help="Request terukur per route"),
+    warmup: int = typer.Option(10, help="Request pemanasan per route (tidak dihitung)"),
+    route: List[str] = typer.Option([], "--route", help="Hanya route yang namanya mengandung teks ini"),
+    output: Optional[str] = typer.Option(None, help="Tulis hasil JSON ke file (default: stdout)"),
+    tahun: int = OPT_TAHUN, penjualan: int = OPT_PENJUALAN, rasio_return: float = OPT_RASIO_RETURN,
+    pengeluaran_per_hari: int = OPT_PENGELUARAN, karyawan: int = OPT_KARYAWAN,
+    pekerja_per_hari: int = OPT_PEKERJA, pembeli: int = OPT_PEMBELI, sampai: str = OPT_SAMPAI,
+):
+    """Jalankan benchmark semua route /api dan laporkan p50/p95/p99 & throughput."""
+    import httpx
+
+    server = siapkan_server(mock, db_name)
+    vol = opsi_volume(tahun, penjualan, rasio_return, pengeluaran_per_hari, karyawan, pekerja_per_hari, pembeli)
+
+    async def _run():
+        seeded = None
+        if reseed or mock:
+            seeded = await seed_data(server, vol, seed, date.fromisoformat(sampai))
+        elif url is None:
+            await server.startup_event()
+        sampel = await ambil_sampel(server.db, seed)
+
+        if url:
+            transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=concurrency))
+            client = httpx.AsyncClient(base_url=url.rstrip("/"), transport=transport, timeout=120)
+        else:
+            client = httpx.AsyncClient(base_url="http://bench", transport=httpx.ASGITransport(app=server.app), timeout=120)
+
+        hasil = {}
+        try:
+            r = await client.post("/api/auth/login", json={"username": "admin", "password": "admin123"})
+            r.raise_for_status()
+            client.headers["Authorization"] = f"Bearer {r.json()['token']}"
+
+            for rute in daftar_rute():
+                if route and not any(r_ in rute.nama for r_ in route):
+                    continue
+                hasil[rute.nama] = await ukur_rute(client, rute, sampel, requests, concurrency, warmup, seed)
+                typer.echo(f"{rute.nama:45} p50={hasil[rute.nama]['p50_ms']:>9}ms "
+                           f"p95={hasil[rute.nama]['p95_ms']:>9}ms rps={hasil[rute.nama]['rps']:>8} "
+                           f"err={hasil[rute.nama]['errors']}", err=True)
+        finally:
+            await client.aclose()
+            if url is None:
+                await server.shutdown_db_client()
+            else:
+                server.client.close()
+
+        return {
+            "meta": {
+                "commit": git_commit(),
+                "waktu": datetime.now(timezone.utc).isoformat(),
+                "target": url or ("in-process (mongomock)" if mock else "in-process"),
+                "db_name": db_name,
+                "seed": seed,
+                "volume": vol.__dict__ if seeded is not None else None,
+                "seeded": seeded,
+                "concurrency": concurrency,
+                "requests_per_route": requests,
+                "warmup_per_route": warmup,
+            },
+            "routes": hasil,
+        }
+
+    laporan = json.dumps(asyncio.run(_run()), indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(laporan + "\n")
+    else:
+        typer.echo(laporan)
+
+
+@cli.command("cek-cache")
+def cek_cache(
+    url: str = typer.Option(..., help="Base URL server multi-worker, mis. uvicorn server:app --workers 4"),
+    putaran: int = typer.Option(5, help="Jumlah penulisan yang dicek"),
+    sebar: int = typer.Option(20, help="Request per putaran, masing-masing koneksi baru (tersebar ke worker)"),
+    batas_ms: int = typer.Option(2000, "--batas-ms", help="Batas waktu semua worker melihat penulisan"),
+):
+    """Cek cache dashboard antar worker: setelah pengeluaran dicatat, semua worker harus melihat totalnya."""
+    import httpx
+
+    base = url.rstrip("/")
+    hari_ini = date.today().isoformat()
+
+    async def _run():
+        async with httpx.AsyncClient(base_url=base, timeout=30) as c:
+            r = await c.post("/api/auth/login", json={"username": "admin", "password": "admin123"})
+            r.raise_for_status()
+            headers = {"Authorization": f"Bearer {r.json()['token']}"}
+
+        async def baca_tersebar() -> List[int]:
+            # Koneksi baru per request supaya tidak menempel di satu worker
+            async def satu():
+                async with httpx.AsyncClient(base_url=base, headers=headers, timeout=30) as c:
+                    r = await c.get("/api/dashboard/summary", params={"tanggal": hari_ini})
+                    r.raise_for_status()
+                    return r.json()["total_pengeluaran_hari_ini"]
+            return await asyncio.gather(*(satu() for _ in range(sebar)))
+
+        basi_total, lag, gagal = 0, [], 0
+        async with httpx.AsyncClient(base_url=base, headers=headers, timeout=30) as penulis:
+            for i in range(putaran):
+                # Isi cache semua worker dulu
+                awal = await baca_tersebar()
+                r = await penulis.post("/api/pengeluaran", json={
+                    "tanggal": hari_ini, "kategori_pengeluaran": "air", "jumlah": 1, "keterangan": "bench cek-cache",
+                })
+                r.raise_for_status()
+                target = max(awal) + 1
+                mulai = time.perf_counter()
+                while True:
+                    nilai = await baca_tersebar()
+                    basi = sum(1 for n in nilai if n < target)
+                    basi_total += basi
+                    ms = (time.perf_counter() - mulai) * 1000
+                    if not basi or ms > batas_ms:
+                        break
+                lag.append(round(ms, 1))
+                gagal += bool(basi)
+                typer.echo(f"putaran {i + 1}: {'OK' if not basi else 'BASI'} {ms:.1f}ms", err=True)
+        return {"putaran": putaran, "request_basi": basi_total, "lag_ms": lag, "ok": not gagal}
+
+    hasil = asyncio.run(_run())
+    typer.echo(json.dumps(hasil, indent=2))
+    if not hasil["ok"]:
+        raise typer.Exit(code=1)
+
+
+@cli.command()
+def bandingkan(
+    lama: str, baru: str,
+    ambang: float = typer.Option(20.0, help="Regresi p95 (%) yang dianggap gagal"),
+):
+    """Bandingkan dua hasil benchmark; exit 1 jika ada route yang p95-nya memburuk melewati ambang."""
+    with open(lama) as f:
+        a = json.load(f)["routes"]
+    with open(baru) as f:
+        b = json.load(f)["routes"]
+
+    regresi = []
+    for nama in sorted(set(a) & set(b)):
+        p95_lama, p95_baru = a[nama]["p95_ms"], b[nama]["p95_ms"]
+        selisih = (p95_baru - p95_lama) / p95_lama * 100 if p95_lama else 0.0
+        tanda = "REGRESI" if selisih > ambang else ""
+        typer.echo(f"{nama:45} p95 {p95_lama:>9} -> {p95_baru:>9} ms ({selisih:+.1f}%) {tanda}")
+        if tanda:
+            regresi.append(nama)
+
+    if regresi:
+        typer.echo(f"{len(regresi)} route memburuk > {ambang}%", err=True)
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    cli()
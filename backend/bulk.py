@@ -0,0 +1,134 @@
+import csv
+import io
+import json
+from collections import deque
+from typing import AsyncIterator, List, Optional, Tuple
+
+# Format yang didukung untuk import/export massal
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+
+
+def tebak_format(content_type: Optional[str], format: Optional[str]) -> str:
+    if format:
+        return format.lower()
+    if content_type and "csv" in content_type.lower():
+        return FORMAT_CSV
+    return FORMAT_NDJSON
+
+
+async def _baris_mentah(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # Pecah body request per baris tanpa menunggu seluruh body masuk memori
+    sisa = b""
+    async for chunk in stream:
+        sisa += chunk
+        *lengkap, sisa = sisa.split(b"\n")
+        for line in lengkap:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if sisa:
+        yield sisa.decode("utf-8-sig").rstrip("\r")
+
+
+class _AntreanBaris:
+    # Sumber baris untuk SATU csv.reader sepanjang stream, supaya status kutip terbawa
+    # antar baris (field berkutip boleh berisi baris baru, mis. keterangan/alamat).
+    # reader hanya dipanggil saat record sudah lengkap, jadi antrean tidak pernah kosong di tengah record.
+
+    def __init__(self):
+        self.baris = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.baris:
+            raise StopIteration
+        return self.baris.popleft()
+
+
+async def _record_csv(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[List[str]], Optional[str]]]:
+    # Hasil: (nomor baris awal record, kolom, error)
+    antrean = _AntreanBaris()
+    reader = csv.reader(antrean)
+    nomor = mulai = 0
+    kutip = 0
+    async for line in _baris_mentah(stream):
+        nomor += 1
+        if not antrean.baris and not line.strip():
+            continue
+        if not antrean.baris:
+            mulai = nomor
+        antrean.baris.append(line + "\n")
+        # Jumlah kutip ganjil = field berkutip belum ditutup, record lanjut di baris berikutnya
+        kutip += line.count('"')
+        if kutip % 2:
+            continue
+        kutip = 0
+        try:
+            yield mulai, next(reader), None
+        except csv.Error as e:
+            antrean.baris.clear()
+            yield mulai, None, f"CSV tidak valid: {e}"
+    if antrean.baris:
+        yield mulai, None, "CSV tidak valid: tanda kutip tidak ditutup"
+
+
+async def baca_baris(stream: AsyncIterator[bytes], format: str) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    # Hasil: (nomor_baris, data, error). Nomor baris mengikuti file asli (mulai 1);
+    # record CSV yang memakan beberapa baris memakai nomor baris awalnya.
+    if format == FORMAT_CSV:
+        header = None
+        async for nomor, values, error in _record_csv(stream):
+            if error:
+                yield nomor, None, error
+                continue
+            if header is None:
+                header = [h.strip() for h in values]
+                continue
+            if len(values) != len(header):
+                yield nomor, None, f"Jumlah kolom {len(values)}, seharusnya {len(header)}"
+                continue
+            # Kolom kosong dibuang supaya nilai default model yang dipakai
+            yield nomor, {k: v.strip() for k, v in zip(header, values) if v.strip() != ""}, None
+        return
+
+    nomor = 0
+    async for line in _baris_mentah(stream):
+        nomor += 1
+        if not line.strip():
+            continue
+
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield nomor, None, f"JSON tidak valid: {e}"
+            continue
+        if not isinstance(data, dict):
+            yield nomor, None, "Setiap baris harus berupa object JSON"
+            continue
+        yield nomor, data, None
+
+
+def pesan_validasi(error) -> str:
+    # Ringkas pydantic ValidationError jadi satu baris
+    return "; ".join(
+        f"{'.'.join(str(x) for x in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
+
+
+async def tulis_csv(cursor, kolom) -> AsyncIterator[str]:
+    # Header dulu, lalu satu baris CSV per dokumen langsung dari cursor
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(kolom)
+    yield buf.getvalue()
+    async for doc in cursor:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow(["" if doc.get(k) is None else doc.get(k) for k in kolom])
+        yield buf.getvalue()
+
+
+async def tulis_ndjson(cursor, kolom) -> AsyncIterator[str]:
+    async for doc in cursor:
+        yield json.dumps({k: doc.get(k) for k in kolom}, ensure_ascii=False) + "\n"
@@ -0,0 +1,56 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# Umur maksimal entry (detik) & jumlah entry per cache. Invalidasi utama tetap lewat
+# versi data (lihat versi.PelacakVersi); TTL hanya jaring pengaman.
+CACHE_TTL_DETIK = float(os.environ.get('CACHE_TTL_DETIK', '300'))
+CACHE_MAKS = int(os.environ.get('CACHE_MAKS', '256'))
+
+
+class CacheTTL:
+    # Cache in-process LRU + TTL. Entry hilang jika kadaluarsa, terdesak entry baru
+    # (yang paling lama tidak dipakai dibuang dulu), atau di-invalidate/clear saat
+    # versi data sumbernya berubah, termasuk penulisan yang ditangani worker lain.
+
+    def __init__(self, maks: int = CACHE_MAKS, ttl: float = CACHE_TTL_DETIK):
+        self.maks = maks
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # Nomor generasi, naik setiap invalidate/clear. Dipakai supaya hasil hitung
+        # yang mulai sebelum ada penulisan tidak disimpan sebagai cache.
+        self._epoch = 0
+        self._generasi: Dict[Hashable, int] = {}
+
+    def get(self, kunci: Hashable) -> Optional[Any]:
+        entry = self._data.get(kunci)
+        if entry is None:
+            return None
+        kadaluarsa, nilai = entry
+        if kadaluarsa < time.monotonic():
+            del self._data[kunci]
+            return None
+        self._data.move_to_end(kunci)
+        return nilai
+
+    def generasi(self, kunci: Hashable) -> tuple:
+        return self._epoch, self._generasi.get(kunci, 0)
+
+    def set(self, kunci: Hashable, nilai: Any, generasi: Optional[tuple] = None):
+        if generasi is not None and generasi != self.generasi(kunci):
+            return
+        self._data[kunci] = (time.monotonic() + self.ttl, nilai)
+        self._data.move_to_end(kunci)
+        while len(self._data) > self.maks:
+            self._data.popitem(last=False)
+
+    def invalidate(self, *kunci: Hashable):
+        for k in kunci:
+            self._generasi[k] = self._generasi.get(k, 0) + 1
+            self._data.pop(k, None)
+
+    def clear(self):
+        self._epoch += 1
+        self._generasi.clear()
+        self._data.clear()
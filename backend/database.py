@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import metrics
+from indexes import INDEX_SPEC
+from slowlog import pencatat_lambat
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(nama: str, default: int):
+    # Nilai kosong / 0 = pakai default driver (tanpa batas untuk timeout)
+    nilai = int(os.environ.get(nama) or default)
+    return nilai or None
+
+
+# Ukuran pool koneksi per proses (per worker uvicorn)
+MONGO_MIN_POOL = int(os.environ.get('MONGO_MIN_POOL', '5'))
+MONGO_MAX_POOL = int(os.environ.get('MONGO_MAX_POOL', '50'))
+# Request menunggu koneksi bebas paling lama ini (ms) sebelum gagal
+MONGO_WAIT_QUEUE_TIMEOUT_MS = _env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000)
+# Batas mencari server yang bisa dipakai (primary) dan membuka koneksi baru (ms)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = _env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)
+MONGO_CONNECT_TIMEOUT_MS = _env_int('MONGO_CONNECT_TIMEOUT_MS', 5000)
+# Batas satu operasi menunggu balasan MongoDB (ms). Rebuild besar lewat manage.py bisa butuh
+# lebih lama: set 0 untuk tanpa batas.
+MONGO_SOCKET_TIMEOUT_MS = _env_int('MONGO_SOCKET_TIMEOUT_MS', 30000)
+# Jumlah entry index yang dibaca per index saat warm-up (0 = lewati)
+MONGO_WARMUP_INDEX = int(os.environ.get('MONGO_WARMUP_INDEX', '1000'))
+# /health/ready gagal jika ping lebih lama dari ini (ms) atau pool hampir penuh
+READY_PING_TIMEOUT_MS = int(os.environ.get('READY_PING_TIMEOUT_MS', '1000'))
+READY_SATURASI_MAKS = float(os.environ.get('READY_SATURASI_MAKS', '0.9'))
+
+
+def buat_client(mongo_url: str) -> AsyncIOMotorClient:
+    # Listener metrics, pool & query lambat harus dipasang saat client dibuat
+    # (pymongo tidak bisa menambah listener belakangan)
+    return AsyncIOMotorClient(
+        mongo_url,
+        minPoolSize=MONGO_MIN_POOL,
+        maxPoolSize=MONGO_MAX_POOL,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        event_listeners=[metrics.PemantauMongo(), metrics.pemantau_pool, pencatat_lambat],
+    )
+
+# auto = pakai transaksi jika MongoDB replica set/sharded, on = wajib, off = tanpa transaksi
+MONGO_TRANSACTIONS = os.environ.get('MONGO_TRANSACTIONS', 'auto').lower()
+
+_state = {"client": None, "transaksi": False, "siap": False}
+
+
+async def init_transaksi(client) -> bool:
+    # Transaksi multi-dokumen hanya tersedia di replica set / mongos.
+    # MongoDB standalone (instalasi lokal default) jalan tanpa transaksi.
+    _state["client"] = client
+    if MONGO_TRANSACTIONS == 'off':
+        _state["transaksi"] = False
+        return False
+
+    hello = await client.admin.command("hello")
+    didukung = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+    if MONGO_TRANSACTIONS == 'on' and not didukung:
+        raise RuntimeError("MONGO_TRANSACTIONS=on tetapi MongoDB bukan replica set")
+    if not didukung:
+        logger.warning("MongoDB standalone: penulisan multi-dokumen berjalan tanpa transaksi")
+
+    _state["transaksi"] = didukung
+    return didukung
+
+
+async def jalankan_transaksi(fn):
+    # Jalankan fn(session) di dalam transaksi (dengan retry bawaan driver).
+    # Tanpa dukungan transaksi, fn dipanggil dengan session=None.
+    if not _state["transaksi"]:
+        return await fn(None)
+
+    async with await _state["client"].start_session() as session:
+        return await session.with_transaction(fn)
+
+
+# Migrasi data lama dicatat di koleksi `migrasi` (_id = nama migrasi) setelah selesai.
+# Startup berikutnya, di worker mana pun, cukup satu find_one by _id; migrasi yang filternya
+# tidak punya index (field $exists:false, $regex) tidak lagi men-scan koleksi setiap boot.
+async def sudah_migrasi(db, nama: str) -> bool:
+    return await db.migrasi.find_one({"_id": nama}, {"_id": 1}) is not None
+
+
+async def tandai_migrasi(db, nama: str, hasil=None):
+    await db.migrasi.update_one(
+        {"_id": nama},
+        {"$set": {"selesai_at": datetime.now(timezone.utc).isoformat(), "hasil": hasil}},
+        upsert=True
+    )
+
+
+async def migrasi_sekali(db, nama: str, fn):
+    # fn: coroutine function tanpa argumen. Hasil None = sudah pernah dijalankan.
+    if await sudah_migrasi(db, nama):
+        return None
+    hasil = await fn()
+    await tandai_migrasi(db, nama, hasil)
+    return hasil
+
+
+async def pemanasan(client, db) -> dict:
+    # Dijalankan saat startup sebelum worker dinyatakan siap:
+    # 1. buka minimal MONGO_MIN_POOL koneksi (ping bersamaan, tiap ping memegang satu koneksi)
+    # 2. baca awal tiap index wajib (covered scan, tanpa FETCH dokumen) supaya halaman index
+    #    yang paling sering dipakai (tanggal terbaru) sudah ada di cache MongoDB
+    mulai = time.perf_counter()
+    if MONGO_MIN_POOL > 0:
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(MONGO_MIN_POOL)))
+
+    index_dibaca = 0
+    if MONGO_WARMUP_INDEX > 0:
+        for koleksi, daftar in INDEX_SPEC.items():
+            for nama, keys, _ in daftar:
+                projection = {"_id": 0, **{field: 1 for field, _ in keys}}
+                try:
+                    await db[koleksi].find({}, projection).hint(nama).limit(MONGO_WARMUP_INDEX).to_list(None)
+                    index_dibaca += 1
+                except Exception as e:
+                    logger.info("Warm-up index %s.%s dilewati: %s", koleksi, nama, e)
+
+    durasi = round((time.perf_counter() - mulai) * 1000)
+    logger.info("Warm-up MongoDB selesai: %d koneksi, %d index, %dms", MONGO_MIN_POOL, index_dibaca, durasi)
+    return {"koneksi": MONGO_MIN_POOL, "index": index_dibaca, "ms": durasi}
+
+
+def tandai_siap(siap: bool):
+    _state["siap"] = siap
+
+
+async def cek_kesiapan(client) -> tuple:
+    # Hasil: (siap, detail) untuk /health/ready.
+    # Tidak siap jika startup/warm-up belum selesai, sedang shutdown, ping lambat/gagal,
+    # atau koneksi pool hampir habis (request baru akan antre).
+    pool = metrics.pemantau_pool.ringkasan()
+    pool["maks"] = MONGO_MAX_POOL
+    pool["saturasi"] = round(pool["dipakai"] / MONGO_MAX_POOL, 3) if MONGO_MAX_POOL else 0
+    detail = {"warm": _state["siap"], "pool": pool}
+
+    mulai = time.perf_counter()
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), READY_PING_TIMEOUT_MS / 1000)
+        detail["ping_ms"] = round((time.perf_counter() - mulai) * 1000, 2)
+    except Exception as e:
+        detail["ping_ms"] = None
+        detail["error"] = f"ping gagal: {e.__class__.__name__}"
+
+    siap = (
+        _state["siap"]
+        and detail["ping_ms"] is not None
+        and pool["saturasi"] < READY_SATURASI_MAKS
+    )
+    return siap, detail
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import os
+import zlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable, ClassVar, List, Optional, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+# Jumlah antrean (partisi). Event dengan kunci sama selalu masuk partisi yang sama,
+# jadi urutan per kunci terjaga; partisi berbeda diproses paralel.
+EVENT_PARTISI = int(os.environ.get('EVENT_PARTISI', '4'))
+# Kapasitas tiap antrean. Penuh -> penerbit menunggu (backpressure), bukan menumpuk di memori.
+EVENT_ANTREAN = int(os.environ.get('EVENT_ANTREAN', '1000'))
+# Batas tunggu saat shutdown untuk menghabiskan antrean (detik)
+EVENT_DRAIN_DETIK = float(os.environ.get('EVENT_DRAIN_DETIK', '5'))
+
+
+# --- Event domain ---
+# Diterbitkan endpoint tulis SETELAH data (dan ledger stok/piutang) tersimpan.
+# Ledger tetap ditulis di dalam transaksi endpoint, bukan oleh subscriber.
+
+@dataclass(frozen=True)
+class Event:
+    # Tanggal (YYYY-MM-DD) yang datanya berubah
+    tanggal: Tuple[str, ...] = ()
+    # Delta per tanggal (live.delta_hari): counter stok & angka dashboard
+    perubahan: Tuple[dict, ...] = ()
+    pembeli: Optional[str] = None
+    id_karyawan: Tuple[str, ...] = ()
+    user: Optional[str] = None
+
+    # Nama versi (ETag) yang berubah karena event ini
+    VERSI: ClassVar[Tuple[str, ...]] = ()
+
+    @property
+    def kunci(self) -> str:
+        # Kunci urutan: tanggal pertama yang tersentuh
+        return self.tanggal[0] if self.tanggal else ""
+
+    @property
+    def sku(self) -> Tuple[str, ...]:
+        # SKU yang stoknya berubah, diambil dari counter ledger (prod_3k -> 3k)
+        return tuple(sorted({k.split("_", 1)[1] for p in self.perubahan for k in p.get("stok", {})}))
+
+
+@dataclass(frozen=True)
+class PenjualanDicatat(Event):
+    VERSI = ("penjualan", "stok", "piutang", "pembeli")
+
+
+@dataclass(frozen=True)
+class StatusPenjualanDiubah(Event):
+    VERSI = ("penjualan", "piutang")
+
+
+@dataclass(frozen=True)
+class ReturnDicatat(Event):
+    # Counter retur di penjualan ikut berubah
+    VERSI = ("return_penjualan", "penjualan", "stok", "piutang")
+
+
+@dataclass(frozen=True)
+class ProduksiDicatat(Event):
+    VERSI = ("produksi_harian", "stok", "gaji")
+
+
+@dataclass(frozen=True)
+class ProduksiDiubah(Event):
+    # Status expired ikut pindah tanggal: stok berjalan berubah di luar delta
+    stok_dimuat_ulang: bool = False
+
+    VERSI = ("produksi_harian", "stok", "gaji")
+
+
+@dataclass(frozen=True)
+class StatusExpDiubah(Event):
+    VERSI = ("produksi_harian", "stok")
+
+
+@dataclass(frozen=True)
+class PengeluaranDicatat(Event):
+    VERSI = ("pengeluaran",)
+
+
+@dataclass(frozen=True)
+class GajiDibayar(Event):
+    # Bayar batch juga mencatat pengeluaran gaji
+    VERSI = ("gaji", "pengeluaran")
+
+
+@dataclass(frozen=True)
+class GajiDiubah(Event):
+    VERSI = ("gaji",)
+
+
+@dataclass(frozen=True)
+class KaryawanDiubah(Event):
+    VERSI = ("karyawan",)
+
+
+@dataclass(frozen=True)
+class HargaDiubah(Event):
+    VERSI = ("harga",)
+
+
+Handler = Callable[[Event], Awaitable[None]]
+
+
+class EventBus:
+    # Event bus async in-process.
+    # Subscriber "wajib" (versi ETag + cache, rollup) selesai sebelum terbitkan() kembali,
+    # jadi request berikutnya dari klien yang sama sudah melihat data baru.
+    # Subscriber lain (live, audit) berjalan di antrean latar terpisah per partisi:
+    # subscriber wajib event berikutnya tidak menunggu insert audit event sebelumnya.
+    # Antrean latar juga dibatasi; baru saat penuh partisi wajib ikut menunggu.
+
+    def __init__(self, partisi: int = EVENT_PARTISI, antrean: int = EVENT_ANTREAN):
+        self._jumlah_partisi = max(1, partisi)
+        self._ukuran_antrean = antrean
+        self._handler: List[Tuple[Tuple[Type[Event], ...], bool, Handler]] = []
+        self._antrean: List[asyncio.Queue] = []
+        self._antrean_latar: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def langganan(self, *tipe: Type[Event], wajib: bool = False):
+        # Dekorator: @bus.langganan(PenjualanDicatat, ReturnDicatat, wajib=True)
+        # Tanpa tipe = semua event. Subclass ikut terkirim (isinstance).
+        def daftar(fn: Handler) -> Handler:
+            self._handler.append((tipe or (Event,), wajib, fn))
+            return fn
+        return daftar
+
+    def _untuk(self, event: Event, wajib: bool) -> List[Handler]:
+        return [fn for tipe, w, fn in self._handler if w == wajib and isinstance(event, tipe)]
+
+    def mulai(self):
+        if self._tasks:
+            return
+        self._antrean = [asyncio.Queue(maxsize=self._ukuran_antrean) for _ in range(self._jumlah_partisi)]
+        self._antrean_latar = [asyncio.Queue(maxsize=self._ukuran_antrean) for _ in range(self._jumlah_partisi)]
+        self._tasks = [asyncio.create_task(self._pekerja(q, latar)) for q, latar in zip(self._antrean, self._antrean_latar)]
+        self._tasks += [asyncio.create_task(self._pekerja_latar(latar)) for latar in self._antrean_latar]
+
+    async def berhenti(self):
+        # Habiskan antrean (wajib dulu, lalu audit/live yang tertunda) lalu hentikan task partisi
+        if not self._tasks:
+            return
+        semua = self._antrean + self._antrean_latar
+        try:
+            await asyncio.wait_for(self._habiskan(), EVENT_DRAIN_DETIK)
+        except asyncio.TimeoutError:
+            logger.warning("Event bus berhenti, %d event belum diproses", sum(q.qsize() for q in semua))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _habiskan(self):
+        await asyncio.gather(*(q.join() for q in self._antrean))
+        await asyncio.gather(*(q.join() for q in self._antrean_latar))
+
+    async def terbitkan(self, event: Event):
+        if not self._tasks:
+            # Bus belum jalan (script, test): proses langsung
+            await self._jalankan(event, self._untuk(event, wajib=True))
+            await self._jalankan(event, self._untuk(event, wajib=False))
+            return
+        selesai = asyncio.get_running_loop().create_future()
+        q = self._antrean[zlib.crc32(event.kunci.encode()) % self._jumlah_partisi]
+        await q.put((event, selesai))
+        await selesai
+
+    async def _jalankan(self, event: Event, handler: List[Handler]):
+        for fn in handler:
+            try:
+                await fn(event)
+            except Exception:
+                # Satu subscriber gagal tidak boleh menghentikan subscriber lain / partisi
+                logger.exception("Subscriber %s gagal untuk %s", fn.__name__, type(event).__name__)
+
+    async def _pekerja(self, q: asyncio.Queue, latar: asyncio.Queue):
+        while True:
+            event, selesai = await q.get()
+            try:
+                await self._jalankan(event, self._untuk(event, wajib=True))
+                if not selesai.done():
+                    selesai.set_result(None)
+                # Partisi latar sama dengan partisi wajib: urutan per kunci tetap terjaga
+                handler = self._untuk(event, wajib=False)
+                if handler:
+                    await latar.put((event, handler))
+            finally:
+                if not selesai.done():
+                    selesai.cancel()
+                q.task_done()
+
+    async def _pekerja_latar(self, latar: asyncio.Queue):
+        while True:
+            event, handler = await latar.get()
+            try:
+                await self._jalankan(event, handler)
+            finally:
+                latar.task_done()
+
+
+bus = EventBus()
@@ -0,0 +1,81 @@
+import bisect
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from stok import SKUS
+
+logger = logging.getLogger(__name__)
+
+# Harga awal (sebelum ada versi harga di database)
+HARGA_AWAL = {
+    "Eceran": {"3k": 3000, "5k": 5000, "10k": 10000},
+    "Grosir": {"3k": 2500, "5k": 4000, "10k": 10000},
+}
+BERLAKU_AWAL = "1970-01-01"
+
+
+class TabelHarga:
+    # Salinan in-memory semua versi harga, urut berdasarkan tanggal berlaku.
+    # Penentuan harga penjualan murni lookup di memori, tanpa query database.
+
+    def __init__(self):
+        self._versi: List[dict] = []
+        self._berlaku: List[str] = []
+        self._by_versi: Dict[int, dict] = {}
+
+    @property
+    def versi_terbaru(self) -> int:
+        return max(self._by_versi) if self._by_versi else 0
+
+    def _pasang(self, docs: List[dict]):
+        docs = sorted(docs, key=lambda d: (d["berlaku_mulai"], d["versi"]))
+        self._versi = docs
+        self._berlaku = [d["berlaku_mulai"] for d in docs]
+        self._by_versi = {d["versi"]: d for d in docs}
+
+    async def muat(self, db):
+        docs = await db.harga.find({}, {"_id": 0}).to_list(None)
+        if not docs:
+            awal = {
+                "versi": 1,
+                "berlaku_mulai": BERLAKU_AWAL,
+                "harga": HARGA_AWAL,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+            await db.harga.update_one({"versi": 1}, {"$setOnInsert": awal}, upsert=True)
+            docs = await db.harga.find({}, {"_id": 0}).to_list(None)
+        self._pasang(docs)
+        logger.info("Tabel harga dimuat: %d versi (terbaru v%d)", len(docs), self.versi_terbaru)
+
+    def semua(self) -> List[dict]:
+        return list(self._versi)
+
+    def versi_untuk_tanggal(self, tanggal: str) -> dict:
+        # Versi terakhir yang berlaku_mulai <= tanggal transaksi
+        i = bisect.bisect_right(self._berlaku, tanggal) - 1
+        return self._versi[max(i, 0)]
+
+    def versi(self, versi: Optional[int], tanggal: str) -> dict:
+        if versi is not None and versi in self._by_versi:
+            return self._by_versi[versi]
+        return self.versi_untuk_tanggal(tanggal)
+
+    def hitung_batch(self, items: List[dict]) -> List[dict]:
+        # items: [{"tanggal", "kategori", "pcs": {"3k": n, ...}, "versi" (opsional)}]
+        # Hasil per item: {"versi", "harga", "subtotal": {...}, "total"}
+        hasil = []
+        for item in items:
+            v = self.versi(item.get("versi"), item["tanggal"])
+            harga = v["harga"].get(item["kategori"], v["harga"]["Eceran"])
+            subtotal = {sku: item["pcs"].get(sku, 0) * harga[sku] for sku in SKUS}
+            hasil.append({
+                "versi": v["versi"],
+                "harga": harga,
+                "subtotal": subtotal,
+                "total": sum(subtotal.values()),
+            })
+        return hasil
+
+
+tabel_harga = TabelHarga()
@@ -0,0 +1,139 @@
+import logging
+from typing import Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Daftar index wajib per koleksi.
+# Format tiap entry: (nama_index, keys, opsi)
+# Nama dibuat eksplisit supaya drift bisa dicek berdasarkan nama.
+INDEX_SPEC: Dict[str, List[Tuple[str, list, dict]]] = {
+    "users": [
+        ("username_unik", [("username", ASCENDING)], {"unique": True}),
+    ],
+    "penjualan": [
+        ("id_unik", [("id", ASCENDING)], {"unique": True}),
+        ("tanggal_id", [("tanggal", DESCENDING), ("id", DESCENDING)], {}),
+        ("id_pembeli_tanggal_id", [("id_pembeli", ASCENDING), ("tanggal", DESCENDING), ("id", DESCENDING)], {}),
+    ],
+    "return_penjualan": [
+        ("id_unik", [("id", ASCENDING)], {"unique": True}),
+        ("tanggal_id", [("tanggal", DESCENDING), ("id", DESCENDING)], {}),
+        ("penjualan_id", [("penjualan_id", ASCENDING)], {}),
+    ],
+    "produksi_harian": [
+        ("id_unik", [("id", ASCENDING)], {"unique": True}),
+        ("tanggal_unik", [("tanggal", ASCENDING)], {"unique": True}),
+        ("tanggal_id", [("tanggal", DESCENDING), ("id", DESCENDING)], {}),
+        ("stat_exp", [("stat_exp", ASCENDING)], {}),
+    ],
+    "pengeluaran": [
+        ("id_unik", [("id", ASCENDING)], {"unique": True}),
+        ("tanggal_id", [("tanggal", DESCENDING), ("id", DESCENDING)], {}),
+    ],
+    "karyawan": [
+        ("id_unik", [("id", ASCENDING)], {"unique": True}),
+        ("created_at_id", [("created_at", DESCENDING), ("id", DESCENDING)], {}),
+    ],
+    "gaji": [
+        ("id_unik", [("id", ASCENDING)], {"unique": True}),
+        ("id_produksi", [("id_produksi", ASCENDING)], {}),
+        ("karyawan_tanggal_id", [("id_karyawan", ASCENDING), ("tanggal_produksi", DESCENDING), ("id", DESCENDING)], {}),
+        ("tanggal_produksi_id", [("tanggal_produksi", DESCENDING), ("id", DESCENDING)], {}),
+    ],
+    "stok_harian": [
+        ("tanggal_unik", [("tanggal", ASCENDING)], {"unique": True}),
+    ],
+    "stok_berjalan": [
+        ("sku_unik", [("sku", ASCENDING)], {"unique": True}),
+    ],
+    "harga": [
+        ("versi_unik", [("versi", ASCENDING)], {"unique": True}),
+    ],
+    "pembeli": [
+        ("id_unik", [("id", ASCENDING)], {"unique": True}),
+        ("kunci_unik", [("kunci", ASCENDING)], {"unique": True}),
+    ],
+    "piutang": [
+        ("id_pembeli_unik", [("id_pembeli", ASCENDING)], {"unique": True}),
+        # Urutan top_debitur persis (saldo desc, id_pembeli asc): tanpa sort di memori
+        ("saldo_id_pembeli", [("saldo", DESCENDING), ("id_pembeli", ASCENDING)], {}),
+    ],
+    "piutang_harian": [
+        ("id_pembeli_tanggal_unik", [("id_pembeli", ASCENDING), ("tanggal", ASCENDING)], {"unique": True}),
+        # umur_piutang: $match saldo + $group tanggal/saldo dijawab dari index saja
+        ("saldo_tanggal", [("saldo", DESCENDING), ("tanggal", ASCENDING)], {}),
+    ],
+    "laba_rollup": [
+        ("period_kunci_unik", [("period", ASCENDING), ("kunci", ASCENDING)], {"unique": True}),
+    ],
+    "audit": [
+        ("waktu", [("waktu", DESCENDING)], {}),
+    ],
+}
+
+# Opsi yang ikut dibandingkan saat cek drift
+_OPSI_DICEK = ("unique", "sparse", "partialFilterExpression")
+
+
+def _normalisasi_keys(keys) -> list:
+    return [(field, int(arah) if isinstance(arah, (int, float)) else arah) for field, arah in keys]
+
+
+async def cek_drift(db) -> dict:
+    # Bandingkan index di DB dengan INDEX_SPEC.
+    # Hasil: {koleksi: {"missing": [...], "mismatch": [...], "extra": [...]}}
+    laporan = {}
+    for koleksi, daftar in INDEX_SPEC.items():
+        existing = await db[koleksi].index_information()
+        missing, mismatch = [], []
+        for nama, keys, opsi in daftar:
+            info = existing.get(nama)
+            if info is None:
+                missing.append(nama)
+                continue
+            beda_keys = _normalisasi_keys(info["key"]) != _normalisasi_keys(keys)
+            beda_opsi = any(info.get(o) != opsi.get(o) for o in _OPSI_DICEK if o in opsi or o in info)
+            if beda_keys or beda_opsi:
+                mismatch.append(nama)
+
+        dikelola = {nama for nama, _, _ in daftar} | {"_id_"}
+        extra = sorted(n for n in existing if n not in dikelola)
+
+        if missing or mismatch or extra:
+            laporan[koleksi] = {"missing": missing, "mismatch": mismatch, "extra": extra}
+    return laporan
+
+
+async def ensure_indexes(db, strict: bool = True) -> dict:
+    # 1. Bangun semua index yang belum ada
+    for koleksi, daftar in INDEX_SPEC.items():
+        existing = await db[koleksi].index_information()
+        for nama, keys, opsi in daftar:
+            if nama in existing:
+                continue
+            try:
+                await db[koleksi].create_index(keys, name=nama, **opsi)
+                logger.info("Index %s.%s dibuat", koleksi, nama)
+            except OperationFailure as e:
+                # Biasanya karena data ganda pada index unik
+                logger.error("Gagal membuat index %s.%s: %s", koleksi, nama, e)
+
+    # 2. Laporkan drift setelah build
+    drift = await cek_drift(db)
+    rusak = {}
+    for koleksi, hasil in drift.items():
+        if hasil["extra"]:
+            logger.warning("Index tidak dikenal di %s: %s", koleksi, ", ".join(hasil["extra"]))
+        if hasil["missing"] or hasil["mismatch"]:
+            rusak[koleksi] = {"missing": hasil["missing"], "mismatch": hasil["mismatch"]}
+            logger.error(
+                "Index drift di %s: missing=%s mismatch=%s",
+                koleksi, hasil["missing"], hasil["mismatch"],
+            )
+
+    if rusak and strict:
+        raise RuntimeError(f"Index wajib tidak lengkap, server tidak dijalankan: {rusak}")
+    return drift
@@ -0,0 +1,115 @@
+import logging
+import os
+from datetime import date, datetime, time, timezone
+from typing import Union
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Bentuk kanonik tanggal transaksi, ditulis oleh SEMUA jalur tulis (lihat kolom_tanggal):
+#   tanggal     "YYYY-MM-DD" (kunci hari): filter sama-dengan, rentang list/export
+#               (index tanggal_id), ledger stok/piutang, cursor, response API
+#   tanggal_dt  BSON date jam 00:00 UTC: operator tanggal MongoDB (minggu/bulan/tahun laporan)
+# Karena kunci hari selalu 10 karakter, urutan string = urutan tanggal, jadi rentang
+# (pagination.filter_tanggal) di index tanggal_id tepat tanpa memotong string.
+FIELD_NATIVE = "tanggal_dt"
+POLA_KUNCI_HARI = r"^\d{4}-\d{2}-\d{2}$"
+
+# Koleksi transaksi yang punya field tanggal
+KOLEKSI_TANGGAL = ("penjualan", "return_penjualan", "produksi_harian", "pengeluaran")
+# Salinan tanggal produksi di koleksi lain (hanya kunci hari, tanpa BSON date)
+SALINAN_TANGGAL = (("gaji", "tanggal_produksi"),)
+
+# Jumlah dokumen per bulk_write saat migrasi
+MIGRASI_TANGGAL_BATCH = int(os.environ.get('MIGRASI_TANGGAL_BATCH', '1000'))
+
+Tanggal = Union[date, datetime, str]
+
+
+def kunci_hari(nilai: Tanggal) -> str:
+    # date / datetime / string ISO (termasuk timestamp penuh data lama) -> "YYYY-MM-DD"
+    if isinstance(nilai, datetime):
+        return nilai.date().isoformat()
+    if isinstance(nilai, date):
+        return nilai.isoformat()
+    return datetime.fromisoformat(nilai).date().isoformat()
+
+
+def tanggal_native(nilai: Tanggal) -> datetime:
+    return datetime.combine(date.fromisoformat(kunci_hari(nilai)), time.min, tzinfo=timezone.utc)
+
+
+def kolom_tanggal(nilai: Tanggal) -> dict:
+    # Dipakai di dokumen yang ditulis: {**kolom_tanggal(data.tanggal), ...}
+    hari = kunci_hari(nilai)
+    return {"tanggal": hari, FIELD_NATIVE: tanggal_native(hari)}
+
+
+def filter_belum_kanonik(field: str = "tanggal", native: bool = True) -> dict:
+    bukan_kunci = {field: {"$exists": True, "$not": {"$regex": POLA_KUNCI_HARI}}}
+    if not native:
+        return bukan_kunci
+    return {"$or": [{FIELD_NATIVE: {"$exists": False}}, bukan_kunci]}
+
+
+def _kolom_migrasi(doc: dict, field: str, native: bool) -> dict:
+    if not native:
+        return {field: kunci_hari(doc[field])}
+    kolom = kolom_tanggal(doc[field])
+    if doc.get("tanggal_penjualan"):
+        kolom["tanggal_penjualan"] = kunci_hari(doc["tanggal_penjualan"])
+    return kolom
+
+
+async def migrasi_tanggal(db, batch: int = MIGRASI_TANGGAL_BATCH) -> dict:
+    # Migrasi online & idempotent: hanya dokumen yang belum kanonik yang disentuh,
+    # per batch urut _id, jadi aman dijalankan saat backend melayani request.
+    # Filter update ikut nilai tanggal lama: dokumen yang diubah request lain
+    # di tengah migrasi (sudah kanonik) tidak ditimpa.
+    hasil = {}
+    hari_berubah = set()
+    target = [(nama, "tanggal", True) for nama in KOLEKSI_TANGGAL]
+    target += [(nama, field, False) for nama, field in SALINAN_TANGGAL]
+    for nama, field, native in target:
+        koleksi = db[nama]
+        diubah = gagal = 0
+        terakhir = None
+        while True:
+            query = filter_belum_kanonik(field, native)
+            if terakhir is not None:
+                query = {"$and": [query, {"_id": {"$gt": terakhir}}]}
+            docs = await koleksi.find(query, {"_id": 1, field: 1, "tanggal_penjualan": 1}) \
+                .sort("_id", 1).limit(batch).to_list(batch)
+            if not docs:
+                break
+            terakhir = docs[-1]["_id"]
+
+            ops = []
+            for doc in docs:
+                try:
+                    kolom = _kolom_migrasi(doc, field, native)
+                except (KeyError, TypeError, ValueError):
+                    logger.warning("%s _id=%s: %s tidak valid (%r), dilewati", nama, doc["_id"], field, doc.get(field))
+                    gagal += 1
+                    continue
+                # Rollup laba hanya bergantung pada koleksi transaksi
+                if native and kolom[field] != doc[field]:
+                    hari_berubah.add(kolom[field])
+                ops.append(UpdateOne({"_id": doc["_id"], field: doc[field]}, {"$set": kolom}))
+            if not ops:
+                continue
+            try:
+                r = await koleksi.bulk_write(ops, ordered=False)
+                diubah += r.modified_count
+            except BulkWriteError as e:
+                # Mis. dua produksi_harian jatuh ke hari yang sama (index tanggal_unik)
+                diubah += e.details.get("nModified", 0)
+                gagal += len(e.details.get("writeErrors", []))
+                logger.warning("%s: %d dokumen gagal dimigrasi", nama, len(e.details.get("writeErrors", [])))
+        hasil[nama] = {"diubah": diubah, "gagal": gagal}
+        if diubah:
+            logger.info("Migrasi tanggal %s: %d dokumen", nama, diubah)
+    hasil["hari_berubah"] = sorted(hari_berubah)
+    return hasil
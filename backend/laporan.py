@@ -0,0 +1,173 @@
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from kalender import FIELD_NATIVE
+from pagination import filter_tanggal
+
+PERIODS = ("daily", "weekly", "monthly", "yearly")
+
+
+def kunci_periode(period: str, tgl: date) -> str:
+    if period == "daily":
+        return tgl.isoformat()
+    if period == "weekly":
+        tahun, minggu, _ = tgl.isocalendar()
+        return f"{tahun}-W{minggu:02d}"
+    if period == "monthly":
+        return tgl.strftime("%Y-%m")
+    return str(tgl.year)
+
+
+def rentang_periode(period: str, tgl: date) -> Tuple[date, date]:
+    # Tanggal awal & akhir (inklusif) dari periode yang memuat tgl
+    if period == "daily":
+        return tgl, tgl
+    if period == "weekly":
+        awal = tgl - timedelta(days=tgl.weekday())
+        return awal, awal + timedelta(days=6)
+    if period == "monthly":
+        awal = tgl.replace(day=1)
+        bulan_depan = (awal + timedelta(days=32)).replace(day=1)
+        return awal, bulan_depan - timedelta(days=1)
+    return date(tgl.year, 1, 1), date(tgl.year, 12, 31)
+
+
+def daftar_periode(period: str, limit: int, hari_ini: date) -> List[Tuple[str, date, date]]:
+    # `limit` periode terakhir sampai periode berjalan, urut terlama dulu
+    hasil = []
+    tgl = hari_ini
+    for _ in range(limit):
+        awal, akhir = rentang_periode(period, tgl)
+        hasil.append((kunci_periode(period, awal), awal, akhir))
+        tgl = awal - timedelta(days=1)
+    return list(reversed(hasil))
+
+
+def _ekspresi_kunci(period: str) -> dict:
+    # Kunci periode dihitung di database: harian = kunci hari, selain itu dari BSON date
+    if period == "daily":
+        return "$tanggal"
+    format_ = {"weekly": "%G-W%V", "monthly": "%Y-%m"}.get(period, "%Y")
+    return {"$dateToString": {"format": format_, "date": f"${FIELD_NATIVE}"}}
+
+
+async def hitung_laba(db, period: str, dari: date, sampai: date) -> Dict[str, dict]:
+    # Agregasi omzet (cash basis) & pengeluaran per periode langsung di MongoDB
+    match = {"$match": filter_tanggal("tanggal", dari, sampai)}
+    kunci = _ekspresi_kunci(period)
+    # Data lama tanpa field status dianggap Lunas; Tempo belum jadi uang masuk
+    lunas = {"$eq": [{"$ifNull": ["$status_pembayaran", "Lunas"]}, "Lunas"]}
+
+    async def group(koleksi, nilai):
+        pipeline = [match, {"$group": {"_id": kunci, "nilai": {"$sum": nilai}}}]
+        return await db[koleksi].aggregate(pipeline).to_list(None)
+
+    jual, retur, keluar = await asyncio.gather(
+        group("penjualan", {"$cond": [lunas, "$total_penjualan", 0]}),
+        group("return_penjualan", "$total_return"),
+        group("pengeluaran", "$jumlah"),
+    )
+
+    hasil: Dict[str, dict] = {}
+
+    def baris(k):
+        return hasil.setdefault(k, {"omzet": 0, "pengeluaran": 0})
+
+    for r in jual:
+        baris(r["_id"])["omzet"] += r["nilai"]
+    # Return mengurangi omzet
+    for r in retur:
+        baris(r["_id"])["omzet"] -= r["nilai"]
+    for r in keluar:
+        baris(r["_id"])["pengeluaran"] += r["nilai"]
+    return hasil
+
+
+async def get_laba_periode(db, period: str, limit: int, hari_ini: date) -> List[dict]:
+    periode = daftar_periode(period, limit, hari_ini)
+
+    # Periode yang sudah tutup dibaca dari rollup; periode berjalan selalu dihitung langsung
+    tutup = [p for p in periode if p[2] < hari_ini]
+    berjalan = [p for p in periode if p[2] >= hari_ini]
+
+    rollup = {}
+    if tutup:
+        async for r in db.laba_rollup.find(
+            {"period": period, "kunci": {"$in": [k for k, _, _ in tutup]}, "valid": True}, {"_id": 0}
+        ):
+            rollup[r["kunci"]] = r
+
+    # Rollup yang belum ada dihitung sekali lalu disimpan (termasuk periode kosong)
+    belum = [p for p in tutup if p[0] not in rollup]
+    if belum:
+        mulai = datetime.now(timezone.utc).isoformat()
+        dihitung = await hitung_laba(db, period, belum[0][1], belum[-1][2])
+        ops = []
+        for kunci, awal, akhir in belum:
+            nilai = dihitung.get(kunci)
+            doc = {
+                "period": period,
+                "kunci": kunci,
+                "dari": awal.isoformat(),
+                "sampai": akhir.isoformat(),
+                "omzet": nilai["omzet"] if nilai else 0,
+                "pengeluaran": nilai["pengeluaran"] if nilai else 0,
+                "ada_data": nilai is not None,
+                "valid": True,
+                "computed_at": mulai,
+            }
+            rollup[kunci] = doc
+            # Jangan timpa penanda basi dari penulisan yang terjadi selama perhitungan
+            filter_aman = {"period": period, "kunci": kunci, "$or": [
+                {"basi_at": {"$exists": False}}, {"basi_at": {"$lte": mulai}}
+            ]}
+            ops.append(UpdateOne(filter_aman, {"$set": doc}, upsert=True))
+        try:
+            await db.laba_rollup.bulk_write(ops, ordered=False)
+        except BulkWriteError:
+            # Duplicate key = rollup baru saja ditandai basi; dihitung ulang di request berikutnya
+            pass
+
+    if berjalan:
+        dihitung = await hitung_laba(db, period, berjalan[0][1], berjalan[-1][2])
+        for kunci, _, _ in berjalan:
+            if kunci in dihitung:
+                rollup[kunci] = {**dihitung[kunci], "ada_data": True}
+
+    hasil = []
+    for kunci, _, _ in periode:
+        r = rollup.get(kunci)
+        if not r or not r.get("ada_data"):
+            continue
+        hasil.append({
+            "tanggal": kunci,
+            "omzet": r["omzet"],
+            "pengeluaran": r["pengeluaran"],
+            "laba": r["omzet"] - r["pengeluaran"],
+        })
+    return hasil
+
+
+async def hapus_rollup(db, *tanggal: str):
+    # Penulisan back-dated membuat rollup periode tertutup basi: tandai basi semua
+    # rollup (harian/mingguan/bulanan/tahunan) yang memuat tanggal itu.
+    # Periode yang masih berjalan tidak pernah disimpan sebagai rollup, jadi dilewati.
+    sekarang = datetime.now(timezone.utc).isoformat()
+    hari_ini = date.today()
+    ops = []
+    for t in {t for t in tanggal if t}:
+        tgl = date.fromisoformat(t)
+        for period in PERIODS:
+            if rentang_periode(period, tgl)[1] >= hari_ini:
+                continue
+            ops.append(UpdateOne(
+                {"period": period, "kunci": kunci_periode(period, tgl)},
+                {"$set": {"valid": False, "basi_at": sekarang}},
+                upsert=True,
+            ))
+    if ops:
+        await db.laba_rollup.bulk_write(ops, ordered=False)
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Jumlah pesan yang boleh menumpuk per koneksi. Klien yang terlalu lambat diputus
+# (EventSource tersambung ulang sendiri lalu memuat ulang data), bukan ditunggu.
+LIVE_ANTREAN = int(os.environ.get('LIVE_ANTREAN', '100'))
+# Komentar ping supaya proxy tidak menutup koneksi yang sepi
+LIVE_PING_DETIK = float(os.environ.get('LIVE_PING_DETIK', '15'))
+# Umur maksimal satu koneksi. Setelah itu ditutup server dan browser tersambung ulang;
+# membatasi lama shutdown menunggu stream yang masih terbuka.
+LIVE_DURASI_DETIK = float(os.environ.get('LIVE_DURASI_DETIK', '300'))
+
+# Jeda sambung ulang untuk EventSource (ms)
+RETRY_MS = 3000
+
+
+def format_sse(event: str, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+def delta_hari(sumber: str, tanggal: str, stok: Optional[dict] = None, ringkasan: Optional[dict] = None) -> dict:
+    # Delta satu tanggal:
+    #   stok: perubahan counter ledger stok_harian (prod_3k, jual_5k, ret_10k, ...)
+    #   ringkasan: perubahan angka dashboard (total_produksi, total_penjualan, total_pengeluaran)
+    delta = {"sumber": sumber, "tanggal": tanggal}
+    stok = {k: v for k, v in (stok or {}).items() if v}
+    ringkasan = {k: v for k, v in (ringkasan or {}).items() if v}
+    if stok:
+        delta["stok"] = stok
+    if ringkasan:
+        delta["ringkasan"] = ringkasan
+    return delta
+
+
+class HubLive:
+    # Fan-out pesan ke semua koneksi SSE di proses ini.
+    # Pesan di-encode sekali per penulisan, lalu byte yang sama dimasukkan ke antrean tiap koneksi.
+
+    def __init__(self):
+        self._pelanggan: Set[asyncio.Queue] = set()
+
+    @property
+    def jumlah(self) -> int:
+        return len(self._pelanggan)
+
+    def terbitkan(self, event: str, data):
+        if not self._pelanggan:
+            return
+        pesan = format_sse(event, data)
+        for q in list(self._pelanggan):
+            try:
+                q.put_nowait(pesan)
+            except asyncio.QueueFull:
+                self._putuskan(q)
+
+    def delta(self, *hari: dict):
+        # Hari tanpa perubahan (stok & ringkasan kosong) tidak dikirim
+        hari = [h for h in hari if "stok" in h or "ringkasan" in h]
+        if hari:
+            self.terbitkan("delta", hari)
+
+    def muat_ulang(self, *bagian: str):
+        # Perubahan yang tidak bisa dikirim sebagai delta sederhana (mis. status expired)
+        self.terbitkan("muat_ulang", {"bagian": list(bagian)})
+
+    def _putuskan(self, q: asyncio.Queue):
+        self._pelanggan.discard(q)
+        while not q.empty():
+            q.get_nowait()
+        q.put_nowait(None)
+
+    def tutup(self):
+        for q in list(self._pelanggan):
+            self._putuskan(q)
+
+    async def aliran(self, request):
+        q: asyncio.Queue = asyncio.Queue(maxsize=LIVE_ANTREAN)
+        self._pelanggan.add(q)
+        loop = asyncio.get_running_loop()
+        selesai = loop.time() + LIVE_DURASI_DETIK
+        try:
+            # "halo" dikirim setiap tersambung (termasuk sambung ulang): klien memuat ulang data
+            # supaya delta yang terlewat saat terputus tidak hilang
+            yield f"retry: {RETRY_MS}\n\n".encode() + format_sse("halo", {})
+            while True:
+                sisa = selesai - loop.time()
+                if sisa <= 0:
+                    break
+                try:
+                    pesan = await asyncio.wait_for(q.get(), timeout=min(LIVE_PING_DETIK, sisa))
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": ping\n\n"
+                    continue
+                if pesan is None:
+                    break
+                yield pesan
+        finally:
+            self._pelanggan.discard(q)
+
+
+hub_live = HubLive()
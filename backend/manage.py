@@ -0,0 +1,112 @@
+# Perintah maintenance database.
+# Contoh: python manage.py indexes --apply
+import asyncio
+import json
+
+import typer
+
+from server import db, client, INDEX_STRICT
+from database import tandai_migrasi
+from indexes import cek_drift, ensure_indexes
+from stok import rebuild_stok_harian, cek_konsistensi_stok
+from piutang import rebuild_piutang
+from pembeli import migrasi_pembeli
+from kalender import migrasi_tanggal
+from laporan import hapus_rollup
+from versi import naikkan_versi
+
+cli = typer.Typer(help="Perintah maintenance backend Oma Tempe Ayu")
+
+
+def jalankan(coro):
+    try:
+        return asyncio.run(coro)
+    finally:
+        client.close()
+
+
+@cli.command()
+def indexes(apply: bool = typer.Option(False, "--apply", help="Bangun index yang belum ada")):
+    """Cek (dan opsional bangun) index wajib."""
+    async def _run():
+        if apply:
+            return await ensure_indexes(db, strict=INDEX_STRICT)
+        return await cek_drift(db)
+
+    drift = jalankan(_run())
+    typer.echo(json.dumps(drift, indent=2))
+    if any(d["missing"] or d["mismatch"] for d in drift.values()):
+        raise typer.Exit(code=1)
+
+
+@cli.command("rebuild-stok")
+def rebuild_stok():
+    """Bangun ulang ledger stok_harian dari produksi, penjualan dan return."""
+    async def _run():
+        jumlah = await rebuild_stok_harian(db)
+        await naikkan_versi(db, "stok")
+        return jumlah
+
+    jumlah = jalankan(_run())
+    typer.echo(f"Ledger stok_harian: {jumlah} hari")
+
+
+@cli.command("check-stok")
+def check_stok(fix: bool = typer.Option(False, "--fix", help="Bangun ulang ledger jika ada drift")):
+    """Cocokkan ledger & stok berjalan dengan hitung ulang dari koleksi mentah."""
+    async def _run():
+        drift = await cek_konsistensi_stok(db)
+        if drift and fix:
+            await rebuild_stok_harian(db)
+            await naikkan_versi(db, "stok")
+        return drift
+
+    drift = jalankan(_run())
+    typer.echo(json.dumps(drift, indent=2))
+    if drift and not fix:
+        raise typer.Exit(code=1)
+
+
+
+@cli.command("rebuild-piutang")
+def rebuild_piutang_cmd():
+    """Bangun ulang ledger piutang dari penjualan Tempo."""
+    async def _run():
+        jumlah = await rebuild_piutang(db)
+        await naikkan_versi(db, "piutang")
+        return jumlah
+
+    jumlah = jalankan(_run())
+    typer.echo(f"Ledger piutang: {jumlah} pembeli")
+
+
+@cli.command("migrate-pembeli")
+def migrate_pembeli():
+    """Isi master pembeli dari penjualan lama dan tautkan id_pembeli."""
+    async def _run():
+        hasil = await migrasi_pembeli(db)
+        await tandai_migrasi(db, "pembeli", hasil)
+        # Ledger piutang dikunci id_pembeli: penjualan yang baru ditautkan perlu dihitung ulang
+        if hasil["pembeli"]:
+            await rebuild_piutang(db)
+        await naikkan_versi(db, "pembeli", "penjualan", "piutang")
+        return hasil
+
+    typer.echo(json.dumps(jalankan(_run()), indent=2))
+
+
+@cli.command("migrate-tanggal")
+def migrate_tanggal():
+    """Ubah tanggal lama (string/timestamp) ke kunci hari + BSON date. Aman saat backend jalan, selalu dijalankan ulang."""
+    async def _run():
+        hasil = await migrasi_tanggal(db)
+        await tandai_migrasi(db, "tanggal", hasil)
+        if hasil["hari_berubah"]:
+            await hapus_rollup(db, *hasil["hari_berubah"])
+        await naikkan_versi(db, "penjualan", "return_penjualan", "produksi_harian", "pengeluaran")
+        return hasil
+
+    typer.echo(json.dumps(jalankan(_run()), indent=2))
+
+if __name__ == "__main__":
+    cli()
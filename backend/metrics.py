@@ -0,0 +1,285 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+# Content-Type format teks Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+BUCKET_REQUEST = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKET_MONGO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Route untuk request yang tidak cocok dengan route manapun (404), supaya label tidak meledak
+RUTE_TIDAK_DIKENAL = "<unmatched>"
+# Perintah Mongo di luar request (startup, task latar belakang)
+RUTE_LATAR = "<background>"
+
+# Pencatatan dilakukan dari event loop dan dari thread pool Motor (listener pymongo)
+_lock = threading.Lock()
+
+
+def _escape(nilai) -> str:
+    return str(nilai).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _label(nama_label, nilai_label, ekstra: str = "") -> str:
+    isi = [f'{n}="{_escape(v)}"' for n, v in zip(nama_label, nilai_label)]
+    if ekstra:
+        isi.append(ekstra)
+    return "{" + ",".join(isi) + "}" if isi else ""
+
+
+class Counter:
+    def __init__(self, nama: str, keterangan: str, label: Tuple[str, ...]):
+        self.nama = nama
+        self.keterangan = keterangan
+        self.label = label
+        self._nilai: Dict[tuple, float] = {}
+
+    def inc(self, label: tuple, n: float = 1):
+        with _lock:
+            self._nilai[label] = self._nilai.get(label, 0) + n
+
+    def render(self):
+        yield f"# HELP {self.nama} {self.keterangan}"
+        yield f"# TYPE {self.nama} counter"
+        with _lock:
+            data = sorted(self._nilai.items())
+        for label, nilai in data:
+            yield f"{self.nama}{_label(self.label, label)} {nilai}"
+
+
+class Gauge:
+    # Nilai saat ini, dibaca dari fungsi ketika /metrics dirender: fungsi -> {label: nilai}
+    def __init__(self, nama: str, keterangan: str, label: Tuple[str, ...], baca):
+        self.nama = nama
+        self.keterangan = keterangan
+        self.label = label
+        self._baca = baca
+
+    def render(self):
+        yield f"# HELP {self.nama} {self.keterangan}"
+        yield f"# TYPE {self.nama} gauge"
+        for label, nilai in sorted(self._baca().items()):
+            yield f"{self.nama}{_label(self.label, label)} {nilai}"
+
+
+class Histogram:
+    def __init__(self, nama: str, keterangan: str, label: Tuple[str, ...], bucket: Tuple[float, ...]):
+        self.nama = nama
+        self.keterangan = keterangan
+        self.label = label
+        self.bucket = bucket
+        # label -> [jumlah per bucket (non-kumulatif, +Inf di akhir), total nilai, jumlah observasi]
+        self._data: Dict[tuple, list] = {}
+
+    def observe(self, label: tuple, nilai: float):
+        i = bisect_left(self.bucket, nilai)
+        with _lock:
+            data = self._data.get(label)
+            if data is None:
+                data = self._data[label] = [[0] * (len(self.bucket) + 1), 0.0, 0]
+            data[0][i] += 1
+            data[1] += nilai
+            data[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.nama} {self.keterangan}"
+        yield f"# TYPE {self.nama} histogram"
+        with _lock:
+            data = sorted((label, ([*d[0]], d[1], d[2])) for label, d in self._data.items())
+        for label, (per_bucket, total, jumlah) in data:
+            kumulatif = 0
+            for batas, n in zip(self.bucket, per_bucket):
+                kumulatif += n
+                le = f'le="{batas}"'
+                yield f"{self.nama}_bucket{_label(self.label, label, le)} {kumulatif}"
+            le = 'le="+Inf"'
+            yield f"{self.nama}_bucket{_label(self.label, label, le)} {jumlah}"
+            yield f"{self.nama}_sum{_label(self.label, label)} {total}"
+            yield f"{self.nama}_count{_label(self.label, label)} {jumlah}"
+
+
+http_requests_total = Counter(
+    "http_requests_total", "Jumlah request HTTP per route dan status.", ("method", "route", "status"))
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Durasi request HTTP (detik).", ("method", "route"), BUCKET_REQUEST)
+http_request_mongo = Histogram(
+    "http_request_mongo_seconds", "Total waktu perintah Mongo per request (detik). "
+    "Bandingkan dengan http_request_duration_seconds untuk melihat porsi Python vs database.",
+    ("method", "route"), BUCKET_REQUEST)
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds", "Durasi perintah MongoDB per route, koleksi dan operasi (detik).",
+    ("route", "collection", "command"), BUCKET_MONGO)
+mongo_command_failed = Counter(
+    "mongo_command_failed_total", "Perintah MongoDB yang gagal.", ("route", "collection", "command"))
+
+
+
+class PemantauPool(monitoring.ConnectionPoolListener):
+    # Jumlah koneksi per server: terbuka, sedang dipakai request, dan request yang antre menunggu koneksi
+    def __init__(self):
+        self._data: Dict[str, Dict[str, int]] = {}
+
+    def _ubah(self, event, **delta):
+        alamat = "%s:%s" % event.address
+        with _lock:
+            data = self._data.setdefault(alamat, {"koneksi": 0, "dipakai": 0, "menunggu": 0})
+            for k, v in delta.items():
+                data[k] += v
+
+    def ringkasan(self) -> Dict[str, int]:
+        with _lock:
+            return {k: sum(d[k] for d in self._data.values()) for k in ("koneksi", "dipakai", "menunggu")}
+
+    def per_server(self, kolom: str) -> Dict[tuple, int]:
+        with _lock:
+            return {(alamat,): d[kolom] for alamat, d in self._data.items()}
+
+    def connection_created(self, event):
+        self._ubah(event, koneksi=1)
+
+    def connection_closed(self, event):
+        self._ubah(event, koneksi=-1)
+
+    def connection_check_out_started(self, event):
+        self._ubah(event, menunggu=1)
+
+    def connection_checked_out(self, event):
+        self._ubah(event, menunggu=-1, dipakai=1)
+
+    def connection_check_out_failed(self, event):
+        self._ubah(event, menunggu=-1)
+
+    def connection_checked_in(self, event):
+        self._ubah(event, dipakai=-1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+pemantau_pool = PemantauPool()
+
+mongo_pool_connections = Gauge(
+    "mongo_pool_connections", "Koneksi MongoDB yang terbuka di pool.", ("server",),
+    lambda: pemantau_pool.per_server("koneksi"))
+mongo_pool_checked_out = Gauge(
+    "mongo_pool_checked_out", "Koneksi MongoDB yang sedang dipakai.", ("server",),
+    lambda: pemantau_pool.per_server("dipakai"))
+mongo_pool_wait_queue = Gauge(
+    "mongo_pool_wait_queue", "Operasi yang sedang antre menunggu koneksi bebas.", ("server",),
+    lambda: pemantau_pool.per_server("menunggu"))
+
+SEMUA_METRIK = (http_requests_total, http_request_duration, http_request_mongo,
+                mongo_command_duration, mongo_command_failed,
+                mongo_pool_connections, mongo_pool_checked_out, mongo_pool_wait_queue)
+
+
+def render() -> str:
+    baris = []
+    for metrik in SEMUA_METRIK:
+        baris.extend(metrik.render())
+    return "\n".join(baris) + "\n"
+
+
+class KonteksRequest:
+    # Disimpan di contextvar selama request berjalan. Motor menyalin context ke thread
+    # pool-nya, jadi listener pymongo bisa tahu perintah ini milik request mana.
+    __slots__ = ("scope", "mongo_detik")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.mongo_detik = 0.0
+
+    @property
+    def rute(self) -> str:
+        # scope["route"] diisi router FastAPI saat request cocok dengan suatu route
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or RUTE_TIDAK_DIKENAL
+
+
+konteks_request: ContextVar[Optional[KonteksRequest]] = ContextVar("konteks_request", default=None)
+
+
+class MetricsMiddleware:
+    # Middleware ASGI murni (tanpa BaseHTTPMiddleware) supaya response streaming tidak ditahan
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        konteks = KonteksRequest(scope)
+        token = konteks_request.set(konteks)
+        status = 500
+        mulai = time.perf_counter()
+
+        async def kirim(pesan):
+            nonlocal status
+            if pesan["type"] == "http.response.start":
+                status = pesan["status"]
+            await send(pesan)
+
+        try:
+            await self.app(scope, receive, kirim)
+        finally:
+            durasi = time.perf_counter() - mulai
+            label = (scope["method"], konteks.rute)
+            http_requests_total.inc((*label, str(status)))
+            http_request_duration.observe(label, durasi)
+            http_request_mongo.observe(label, konteks.mongo_detik)
+            konteks_request.reset(token)
+
+
+def _koleksi(event) -> str:
+    # Nama koleksi ada di nilai field pertama perintah (find: "penjualan", insert: "gaji", ...).
+    # getMore menyimpannya di field "collection".
+    nilai = event.command.get(event.command_name)
+    if event.command_name == "getMore":
+        nilai = event.command.get("collection")
+    return nilai if isinstance(nilai, str) else "-"
+
+
+class PemantauMongo(monitoring.CommandListener):
+    # Didaftarkan saat membuat client (event_listeners=[...]), dipanggil di thread pymongo
+    def __init__(self):
+        self._berjalan: Dict[tuple, tuple] = {}
+
+    def started(self, event):
+        konteks = konteks_request.get()
+        with _lock:
+            self._berjalan[(event.connection_id, event.request_id)] = (konteks, _koleksi(event))
+
+    def _selesai(self, event, gagal: bool):
+        with _lock:
+            konteks, koleksi = self._berjalan.pop((event.connection_id, event.request_id), (None, "-"))
+        detik = event.duration_micros / 1_000_000
+        label = (konteks.rute if konteks else RUTE_LATAR, koleksi, event.command_name)
+        mongo_command_duration.observe(label, detik)
+        if gagal:
+            mongo_command_failed.inc(label)
+        if konteks is not None:
+            with _lock:
+                konteks.mongo_detik += detik
+
+    def succeeded(self, event):
+        self._selesai(event, gagal=False)
+
+    def failed(self, event):
+        self._selesai(event, gagal=True)
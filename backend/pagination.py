@@ -0,0 +1,102 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi import HTTPException, Query, Response
+
+PAGE_DEFAULT = 1000
+PAGE_MAX = 1000
+
+# Header berisi cursor halaman berikutnya (kosong = halaman terakhir)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass
+class Halaman:
+    limit: int
+    cursor: Optional[str]
+    dari: Optional[date]
+    sampai: Optional[date]
+
+
+def param_halaman(
+    limit: int = Query(PAGE_DEFAULT, ge=1, le=PAGE_MAX),
+    cursor: Optional[str] = None,
+    dari: Optional[date] = Query(None, alias="from"),
+    sampai: Optional[date] = Query(None, alias="to"),
+) -> Halaman:
+    return Halaman(limit=limit, cursor=cursor, dari=dari, sampai=sampai)
+
+
+def encode_cursor(nilai, id_) -> str:
+    raw = json.dumps([nilai, id_]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    try:
+        nilai, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return nilai, id_
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor tidak valid")
+
+
+def filter_tanggal(field: str, dari: Optional[date], sampai: Optional[date]) -> dict:
+    # Rentang inklusif [dari, sampai]. Batas atas pakai "< hari berikutnya": tepat untuk
+    # kunci hari (YYYY-MM-DD) maupun timestamp penuh (karyawan.created_at) di hari terakhir.
+    kondisi = {}
+    if dari:
+        kondisi["$gte"] = dari.isoformat()
+    if sampai:
+        kondisi["$lt"] = (sampai + timedelta(days=1)).isoformat()
+    return {field: kondisi} if kondisi else {}
+
+
+def query_halaman(base_filter: dict, field: str, halaman: Halaman) -> dict:
+    # Gabungkan filter dasar + rentang tanggal + posisi cursor.
+    # Urutan terbalik (terbaru dulu) dengan kunci (field, id).
+    kondisi = [base_filter] if base_filter else []
+
+    rentang = filter_tanggal(field, halaman.dari, halaman.sampai)
+    if rentang:
+        kondisi.append(rentang)
+
+    if halaman.cursor:
+        nilai, id_ = decode_cursor(halaman.cursor)
+        # Dokumen tanpa field (null/hilang) ada di urutan paling akhir saat sort turun
+        # dan tidak pernah cocok dengan $lt string, jadi disertakan terpisah.
+        if nilai is None:
+            kondisi.append({field: None, "id": {"$lt": id_}})
+        else:
+            kondisi.append({"$or": [
+                {field: {"$lt": nilai}},
+                {field: nilai, "id": {"$lt": id_}},
+                {field: None},
+            ]})
+
+    if len(kondisi) > 1:
+        return {"$and": kondisi}
+    return kondisi[0] if kondisi else {}
+
+
+def potong_halaman(docs: list, field: str, halaman: Halaman, response: Response) -> list:
+    # Query selalu ambil limit + 1; sisa satu berarti masih ada halaman berikutnya.
+    # Cursor dibuat dari nilai mentah field: placeholder tampilan (mis. "Unknown")
+    # diisi setelah fungsi ini, bukan di query.
+    if len(docs) > halaman.limit:
+        docs = docs[:halaman.limit]
+        terakhir = docs[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(terakhir.get(field), terakhir["id"])
+    return docs
+
+
+async def get_halaman(koleksi, base_filter: dict, field: str, halaman: Halaman,
+                      response: Response, projection: Optional[dict] = None):
+    # Wajib didukung index compound (field, id) di koleksi terkait.
+    docs = await koleksi.find(query_halaman(base_filter, field, halaman), projection or {"_id": 0}) \
+        .sort([(field, -1), ("id", -1)]) \
+        .limit(halaman.limit + 1) \
+        .to_list(halaman.limit + 1)
+    return potong_halaman(docs, field, halaman, response)
@@ -0,0 +1,47 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# Cost factor bcrypt untuk hash baru. Hash lama dengan cost berbeda di-rehash saat login.
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+# Jumlah thread khusus bcrypt. bcrypt melepas GIL, jadi event loop tetap bebas
+# melayani request lain selama hashing berjalan.
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', '2'))
+
+_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
+
+def _hash(plain: str, rounds: int) -> str:
+    return bcrypt.hashpw(plain.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _check(plain: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(plain.encode('utf-8'), hashed.encode('utf-8'))
+    except ValueError:
+        # Format hash rusak / bukan bcrypt
+        return False
+
+
+async def hash_password(plain: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _hash, plain, BCRYPT_ROUNDS)
+
+
+async def verify_password(plain: str, hashed: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _check, plain, hashed)
+
+
+def perlu_rehash(hashed: str) -> bool:
+    # Format bcrypt: $2b$<cost>$<salt+hash>
+    try:
+        return int(hashed.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+def shutdown():
+    _executor.shutdown(wait=False)
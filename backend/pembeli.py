@@ -0,0 +1,101 @@
+import logging
+import re
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+
+def rapikan(nama: str) -> str:
+    # Nama tampilan: spasi berlebih dibuang, huruf besar/kecil dibiarkan
+    return " ".join((nama or "").split())
+
+
+def normalisasi(nama: str) -> str:
+    # Kunci unik pembeli: "  Bu  ANI " dan "bu ani" dianggap pembeli yang sama
+    return rapikan(nama).casefold()
+
+
+async def pastikan_pembeli(db, nama_list: List[str]) -> Dict[str, dict]:
+    # Buat master pembeli yang belum ada (upsert per kunci), hasil: {kunci: doc}.
+    # Nama kosong tidak dibuatkan master.
+    baru = {}
+    for nama in nama_list:
+        kunci = normalisasi(nama)
+        if kunci and kunci not in baru:
+            baru[kunci] = rapikan(nama)
+    if not baru:
+        return {}
+
+    now = datetime.now(timezone.utc).isoformat()
+    ops = [
+        UpdateOne(
+            {"kunci": kunci},
+            {"$setOnInsert": {"id": str(uuid.uuid4()), "nama": nama, "kunci": kunci, "created_at": now}},
+            upsert=True
+        )
+        for kunci, nama in baru.items()
+    ]
+    try:
+        await db.pembeli.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        # Upsert bersamaan untuk kunci yang sama: salah satu kalah di index unik, dokumennya sudah ada
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+    docs = await db.pembeli.find({"kunci": {"$in": list(baru)}}, {"_id": 0}).to_list(None)
+    return {d["kunci"]: d for d in docs}
+
+
+async def pembeli_untuk(db, data_list) -> List[Optional[dict]]:
+    # Master pembeli untuk tiap input penjualan (punya field id_pembeli & pembeli).
+    # id_pembeli diisi -> dipakai apa adanya (None jika tidak ditemukan),
+    # kosong -> dicari/dibuat dari nama.
+    ids = {d.id_pembeli for d in data_list if d.id_pembeli}
+    by_id = {}
+    if ids:
+        by_id = {d["id"]: d async for d in db.pembeli.find({"id": {"$in": list(ids)}}, {"_id": 0})}
+    by_kunci = await pastikan_pembeli(db, [d.pembeli for d in data_list if not d.id_pembeli])
+    return [
+        by_id.get(d.id_pembeli) if d.id_pembeli else by_kunci.get(normalisasi(d.pembeli))
+        for d in data_list
+    ]
+
+
+async def cari_pembeli(db, q: str, limit: int) -> list:
+    # Prefix search di kunci ternormalisasi. Regex "^..." tanpa flag i bisa memakai index kunci.
+    kunci = normalisasi(q)
+    filter_ = {"kunci": {"$regex": "^" + re.escape(kunci)}} if kunci else {}
+    return await db.pembeli.find(filter_, {"_id": 0}).sort("kunci", 1).limit(limit).to_list(limit)
+
+
+async def migrasi_pembeli(db) -> dict:
+    # Isi master pembeli dari penjualan lama lalu tautkan id_pembeli.
+    # Nama di penjualan diseragamkan dengan nama master (beda spasi/huruf besar-kecil saja).
+    nama_list = await db.penjualan.distinct("pembeli", {"id_pembeli": {"$exists": False}})
+    if not nama_list:
+        return {"pembeli": 0, "diganti_nama": 0}
+
+    master = await pastikan_pembeli(db, nama_list)
+    ops = []
+    diganti_nama = 0
+    for nama in nama_list:
+        doc = master.get(normalisasi(nama))
+        if not doc:
+            # Nama kosong: tandai saja supaya tidak diproses ulang
+            ops.append(UpdateMany({"pembeli": nama, "id_pembeli": {"$exists": False}}, {"$set": {"id_pembeli": None}}))
+            continue
+        if doc["nama"] != nama:
+            diganti_nama += 1
+        ops.append(UpdateMany(
+            {"pembeli": nama, "id_pembeli": {"$exists": False}},
+            {"$set": {"id_pembeli": doc["id"], "pembeli": doc["nama"]}}
+        ))
+    await db.penjualan.bulk_write(ops, ordered=False)
+
+    logger.info("Migrasi pembeli: %d nama -> %d master, %d nama diseragamkan", len(nama_list), len(master), diganti_nama)
+    return {"pembeli": len(master), "diganti_nama": diganti_nama}
@@ -0,0 +1,169 @@
+import logging
+from datetime import date, datetime, timedelta, timezone
+
+from pymongo import DeleteOne, UpdateOne
+
+from indexes import INDEX_SPEC
+
+logger = logging.getLogger(__name__)
+
+STATUS_TEMPO = "Tempo"
+
+# Kelompok umur piutang (hari sejak tanggal penjualan): (label, umur_maksimum)
+# Umur maksimum None = sisanya.
+UMUR_BUCKET = (("0-7", 7), ("8-30", 30), ("30+", None))
+
+
+def is_tempo(doc: dict) -> bool:
+    # Data lama tanpa field status dianggap Lunas
+    return doc.get("status_pembayaran") == STATUS_TEMPO
+
+
+def piutang_dari_doc(doc: dict, tanda: int = 1) -> dict:
+    # Sisa tagihan satu nota: total penjualan dikurangi nilai yang sudah diretur.
+    # Hasil: {(id_pembeli, tanggal): [jumlah, nota]} supaya bisa digabung per batch.
+    # Ledger dikunci id master pembeli, bukan nama: nama yang ditulis berbeda tetap satu tagihan.
+    sisa = doc.get("total_penjualan", 0) - doc.get("nilai_retur", 0)
+    return {(doc.get("id_pembeli"), doc["tanggal"]): [tanda * sisa, tanda]}
+
+
+def gabung_piutang(*perubahan: dict) -> dict:
+    hasil = {}
+    for p in perubahan:
+        for kunci, (jumlah, nota) in p.items():
+            total = hasil.setdefault(kunci, [0, 0])
+            total[0] += jumlah
+            total[1] += nota
+    return hasil
+
+
+async def catat_piutang(db, perubahan: dict, session=None):
+    # Update saldo per pembeli dan per (pembeli, tanggal) dengan $inc.
+    # Baris yang saldonya habis dihapus, jadi koleksi hanya berisi piutang yang masih terbuka.
+    perubahan = {k: v for k, v in perubahan.items() if v[0] or v[1]}
+    if not perubahan:
+        return
+
+    now = datetime.now(timezone.utc).isoformat()
+    per_pembeli = {}
+    harian_ops = []
+    for (id_pembeli, tanggal), (jumlah, nota) in perubahan.items():
+        total = per_pembeli.setdefault(id_pembeli, [0, 0])
+        total[0] += jumlah
+        total[1] += nota
+        if jumlah:
+            harian_ops.append(UpdateOne(
+                {"id_pembeli": id_pembeli, "tanggal": tanggal}, {"$inc": {"saldo": jumlah}}, upsert=True
+            ))
+            harian_ops.append(DeleteOne({"id_pembeli": id_pembeli, "tanggal": tanggal, "saldo": {"$lte": 0}}))
+
+    pembeli_ops = []
+    for id_pembeli, (jumlah, nota) in per_pembeli.items():
+        pembeli_ops.append(UpdateOne(
+            {"id_pembeli": id_pembeli},
+            {"$inc": {"saldo": jumlah, "nota": nota}, "$set": {"updated_at": now}},
+            upsert=True
+        ))
+        pembeli_ops.append(DeleteOne({"id_pembeli": id_pembeli, "saldo": {"$lte": 0}, "nota": {"$lte": 0}}))
+
+    if harian_ops:
+        await db.piutang_harian.bulk_write(harian_ops, ordered=True, session=session)
+    await db.piutang.bulk_write(pembeli_ops, ordered=True, session=session)
+
+
+async def top_debitur(db, limit: int) -> list:
+    # Index saldo_id_pembeli (saldo desc, id_pembeli asc) sama dengan urutan sort:
+    # cukup baca `limit` dokumen teratas tanpa sort di memori.
+    # Nama diambil dari master pembeli saat dibaca, jadi selalu nama terbaru.
+    return await db.piutang.aggregate([
+        {"$match": {"saldo": {"$gt": 0}}},
+        {"$sort": {"saldo": -1, "id_pembeli": 1}},
+        {"$limit": limit},
+        {"$lookup": {"from": "pembeli", "localField": "id_pembeli", "foreignField": "id", "as": "master"}},
+        {"$addFields": {"pembeli": {"$ifNull": [{"$arrayElemAt": ["$master.nama", 0]}, ""]}}},
+        {"$project": {"_id": 0, "master": 0}},
+    ]).to_list(limit)
+
+
+async def umur_piutang(db, hari_ini: date) -> dict:
+    # Satu $group di piutang_harian (hanya piutang terbuka, satu baris per pembeli per hari).
+    # Pipeline hanya butuh saldo & tanggal: index saldo_tanggal menjawab $match + $group
+    # langsung dari index (covered), tanpa membaca dokumen.
+    group = {"_id": None, "total": {"$sum": "$saldo"}}
+    sebelumnya = None
+    for label, maks in UMUR_BUCKET:
+        kondisi = []
+        if maks is not None:
+            kondisi.append({"$gte": ["$tanggal", (hari_ini - timedelta(days=maks)).isoformat()]})
+        if sebelumnya is not None:
+            kondisi.append({"$lt": ["$tanggal", (hari_ini - timedelta(days=sebelumnya)).isoformat()]})
+        group[label] = {"$sum": {"$cond": [{"$and": kondisi}, "$saldo", 0]}}
+        sebelumnya = maks
+
+    hasil = await db.piutang_harian.aggregate([
+        {"$match": {"saldo": {"$gt": 0}}},
+        {"$group": group},
+    ]).to_list(1)
+    row = hasil[0] if hasil else {}
+    return {
+        "total": row.get("total", 0),
+        "umur": {label: row.get(label, 0) for label, _ in UMUR_BUCKET},
+    }
+
+
+async def rebuild_piutang(db) -> int:
+    # Hitung ulang kedua ledger piutang dari penjualan Tempo.
+    # Sama seperti rebuild stok: tulis ke koleksi sementara lalu rename.
+    pipeline = [
+        {"$match": {"status_pembayaran": STATUS_TEMPO}},
+        {"$group": {
+            "_id": {"id_pembeli": "$id_pembeli", "tanggal": "$tanggal"},
+            "saldo": {"$sum": {"$subtract": ["$total_penjualan", {"$ifNull": ["$nilai_retur", 0]}]}},
+            "nota": {"$sum": 1},
+        }},
+    ]
+    harian = []
+    per_pembeli = {}
+    async for row in db.penjualan.aggregate(pipeline):
+        id_pembeli = row["_id"].get("id_pembeli")
+        total = per_pembeli.setdefault(id_pembeli, {"id_pembeli": id_pembeli, "saldo": 0, "nota": 0})
+        total["saldo"] += row["saldo"]
+        total["nota"] += row["nota"]
+        if row["saldo"] > 0:
+            harian.append({"id_pembeli": id_pembeli, "tanggal": row["_id"]["tanggal"], "saldo": row["saldo"]})
+
+    now = datetime.now(timezone.utc).isoformat()
+    for doc in per_pembeli.values():
+        doc["updated_at"] = now
+
+    for nama, docs in (("piutang_harian", harian), ("piutang", list(per_pembeli.values()))):
+        tmp = db[f"{nama}_rebuild"]
+        await tmp.drop()
+        # Index dibuat di koleksi sementara supaya langsung ikut setelah rename
+        for nama_index, keys, opts in INDEX_SPEC[nama]:
+            await tmp.create_index(keys, name=nama_index, **opts)
+        if docs:
+            await tmp.insert_many(docs)
+        await tmp.rename(nama, dropTarget=True)
+
+    logger.info("Ledger piutang dibangun ulang: %d pembeli, %d baris harian", len(per_pembeli), len(harian))
+    return len(per_pembeli)
+
+
+
+# Index unik ledger lama yang dikunci nama pembeli
+INDEX_LEDGER_NAMA = {"piutang": "pembeli_unik", "piutang_harian": "pembeli_tanggal_unik"}
+
+
+async def buang_ledger_nama(db) -> dict:
+    # Ledger versi lama dikunci nama pembeli. Dibuang SEBELUM ensure_indexes (index unik
+    # id_pembeli tidak bisa dibangun di atas dokumen lama yang tidak punya field itu);
+    # startup membangun ulang ledger yang kosong setelah migrasi pembeli.
+    dibuang = []
+    for nama, index_lama in INDEX_LEDGER_NAMA.items():
+        if index_lama in await db[nama].index_information():
+            await db[nama].drop()
+            dibuang.append(nama)
+    if dibuang:
+        logger.info("Ledger piutang lama (kunci nama) dibuang: %s", ", ".join(dibuang))
+    return {"dibuang": dibuang}
@@ -0,0 +1,75 @@
+import os
+from functools import lru_cache
+from typing import Iterable, Optional, Type, get_args
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+# Jalur cepat response list: dokumen Mongo langsung jadi bytes JSON (orjson), tanpa membuat
+# objek Pydantic per baris dan tanpa validasi ulang response_model. Set 0 untuk kembali ke jalur Pydantic.
+JSON_CEPAT = os.environ.get('JSON_CEPAT', '1') == '1'
+# Mode cek (test/dev): baris pertama tiap response jalur cepat dibandingkan dengan hasil
+# response_model; beda bentuk/tipe -> error, bukan kontrak API yang diam-diam berubah.
+JSON_CEPAT_CEK = os.environ.get('JSON_CEPAT_CEK', '0') == '1'
+
+
+class JSONCepat(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+@lru_cache(maxsize=None)
+def _kolom(model: Type[BaseModel]) -> tuple:
+    # (nama_field, default) sesuai urutan model. Field wajib yang hilang di dokumen jadi null.
+    return tuple(
+        (nama, None if field.is_required() else field.get_default(call_default_factory=True))
+        for nama, field in model.model_fields.items()
+    )
+
+
+@lru_cache(maxsize=None)
+def _kolom_float(model: Type[BaseModel]) -> tuple:
+    # Field bertipe float (termasuk Optional[float]): Mongo bisa menyimpan int (kedelai_kg: 5)
+    return tuple(
+        nama for nama, field in model.model_fields.items()
+        if field.annotation is float or float in get_args(field.annotation)
+    )
+
+
+def proyeksi(model: Type[BaseModel]) -> dict:
+    # Projection Mongo: hanya field yang ada di model yang ikut dikirim dari database
+    return {"_id": 0, **{nama: 1 for nama, _ in _kolom(model)}}
+
+
+def _cek_kontrak(model: Type[BaseModel], baris: dict):
+    harapan = orjson.dumps(model.model_validate(baris).model_dump(mode="json"))
+    if orjson.dumps(baris) != harapan:
+        raise ValueError(f"Jalur cepat {model.__name__} beda dengan response_model: {baris!r}")
+
+
+def respon_list(model: Type[BaseModel], docs: Iterable[dict], response: Optional[Response] = None):
+    # Bentuk output sama dengan response_model=List[model]: field sesuai model, default diisi.
+    # Header yang sudah dipasang di `response` (mis. X-Next-Cursor) ikut disalin.
+    #
+    # Trade-off jalur cepat: dokumen TIDAK divalidasi per baris. Yang tetap dijamin: urutan
+    # & nama field, default, dan angka float (int dari Mongo dikirim 5.0, sama seperti Pydantic).
+    # Yang tidak dijamin: field wajib yang hilang dikirim null (Pydantic akan error 500) dan
+    # tipe lain tidak dikonversi (mis. string angka tetap string). Jalur tulis yang memakai
+    # model Pydantic menjaga bentuk data di database; JSON_CEPAT_CEK=1 (dipakai test)
+    # memvalidasi baris pertama setiap response, JSON_CEPAT=0 kembali ke validasi penuh.
+    if not JSON_CEPAT:
+        return [model(**d) for d in docs]
+    kolom = _kolom(model)
+    pecahan = _kolom_float(model)
+    baris = [{nama: d.get(nama, default) for nama, default in kolom} for d in docs]
+    if pecahan:
+        for b in baris:
+            for nama in pecahan:
+                if type(b[nama]) is int:
+                    b[nama] = float(b[nama])
+    if JSON_CEPAT_CEK and baris:
+        _cek_kontrak(model, baris[0])
+    return JSONCepat(baris, headers=dict(response.headers) if response is not None else None)
@@ -1,33 +1,74 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Response, Query, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse, JSONResponse
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
+from typing import List, Optional, Literal
 from datetime import datetime, timezone, date, timedelta
-import bcrypt
 import jwt
 from enum import Enum
+from pymongo import InsertOne, DeleteOne, UpdateOne, UpdateMany, ReturnDocument
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+
+from indexes import ensure_indexes
+from pagination import Halaman, param_halaman, get_halaman, query_halaman, potong_halaman, filter_tanggal, NEXT_CURSOR_HEADER
+from stok import SKUS, delta_dari_doc, gabung_delta, catat_stok, set_stat_exp_harian, rebuild_stok_harian
+from database import buat_client, init_transaksi, jalankan_transaksi, pemanasan, tandai_siap, cek_kesiapan, migrasi_sekali
+from cache import CacheTTL
+from laporan import get_laba_periode, hapus_rollup
+from kalender import kolom_tanggal, migrasi_tanggal
+from pembeli import pembeli_untuk, cari_pembeli, migrasi_pembeli
+from piutang import is_tempo, piutang_dari_doc, gabung_piutang, catat_piutang, top_debitur, umur_piutang, rebuild_piutang, buang_ledger_nama
+import password
+import metrics
+from respon import JSONCepat, JSON_CEPAT, proyeksi, respon_list
+from slowlog import pencatat_lambat
+from harga import tabel_harga
+from versi import SEMUA_VERSI, naikkan_versi, cek_etag, pelacak_versi, loop_pantau_versi
+from live import hub_live, delta_hari
+from events import (
+    bus, Event, PenjualanDicatat, StatusPenjualanDiubah, ReturnDicatat, ProduksiDicatat, ProduksiDiubah,
+    StatusExpDiubah, PengeluaranDicatat, GajiDibayar, GajiDiubah, KaryawanDiubah, HargaDiubah,
+)
+from bulk import FORMAT_NDJSON, FORMAT_CSV, tebak_format, baca_baris, pesan_validasi, tulis_csv, tulis_ndjson
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection (ukuran pool & timeout dari env, lihat database.py)
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = buat_client(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Startup gagal jika index wajib tidak bisa dibangun (set 0 untuk mematikan)
+INDEX_STRICT = os.environ.get('INDEX_STRICT', '1') == '1'
+
 # JWT configuration
 SECRET_KEY = os.environ.get('JWT_SECRET', 'your-secret-key-juragan-tempe-ayu-2025')
 ALGORITHM = "HS256"
+# Umur tiket SSE (detik): cukup untuk membuka koneksi, tidak untuk dipakai ulang
+LIVE_TIKET_DETIK = int(os.environ.get('LIVE_TIKET_DETIK', '60'))
+TUJUAN_LIVE = "live"
+
+# Jumlah baris per insert_many saat import massal
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '500'))
+# Jumlah dokumen per round trip cursor saat export
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
 
 # Security
 security = HTTPBearer()
 
+# Cache ringkasan dashboard per tanggal (dikosongkan saat versi datanya berubah, lihat bawah)
+dashboard_cache = CacheTTL()
+
+# Task latar belakang yang dihentikan saat shutdown
+background_tasks = []
+
 # Create the main app
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -61,6 +102,7 @@ class LoginResponse(BaseModel):
 class PenjualanCreate(BaseModel):
     tanggal: date
     pembeli: str
+    id_pembeli: Optional[str] = None  # Diisi jika memilih dari master pembeli
     tanggal_penjualan: Optional[date] = None
     kategori_pembeli: KategoriPembeli
     tempe_3k_pcs: int = 0
@@ -74,6 +116,7 @@ class Penjualan(BaseModel):
     tanggal: str
     tanggal_penjualan: Optional[str] = None
     pembeli: str
+    id_pembeli: Optional[str] = None
     kategori_pembeli: str
     tempe_3k_pcs: int
     tempe_5k_pcs: int
@@ -83,14 +126,65 @@ class Penjualan(BaseModel):
     subtotal_10k: int
     total_penjualan: int
     status_pembayaran: str
+    harga_versi: Optional[int] = None
+    # Akumulasi return per SKU (diupdate atomik oleh create_return)
+    retur_3k_pcs: int = 0
+    retur_5k_pcs: int = 0
+    retur_10k_pcs: int = 0
+    nilai_retur: int = 0
+    created_at: str
+
+class HargaKategori(BaseModel):
+    tempe_3k: int = Field(ge=0)
+    tempe_5k: int = Field(ge=0)
+    tempe_10k: int = Field(ge=0)
+
+class HargaVersiCreate(BaseModel):
+    berlaku_mulai: date
+    eceran: HargaKategori
+    grosir: HargaKategori
+
+class HargaVersi(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    versi: int
+    berlaku_mulai: str
+    harga: dict
     created_at: str
 
+class Pembeli(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    nama: str
+    created_at: str
+
+class PiutangPembeli(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id_pembeli: Optional[str] = None
+    pembeli: str  # Nama terbaru dari master pembeli
+    saldo: int
+    nota: int
+    updated_at: str
+
+class PiutangRingkasan(BaseModel):
+    total_piutang: int
+    umur: dict  # {"0-7": ..., "8-30": ..., "30+": ...} (hari sejak tanggal penjualan)
+    top_debitur: List[PiutangPembeli]
+
+class ImportGagal(BaseModel):
+    baris: int
+    error: str
+
+class ImportHasil(BaseModel):
+    diterima: int
+    gagal: int
+    errors: List[ImportGagal]
+
 class ReturnPenjualanCreate(BaseModel):
     tanggal: date
     penjualan_id: str
-    tempe_3k_return: int = 0
-    tempe_5k_return: int = 0
-    tempe_10k_return: int = 0
+    tempe_3k_return: int = Field(0, ge=0)
+    tempe_5k_return: int = Field(0, ge=0)
+    tempe_10k_return: int = Field(0, ge=0)
     keterangan: str = ""
 
 class ReturnPenjualan(BaseModel):
@@ -224,24 +318,75 @@ class BayarBatchRequest(BaseModel):
     nama_karyawan: str      # Nama karyawan (untuk keterangan)
     
 # Helper functions
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def decode_token(token: str):
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
     except:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    payload = decode_token(credentials.credentials)
+    # Tiket sekali pakai (mis. tiket SSE) bukan token login
+    if payload.get("tujuan"):
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return payload
+
+def etag(*nama: str, harian: bool = False):
+    # Dependency GET: jawab 304 jika data yang dibaca endpoint (nama versi) belum berubah.
+    # Dipasang setelah verify_token supaya request tanpa login tetap 401.
+    async def cek(request: Request, response: Response):
+        await cek_etag(db, request, response, nama, harian)
+    return Depends(cek)
+
 # Initialize admin user
 async def init_admin():
     existing = await db.users.find_one({"username": "admin"}, {"_id": 0})
     if not existing:
-        hashed = bcrypt.hashpw("admin123".encode('utf-8'), bcrypt.gensalt())
+        hashed = await password.hash_password("admin123")
         await db.users.insert_one({
             "username": "admin",
-            "password": hashed.decode('utf-8')
+            "password": hashed
         })
 
+# Isi tanggal_produksi untuk data gaji lama (dipakai untuk sort & filter halaman gaji).
+# Sekali per database lewat migrasi_sekali: filter $exists tidak punya index.
+async def backfill_tanggal_gaji():
+    prod_ids = await db.gaji.distinct("id_produksi", {"tanggal_produksi": {"$exists": False}})
+    if not prod_ids:
+        return 0
+    produksis = await db.produksi_harian.find(
+        {"id": {"$in": prod_ids}}, {"_id": 0, "id": 1, "tanggal": 1}
+    ).to_list(None)
+    for p in produksis:
+        await db.gaji.update_many(
+            {"id_produksi": p['id'], "tanggal_produksi": {"$exists": False}},
+            {"$set": {"tanggal_produksi": p['tanggal']}}
+        )
+    return len(produksis)
+
+async def backfill_retur_penjualan():
+    # Penjualan lama belum punya counter return: hitung sekali dari return_penjualan.
+    # Dijalankan lewat migrasi_sekali (filter $exists tidak punya index).
+    pipeline = [{"$group": {
+        "_id": "$penjualan_id",
+        "retur_3k_pcs": {"$sum": "$tempe_3k_return"},
+        "retur_5k_pcs": {"$sum": "$tempe_5k_return"},
+        "retur_10k_pcs": {"$sum": "$tempe_10k_return"},
+        "nilai_retur": {"$sum": "$total_return"},
+    }}]
+    ops = []
+    async for r in db.return_penjualan.aggregate(pipeline):
+        counter = {k: r[k] for k in ("retur_3k_pcs", "retur_5k_pcs", "retur_10k_pcs", "nilai_retur")}
+        ops.append(UpdateOne({"id": r["_id"], "retur_3k_pcs": {"$exists": False}}, {"$set": counter}))
+    if ops:
+        await db.penjualan.bulk_write(ops, ordered=False)
+    hasil = await db.penjualan.update_many(
+        {"retur_3k_pcs": {"$exists": False}},
+        {"$set": {"retur_3k_pcs": 0, "retur_5k_pcs": 0, "retur_10k_pcs": 0, "nilai_retur": 0}}
+    )
+    return len(ops) + hasil.modified_count
+
 # from pydantic import BaseModel
 from typing import List
 import uuid
@@ -263,7 +408,7 @@ async def bayar_gaji_batch(payload: BayarBatchRequest, user: dict = Depends(veri
     # Pastikan Anda sudah punya collection 'pengeluaran' di DB
     pengeluaran_doc = {
         "id": str(uuid.uuid4()),
-        "tanggal": datetime.now().isoformat(), # Tanggal hari ini
+        **kolom_tanggal(date.today()),         # Tanggal hari ini (kunci hari, bukan timestamp)
         "kategori_pengeluaran": "gaji",        # Kategori otomatis 'gaji'
         "jumlah": payload.total_nominal,       # Nominal dari frontend
         "keterangan": f"Gaji a.n {payload.nama_karyawan} ({len(payload.ids)} hari kerja)",
@@ -272,28 +417,38 @@ async def bayar_gaji_batch(payload: BayarBatchRequest, user: dict = Depends(veri
     }
     
     await db.pengeluaran.insert_one(pengeluaran_doc)
+    await bus.terbitkan(GajiDibayar(
+        tanggal=(pengeluaran_doc['tanggal'],),
+        perubahan=(delta_hari("pengeluaran", pengeluaran_doc['tanggal'], ringkasan={"total_pengeluaran": payload.total_nominal}),),
+        id_karyawan=tuple(await db.gaji.distinct("id_karyawan", {"id": {"$in": payload.ids}})),
+        user=user.get("username")
+    ))
 
     return {"message": "Pembayaran berhasil dan tercatat di pengeluaran"}
 
 @api_router.post("/karyawan", response_model=Karyawan)
-async def create_karyawan(data: KaryawanCreate, _: dict = Depends(verify_token)):
+async def create_karyawan(data: KaryawanCreate, user: dict = Depends(verify_token)):
     import uuid
     
     # 1. Buat User Baru (Username = Nama, Password = 12345678)
     # Sanitasi username (hapus spasi, lowercase) agar aman
     username = data.nama.lower().replace(" ", "")
-    hashed_password = bcrypt.hashpw("12345678".encode('utf-8'), bcrypt.gensalt())
     
-    # Cek username ganda
+    # Cek username ganda (sebelum hashing supaya request gagal tidak makan waktu bcrypt)
     existing_user = await db.users.find_one({"username": username})
     if existing_user:
         raise HTTPException(status_code=400, detail=f"Username '{username}' sudah digunakan. Gunakan nama lain.")
 
-    user_id = await db.users.insert_one({
-        "username": username,
-        "password": hashed_password.decode('utf-8'),
-        "role": "karyawan" # Opsional: jika ingin membedakan role
-    })
+    hashed_password = await password.hash_password("12345678")
+
+    try:
+        user_id = await db.users.insert_one({
+            "username": username,
+            "password": hashed_password,
+            "role": "karyawan" # Opsional: jika ingin membedakan role
+        })
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail=f"Username '{username}' sudah digunakan. Gunakan nama lain.")
 
     # 2. Buat Data Karyawan
     karyawan_doc = {
@@ -307,15 +462,16 @@ async def create_karyawan(data: KaryawanCreate, _: dict = Depends(verify_token))
     }
     
     await db.karyawan.insert_one(karyawan_doc)
+    await bus.terbitkan(KaryawanDiubah(id_karyawan=(karyawan_doc['id'],), user=user.get("username")))
     return Karyawan(**karyawan_doc)
 
 @api_router.get("/karyawan", response_model=List[Karyawan])
-async def get_karyawan(_: dict = Depends(verify_token)):
-    karyawan_list = await db.karyawan.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    return [Karyawan(**k) for k in karyawan_list]
+async def get_karyawan(response: Response, halaman: Halaman = Depends(param_halaman), _: dict = Depends(verify_token), _etag=etag("karyawan")):
+    karyawan_list = await get_halaman(db.karyawan, {}, "created_at", halaman, response, proyeksi(Karyawan))
+    return respon_list(Karyawan, karyawan_list, response)
 
 @api_router.put("/karyawan/{id_karyawan}", response_model=Karyawan)
-async def update_karyawan(id_karyawan: str, data: KaryawanUpdate, _: dict = Depends(verify_token)):
+async def update_karyawan(id_karyawan: str, data: KaryawanUpdate, user: dict = Depends(verify_token)):
     # Cek exist
     existing = await db.karyawan.find_one({"id": id_karyawan})
     if not existing:
@@ -329,50 +485,63 @@ async def update_karyawan(id_karyawan: str, data: KaryawanUpdate, _: dict = Depe
     }
     
     await db.karyawan.update_one({"id": id_karyawan}, {"$set": update_data})
+    await bus.terbitkan(KaryawanDiubah(id_karyawan=(id_karyawan,), user=user.get("username")))
     return {**existing, **update_data}
 
 
 @api_router.get("/gaji", response_model=List[Gaji])
-async def get_gaji(_: dict = Depends(verify_token)):
-    # 1. Ambil data gaji
-    gaji_list = await db.gaji.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    if not gaji_list:
-        return []
-
-    # 2. Siapkan ID untuk Lookup
-    prod_ids = list(set([g['id_produksi'] for g in gaji_list]))
-    karyawan_ids = list(set([g['id_karyawan'] for g in gaji_list]))
-
-    # 3. Lookup Data
-    produksis = await db.produksi_harian.find({"id": {"$in": prod_ids}}).to_list(1000)
-    karyawans = await db.karyawan.find({"id": {"$in": karyawan_ids}}).to_list(1000)
-
-    prod_map = {p['id']: p['tanggal'] for p in produksis}
-    
-    # Map Karyawan: Simpan object lengkap untuk ambil gaji_harian
-    karyawan_map = {k['id']: k for k in karyawans} 
-
-    hasil = []
+async def get_gaji(
+    response: Response,
+    halaman: Halaman = Depends(param_halaman),
+    id_karyawan: Optional[str] = None,
+    status_bayar: Optional[bool] = None,
+    terverifikasi: Optional[bool] = None,
+    _: dict = Depends(verify_token),
+    _etag=etag("gaji", "karyawan")
+):
+    # 1. Filter (semua didukung index id_karyawan + tanggal_produksi)
+    base_filter = {}
+    if id_karyawan:
+        base_filter["id_karyawan"] = id_karyawan
+    if status_bayar is not None:
+        base_filter["status_bayar"] = status_bayar
+    if terverifikasi is not None:
+        # Nominal terisi (> 0) artinya sudah diverifikasi
+        base_filter["nominal"] = {"$gt": 0} if terverifikasi else {"$in": [0, None]}
+
+    # 2. Satu pipeline: filter -> urut -> potong halaman -> join karyawan
+    # Join dilakukan setelah $limit supaya hanya baris di halaman ini yang di-lookup
+    pipeline = [
+        {"$match": query_halaman(base_filter, "tanggal_produksi", halaman)},
+        {"$sort": {"tanggal_produksi": -1, "id": -1}},
+        {"$limit": halaman.limit + 1},
+        {"$lookup": {
+            "from": "karyawan",
+            "localField": "id_karyawan",
+            "foreignField": "id",
+            "as": "karyawan"
+        }},
+        {"$addFields": {
+            "nama_karyawan": {"$ifNull": [{"$arrayElemAt": ["$karyawan.nama", 0]}, "Unknown"]},
+            # Kirimkan gaji_harian master sebagai 'nominal_standar' agar bisa tampil di FE
+            "nominal_standar": {"$ifNull": [{"$arrayElemAt": ["$karyawan.gaji_harian", 0]}, 0]}
+        }},
+        {"$project": {"_id": 0, "karyawan": 0}}
+    ]
+    gaji_list = await db.gaji.aggregate(pipeline).to_list(halaman.limit + 1)
+    gaji_list = potong_halaman(gaji_list, "tanggal_produksi", halaman, response)
+    # Placeholder baru diisi setelah cursor dibuat (cursor "Unknown" > semua tanggal = loop)
     for g in gaji_list:
-        # Ambil data karyawan terkait
-        ky = karyawan_map.get(g['id_karyawan'])
-        
-        g['nama_karyawan'] = ky['nama'] if ky else "Unknown"
-        g['tanggal_produksi'] = prod_map.get(g['id_produksi'], "Unknown")
-        
-        # LOGIKA TAMPILAN:
-        # Kirimkan gaji_harian master sebagai 'nominal_standar' agar bisa tampil di FE
-        g['nominal_standar'] = ky['gaji_harian'] if ky else 0
-        
-        hasil.append(Gaji(**g))
-    
-    return sorted(hasil, key=lambda x: x.tanggal_produksi, reverse=True)
+        if not g.get("tanggal_produksi"):
+            g["tanggal_produksi"] = "Unknown"
+
+    return respon_list(Gaji, gaji_list, response)
 
 
 # ENDPOINT BARU: VERIFIKASI (Tombol Selesai di Tabel)
 # Gunanya: Mengunci nominal ke DB dan memasukkannya ke antrian Card Akumulasi
 @api_router.patch("/gaji/{id_gaji}/verifikasi")
-async def verifikasi_gaji(id_gaji: str, _: dict = Depends(verify_token)):
+async def verifikasi_gaji(id_gaji: str, user: dict = Depends(verify_token)):
     # Cari Gaji
     gaji_doc = await db.gaji.find_one({"id": id_gaji})
     if not gaji_doc:
@@ -390,18 +559,30 @@ async def verifikasi_gaji(id_gaji: str, _: dict = Depends(verify_token)):
         {"id": id_gaji},
         {"$set": {"nominal": nominal_fix}}
     )
+    await bus.terbitkan(GajiDiubah(
+        tanggal=(gaji_doc.get('tanggal_produksi'),) if gaji_doc.get('tanggal_produksi') else (),
+        id_karyawan=(gaji_doc['id_karyawan'],),
+        user=user.get("username")
+    ))
     return {"message": "Gaji diverifikasi", "nominal": nominal_fix}
 
 
 # ENDPOINT UPDATE: BAYAR (Tombol Bayar di Card)
 # Gunanya: Melunasi gaji yang sudah diverifikasi
 @api_router.patch("/gaji/{id_gaji}/bayar")
-async def bayar_gaji(id_gaji: str, _: dict = Depends(verify_token)):
+async def bayar_gaji(id_gaji: str, user: dict = Depends(verify_token)):
     # Set status_bayar jadi True
-    await db.gaji.update_one(
+    gaji_doc = await db.gaji.find_one_and_update(
         {"id": id_gaji},
-        {"$set": {"status_bayar": True}}
+        {"$set": {"status_bayar": True}},
+        projection={"_id": 0, "id_karyawan": 1, "tanggal_produksi": 1}
     )
+    if gaji_doc:
+        await bus.terbitkan(GajiDiubah(
+            tanggal=(gaji_doc['tanggal_produksi'],) if gaji_doc.get('tanggal_produksi') else (),
+            id_karyawan=(gaji_doc['id_karyawan'],),
+            user=user.get("username")
+        ))
     return {"message": "Gaji lunas"}
 
 @api_router.post("/auth/login", response_model=LoginResponse)
@@ -410,108 +591,243 @@ async def login(request: LoginRequest):
     if not user:
         raise HTTPException(status_code=401, detail="Username atau password salah")
     
-    if not bcrypt.checkpw(request.password.encode('utf-8'), user['password'].encode('utf-8')):
+    if not await password.verify_password(request.password, user['password']):
         raise HTTPException(status_code=401, detail="Username atau password salah")
+
+    # Hash lama dengan cost factor berbeda diganti dengan cost saat ini
+    if password.perlu_rehash(user['password']):
+        hashed = await password.hash_password(request.password)
+        await db.users.update_one(
+            {"username": user['username'], "password": user['password']},
+            {"$set": {"password": hashed}}
+        )
     
     token = jwt.encode({"username": user['username']}, SECRET_KEY, algorithm=ALGORITHM)
     return LoginResponse(token=token, username=user['username'])
 
 @api_router.get("/dashboard/summary")
-async def get_dashboard_summary(tanggal: Optional[str] = None, _: dict = Depends(verify_token)):
-    if not tanggal:
-        tanggal = date.today().isoformat()
-    
-    # 1. Total produksi hari ini (Tetap)
-    produksi = await db.produksi_harian.find_one({"tanggal": tanggal}, {"_id": 0})
-    total_produksi = produksi['total_produksi'] if produksi else 0
-    
-    # 2. Ambil semua data penjualan hari ini
-    penjualan_list = await db.penjualan.find({"tanggal": tanggal}, {"_id": 0}).to_list(1000)
-    
-    # --- PERBAIKAN DISINI ---
-    # Hitung terpisah antara LUNAS (Uang Masuk) dan TEMPO (Piutang)
-    total_uang_masuk = 0
-    total_piutang = 0 # Opsional: jika nanti ingin ditampilkan di dashboard
-    
-    for p in penjualan_list:
-        # Pastikan field status ada, default ke Lunas jika data lama tidak punya status
-        status = p.get('status_pembayaran', 'Lunas') 
-        
-        if status == 'Lunas':
-            total_uang_masuk += p['total_penjualan']
-        else:
-            total_piutang += p['total_penjualan']
+async def get_dashboard_summary(
+    tanggal: Optional[date] = None,
+    _: dict = Depends(verify_token),
+    _etag=etag("produksi_harian", "penjualan", "return_penjualan", "pengeluaran", harian=True)
+):
+    # Kunci hari kanonik, sama persis dengan field tanggal yang tersimpan
+    tanggal = (tanggal or date.today()).isoformat()
+
+    cached = dashboard_cache.get(tanggal)
+    if cached is not None:
+        return cached
+    generasi = dashboard_cache.generasi(tanggal)
+
+    # Semua total dihitung di database dan dijalankan bersamaan
+    async def total_satu(koleksi, group):
+        hasil = await db[koleksi].aggregate([
+            {"$match": {"tanggal": tanggal}},
+            {"$group": {"_id": None, **group}}
+        ]).to_list(1)
+        return hasil[0] if hasil else {}
+
+    # Hanya yang LUNAS dihitung sebagai uang masuk (piutang dari ledger, lihat /piutang)
+    # Data lama tanpa field status dianggap Lunas
+    status_lunas = {"$eq": [{"$ifNull": ["$status_pembayaran", "Lunas"]}, "Lunas"]}
+
+    produksi, penjualan, retur, pengeluaran = await asyncio.gather(
+        db.produksi_harian.find_one({"tanggal": tanggal}, {"_id": 0, "total_produksi": 1}),
+        total_satu("penjualan", {
+            "uang_masuk": {"$sum": {"$cond": [status_lunas, "$total_penjualan", 0]}},
+        }),
+        total_satu("return_penjualan", {"total": {"$sum": "$total_return"}}),
+        total_satu("pengeluaran", {"total": {"$sum": "$jumlah"}}),
+    )
 
-    # 3. Total return hari ini (Tetap)
+    total_produksi = produksi['total_produksi'] if produksi else 0
+    total_uang_masuk = penjualan.get('uang_masuk', 0)
     # Asumsi: Return mengurangi uang kas
-    return_list = await db.return_penjualan.find({"tanggal": tanggal}, {"_id": 0}).to_list(1000)
-    total_return = sum(r['total_return'] for r in return_list)
-    
-    # 4. Total pengeluaran hari ini (Tetap)
-    pengeluaran_list = await db.pengeluaran.find({"tanggal": tanggal}, {"_id": 0}).to_list(1000)
-    total_pengeluaran = sum(p['jumlah'] for p in pengeluaran_list)
-    
-    # 5. Hitung Omzet & Laba (CASH BASIS)
-    # Omzet sekarang hanya menghitung uang yang statusnya LUNAS dikurangi Return
+    total_return = retur.get('total', 0)
+    total_pengeluaran = pengeluaran.get('total', 0)
+
+    # Omzet (CASH BASIS): hanya uang yang statusnya LUNAS dikurangi Return
     omzet_bersih = total_uang_masuk - total_return
     
     # Laba = Omzet Bersih - Pengeluaran
     laba_bersih = omzet_bersih - total_pengeluaran
     
-    return DashboardSummary(
+    summary = DashboardSummary(
         total_produksi_hari_ini=total_produksi,
         total_penjualan_hari_ini=omzet_bersih, # Ini sekarang hanya menampilkan Cash In
         total_pengeluaran_hari_ini=total_pengeluaran,
         laba_hari_ini=laba_bersih
     )
+    dashboard_cache.set(tanggal, summary, generasi)
+    return summary
+
+def delta_live_penjualan(tanggal: str, docs: List[dict]) -> dict:
+    # Stok keluar + uang masuk dashboard (hanya nota Lunas) untuk penjualan di satu tanggal
+    return delta_hari(
+        "penjualan", tanggal,
+        stok=gabung_delta(*(delta_dari_doc("jual", d) for d in docs)),
+        ringkasan={"total_penjualan": sum(d['total_penjualan'] for d in docs if not is_tempo(d))}
+    )
+
+def buat_docs_penjualan(data_list: List[PenjualanCreate], master_list: List[Optional[dict]]) -> List[dict]:
+    # Harga dihitung sekaligus dari tabel harga in-memory (versi yang berlaku di tanggal penjualan).
+    # master_list: master pembeli per baris (hasil pembeli_untuk), nama pembeli ikut nama master.
+    # Dipakai bersama oleh create_penjualan dan import massal.
+    harga_list = tabel_harga.hitung_batch([
+        {
+            "tanggal": data.tanggal.isoformat(),
+            "kategori": data.kategori_pembeli.value,
+            "pcs": {"3k": data.tempe_3k_pcs, "5k": data.tempe_5k_pcs, "10k": data.tempe_10k_pcs},
+        }
+        for data in data_list
+    ])
+
+    docs = []
+    for data, harga, master in zip(data_list, harga_list, master_list):
+        docs.append({
+            "id": str(uuid.uuid4()),
+            **kolom_tanggal(data.tanggal),
+            "tanggal_penjualan": data.tanggal_penjualan.isoformat() if data.tanggal_penjualan else None,
+            "pembeli": master['nama'] if master else data.pembeli,
+            "id_pembeli": master['id'] if master else None,
+            "kategori_pembeli": data.kategori_pembeli.value,
+            "tempe_3k_pcs": data.tempe_3k_pcs,
+            "tempe_5k_pcs": data.tempe_5k_pcs,
+            "tempe_10k_pcs": data.tempe_10k_pcs,
+            "subtotal_3k": harga["subtotal"]["3k"],
+            "subtotal_5k": harga["subtotal"]["5k"],
+            "subtotal_10k": harga["subtotal"]["10k"],
+            "total_penjualan": harga["total"],
+            "harga_versi": harga["versi"],
+            "retur_3k_pcs": 0,
+            "retur_5k_pcs": 0,
+            "retur_10k_pcs": 0,
+            "nilai_retur": 0,
+            "status_pembayaran": data.status_pembayaran.value,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        })
+    return docs
+
 @api_router.post("/penjualan", response_model=Penjualan)
-async def create_penjualan(data: PenjualanCreate, _: dict = Depends(verify_token)):
-    # --- LOGIKA BARU HARGA BERDASARKAN KATEGORI ---
-    
-    # Default harga (Eceran)
-    harga_3k = 3000
-    harga_5k = 5000
-    harga_10k = 10000
-
-    # Jika Grosir, ubah harga tertentu
-    if data.kategori_pembeli == KategoriPembeli.grosir:
-        harga_3k = 2500
-        harga_5k = 4000
-        # Harga 10k tetap 10000 sesuai request ("lainnya tetap sama")
-    
-    # Hitung subtotal menggunakan harga dinamis
-    subtotal_3k = data.tempe_3k_pcs * harga_3k
-    subtotal_5k = data.tempe_5k_pcs * harga_5k
-    subtotal_10k = data.tempe_10k_pcs * harga_10k
-    
-    total_penjualan = subtotal_3k + subtotal_5k + subtotal_10k
-    # ---------------------------------------------
-    print("===============================================================================")
-    print("===============================================================================")
-    print(data)
-    
-    import uuid
-    doc = {
-        "id": str(uuid.uuid4()),
-        "tanggal": data.tanggal.isoformat(),
-        "tanggal_penjualan": data.tanggal_penjualan.isoformat() if data.tanggal_penjualan else None,
-        "pembeli": data.pembeli,
-        "kategori_pembeli": data.kategori_pembeli.value,
-        "tempe_3k_pcs": data.tempe_3k_pcs,
-        "tempe_5k_pcs": data.tempe_5k_pcs,
-        "tempe_10k_pcs": data.tempe_10k_pcs,
-        "subtotal_3k": subtotal_3k,
-        "subtotal_5k": subtotal_5k,
-        "subtotal_10k": subtotal_10k,
-        "total_penjualan": total_penjualan,
-        "status_pembayaran": data.status_pembayaran.value,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    await db.penjualan.insert_one(doc)
+async def create_penjualan(data: PenjualanCreate, user: dict = Depends(verify_token)):
+    master = await pembeli_untuk(db, [data])
+    if data.id_pembeli and master[0] is None:
+        raise HTTPException(status_code=404, detail="Pembeli tidak ditemukan")
+    doc = buat_docs_penjualan([data], master)[0]
+
+    # Simpan penjualan + kurangi stok dalam satu transaksi
+    async def _simpan(session):
+        await db.penjualan.insert_one(doc, session=session)
+        await catat_stok(db, doc['tanggal'], delta_dari_doc("jual", doc), session=session)
+        if is_tempo(doc):
+            await catat_piutang(db, piutang_dari_doc(doc), session=session)
+
+    await jalankan_transaksi(_simpan)
+    await bus.terbitkan(PenjualanDicatat(
+        tanggal=(doc['tanggal'],),
+        perubahan=(delta_live_penjualan(doc['tanggal'], [doc]),),
+        pembeli=doc['pembeli'],
+        user=user.get("username")
+    ))
     return Penjualan(**doc)
 
+@api_router.post("/penjualan/import", response_model=ImportHasil)
+async def import_penjualan(request: Request, format: Optional[str] = None, user: dict = Depends(verify_token)):
+    # Import massal penjualan dari NDJSON (satu object per baris) atau CSV (baris pertama header).
+    # Body dibaca per baris, divalidasi & dihitung harganya sama seperti create_penjualan,
+    # lalu disimpan per batch dengan insert_many unordered.
+    fmt = tebak_format(request.headers.get("content-type"), format)
+    if fmt not in (FORMAT_NDJSON, FORMAT_CSV):
+        raise HTTPException(status_code=400, detail="Format harus ndjson atau csv")
+
+    errors: List[ImportGagal] = []
+    diterima = 0
+    batch = []  # list of (nomor_baris, PenjualanCreate)
+
+    async def simpan_batch(batch):
+        # Master pembeli dicari/dibuat sekali untuk seluruh batch
+        master_list = await pembeli_untuk(db, [data for _, data in batch])
+        valid = []
+        for (nomor, data), master in zip(batch, master_list):
+            if data.id_pembeli and master is None:
+                errors.append(ImportGagal(baris=nomor, error="id_pembeli: Pembeli tidak ditemukan"))
+            else:
+                valid.append((nomor, data, master))
+        if not valid:
+            return 0
+        batch = [(nomor, data) for nomor, data, _ in valid]
+        docs = buat_docs_penjualan([data for _, data, _ in valid], [master for _, _, master in valid])
+        gagal = {}
+
+        async def _simpan(session):
+            gagal.clear()
+            try:
+                await db.penjualan.insert_many(docs, ordered=False, session=session)
+            except BulkWriteError as e:
+                if session is not None:
+                    raise
+                # Tanpa transaksi: sebagian dokumen tetap tersimpan, catat yang gagal saja
+                for err in e.details.get("writeErrors", []):
+                    gagal[err["index"]] = err.get("errmsg", "Gagal disimpan")
+
+            # Ledger stok diupdate sekali per tanggal, bukan per baris
+            per_tanggal = {}
+            for i, doc in enumerate(docs):
+                if i not in gagal:
+                    per_tanggal[doc['tanggal']] = gabung_delta(per_tanggal.get(doc['tanggal'], {}), delta_dari_doc("jual", doc))
+            for tanggal, delta in per_tanggal.items():
+                await catat_stok(db, tanggal, delta, session=session)
+
+            # Piutang dari nota Tempo digabung per (pembeli, tanggal) lalu ditulis sekali
+            await catat_piutang(db, gabung_piutang(*(
+                piutang_dari_doc(doc) for i, doc in enumerate(docs) if i not in gagal and is_tempo(doc)
+            )), session=session)
+
+        try:
+            await jalankan_transaksi(_simpan)
+        except BulkWriteError as e:
+            # Dalam transaksi seluruh batch dibatalkan
+            for nomor, _ in batch:
+                errors.append(ImportGagal(baris=nomor, error=f"Batch dibatalkan: {e}"))
+            return 0
+
+        tersimpan = {}
+        for i, (nomor, _) in enumerate(batch):
+            if i in gagal:
+                errors.append(ImportGagal(baris=nomor, error=gagal[i]))
+            else:
+                tersimpan.setdefault(docs[i]['tanggal'], []).append(docs[i])
+        # Satu event per batch, delta digabung per tanggal
+        if tersimpan:
+            await bus.terbitkan(PenjualanDicatat(
+                tanggal=tuple(sorted(tersimpan)),
+                perubahan=tuple(delta_live_penjualan(tanggal, d) for tanggal, d in sorted(tersimpan.items())),
+                user=user.get("username")
+            ))
+        return len(batch) - len(gagal)
+
+    async for nomor, row, error in baca_baris(request.stream(), fmt):
+        if error:
+            errors.append(ImportGagal(baris=nomor, error=error))
+            continue
+        try:
+            data = PenjualanCreate(**row)
+        except ValidationError as e:
+            errors.append(ImportGagal(baris=nomor, error=pesan_validasi(e)))
+            continue
+
+        batch.append((nomor, data))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            diterima += await simpan_batch(batch)
+            batch = []
+
+    if batch:
+        diterima += await simpan_batch(batch)
+
+    return ImportHasil(diterima=diterima, gagal=len(errors), errors=errors)
+
 @api_router.patch("/penjualan/{id_penjualan}/toggle-status", response_model=Penjualan)
-async def toggle_status_penjualan(id_penjualan: str, _: dict = Depends(verify_token)):
+async def toggle_status_penjualan(id_penjualan: str, user: dict = Depends(verify_token)):
     # 1. Cari data penjualan berdasarkan ID
     existing_penjualan = await db.penjualan.find_one({"id": id_penjualan}, {"_id": 0})
     
@@ -530,55 +846,74 @@ async def toggle_status_penjualan(id_penjualan: str, _: dict = Depends(verify_to
         # Jika status Lunas (atau lainnya), ubah jadi Tempo
         new_status = StatusPembayaran.tempo.value
 
-    # 3. Update database
-    await db.penjualan.update_one(
-        {"id": id_penjualan},
-        {"$set": {"status_pembayaran": new_status}}
-    )
-
-    # 4. Update object di memory untuk return response yang akurat tanpa query ulang
-    existing_penjualan["status_pembayaran"] = new_status
-    
-    return Penjualan(**existing_penjualan)
+    # 3. Update database + ledger piutang dalam satu transaksi.
+    # Filter status lama: kalau status sudah diubah request lain, toggle ini ditolak
+    # (supaya piutang tidak dikurangi/ditambah dua kali).
+    async def _ubah(session):
+        doc = await db.penjualan.find_one_and_update(
+            {"id": id_penjualan, "status_pembayaran": current_status},
+            {"$set": {"status_pembayaran": new_status}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if not doc:
+            raise HTTPException(status_code=409, detail="Status penjualan sudah diubah, muat ulang data")
+        tanda = 1 if new_status == StatusPembayaran.tempo.value else -1
+        await catat_piutang(db, piutang_dari_doc(doc, tanda), session=session)
+        return doc
+
+    updated = await jalankan_transaksi(_ubah)
+
+    # Lunas -> masuk uang dashboard, Tempo -> keluar
+    tanda = -1 if new_status == StatusPembayaran.tempo.value else 1
+    await bus.terbitkan(StatusPenjualanDiubah(
+        tanggal=(updated['tanggal'],),
+        perubahan=(delta_hari("penjualan", updated['tanggal'], ringkasan={"total_penjualan": tanda * updated['total_penjualan']}),),
+        pembeli=updated['pembeli'],
+        user=user.get("username")
+    ))
+
+    return Penjualan(**updated)
 
 @api_router.get("/penjualan", response_model=List[Penjualan])
-async def get_penjualan(_: dict = Depends(verify_token)):
-    penjualan_list = await db.penjualan.find({}, {"_id": 0}).sort("tanggal", -1).to_list(1000)
-    return [Penjualan(**p) for p in penjualan_list]
+async def get_penjualan(
+    response: Response,
+    halaman: Halaman = Depends(param_halaman),
+    id_pembeli: Optional[str] = None,
+    _: dict = Depends(verify_token),
+    _etag=etag("penjualan")
+):
+    # Filter id_pembeli = riwayat satu pembeli (index id_pembeli + tanggal)
+    base_filter = {"id_pembeli": id_pembeli} if id_pembeli else {}
+    penjualan_list = await get_halaman(db.penjualan, base_filter, "tanggal", halaman, response, proyeksi(Penjualan))
+    return respon_list(Penjualan, penjualan_list, response)
 
 @api_router.post("/return", response_model=ReturnPenjualan)
-async def create_return(data: ReturnPenjualanCreate, _: dict = Depends(verify_token)):
+async def create_return(data: ReturnPenjualanCreate, user: dict = Depends(verify_token)):
     # Verify penjualan exists
     penjualan = await db.penjualan.find_one({"id": data.penjualan_id}, {"_id": 0})
     if not penjualan:
         raise HTTPException(status_code=404, detail="Penjualan tidak ditemukan")
+
+    qty_return = {"3k": data.tempe_3k_return, "5k": data.tempe_5k_return, "10k": data.tempe_10k_return}
+    if not any(qty_return.values()):
+        raise HTTPException(status_code=400, detail="Jumlah return tidak boleh kosong")
     
-    # --- LOGIKA BARU RETURN BERDASARKAN KATEGORI ASAL ---
-    
-    # Cek kategori dari data penjualan aslinya
-    kategori_asal = penjualan.get('kategori_pembeli')
-    
-    # Set harga default (Eceran / Legacy data)
-    harga_3k = 3000
-    harga_5k = 5000
-    harga_10k = 10000
-
-    # Jika pembelian aslinya adalah Grosir, gunakan harga grosir
-    if kategori_asal == "Grosir":
-        harga_3k = 2500
-        harga_5k = 4000
-        # Harga 10k tetap
-    
-    # Calculate total return menggunakan harga yang sesuai
-    total_return = (data.tempe_3k_return * harga_3k) + \
-                   (data.tempe_5k_return * harga_5k) + \
-                   (data.tempe_10k_return * harga_10k)
-    # ----------------------------------------------------
+    # Return dihitung dengan harga yang dipakai saat penjualan aslinya:
+    # versi harga yang tersimpan di penjualan, atau (data lama) versi yang berlaku di tanggal penjualan.
+    # Kategori kosong di data lama dianggap Eceran.
+    total_return = tabel_harga.hitung_batch([{
+        "tanggal": penjualan['tanggal'],
+        "kategori": penjualan.get('kategori_pembeli') or KategoriPembeli.eceran.value,
+        "versi": penjualan.get('harga_versi'),
+        "pcs": qty_return,
+    }])[0]["total"]
     
     import uuid
     doc = {
         "id": str(uuid.uuid4()),
-        "tanggal": data.tanggal.isoformat(),
+        **kolom_tanggal(data.tanggal),
         "penjualan_id": data.penjualan_id,
         "tempe_3k_return": data.tempe_3k_return,
         "tempe_5k_return": data.tempe_5k_return,
@@ -587,13 +922,45 @@ async def create_return(data: ReturnPenjualanCreate, _: dict = Depends(verify_to
         "keterangan": data.keterangan,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.return_penjualan.insert_one(doc)
+
+    # Tambah counter return di penjualan hanya jika total return per SKU tidak melebihi
+    # jumlah terjual. Cek + update satu operasi atomik, jadi dua return bersamaan
+    # tidak bisa lolos bersama-sama melewati batas.
+    batas = [
+        {"$lte": [{"$add": [{"$ifNull": [f"$retur_{sku}_pcs", 0]}, n]}, {"$ifNull": [f"$tempe_{sku}_pcs", 0]}]}
+        for sku, n in qty_return.items() if n
+    ]
+    inc = {f"retur_{sku}_pcs": n for sku, n in qty_return.items() if n}
+    inc["nilai_retur"] = total_return
+
+    async def _simpan(session):
+        asal = await db.penjualan.find_one_and_update(
+            {"id": data.penjualan_id, "$expr": {"$and": batas}},
+            {"$inc": inc},
+            projection={"_id": 0, "id_pembeli": 1, "tanggal": 1, "status_pembayaran": 1},
+            session=session
+        )
+        if not asal:
+            raise HTTPException(status_code=400, detail="Jumlah return melebihi sisa penjualan yang belum diretur")
+        await db.return_penjualan.insert_one(doc, session=session)
+        await catat_stok(db, doc['tanggal'], delta_dari_doc("ret", doc), session=session)
+        # Return atas nota Tempo mengurangi tagihan pembeli
+        if is_tempo(asal):
+            await catat_piutang(db, {(asal.get('id_pembeli'), asal['tanggal']): [-total_return, 0]}, session=session)
+
+    await jalankan_transaksi(_simpan)
+    await bus.terbitkan(ReturnDicatat(
+        tanggal=(doc['tanggal'],),
+        perubahan=(delta_hari("return", doc['tanggal'], stok=delta_dari_doc("ret", doc), ringkasan={"total_penjualan": -total_return}),),
+        pembeli=penjualan['pembeli'],
+        user=user.get("username")
+    ))
     return ReturnPenjualan(**doc)
 
 @api_router.get("/return", response_model=List[ReturnPenjualan])
-async def get_return(_: dict = Depends(verify_token)):
-    return_list = await db.return_penjualan.find({}, {"_id": 0}).sort("tanggal", -1).to_list(1000)
-    return [ReturnPenjualan(**r) for r in return_list]
+async def get_return(response: Response, halaman: Halaman = Depends(param_halaman), _: dict = Depends(verify_token), _etag=etag("return_penjualan")):
+    return_list = await get_halaman(db.return_penjualan, {}, "tanggal", halaman, response, proyeksi(ReturnPenjualan))
+    return respon_list(ReturnPenjualan, return_list, response)
 
 # --- [UPDATE MODEL] ---
 
@@ -624,7 +991,7 @@ class ProduksiHarianResponse(BaseModel):
 
 # --- [UPDATE ENDPOINT POST] ---
 @api_router.post("/produksi", response_model=ProduksiHarianResponse)
-async def create_produksi(data: ProduksiHarianCreate, _: dict = Depends(verify_token)):
+async def create_produksi(data: ProduksiHarianCreate, user: dict = Depends(verify_token)):
     # 1. Validasi Tanggal
     cek_tanggal = await db.produksi_harian.find_one({"tanggal": data.tanggal.isoformat()})
     if cek_tanggal:
@@ -636,7 +1003,7 @@ async def create_produksi(data: ProduksiHarianCreate, _: dict = Depends(verify_t
     # 2. Simpan Produksi (TANPA DATA PEKERJA SAMA SEKALI)
     doc_prod = {
         "id": prod_id,
-        "tanggal": data.tanggal.isoformat(),
+        **kolom_tanggal(data.tanggal),
         "kedelai_kg": data.kedelai_kg,
         "tempe_3k_produksi": data.tempe_3k_produksi,
         "tempe_5k_produksi": data.tempe_5k_produksi,
@@ -646,7 +1013,15 @@ async def create_produksi(data: ProduksiHarianCreate, _: dict = Depends(verify_t
         "created_at": datetime.now(timezone.utc).isoformat()
         # Field 'jumlah_pekerja' dan 'pekerja' TIDAK DISIMPAN DISINI
     }
-    await db.produksi_harian.insert_one(doc_prod)
+    async def _simpan(session):
+        await db.produksi_harian.insert_one(doc_prod, session=session)
+        await catat_stok(db, doc_prod['tanggal'], delta_dari_doc("prod", doc_prod), session=session)
+
+    try:
+        await jalankan_transaksi(_simpan)
+    except DuplicateKeyError:
+        # Index unik tanggal menangkap request ganda yang lolos validasi di atas
+        raise HTTPException(status_code=400, detail=f"Data produksi tanggal {data.tanggal} sudah ada!")
 
     # 3. Simpan Gaji (Relasi: id_produksi -> id_karyawan)
     docs_gaji = []
@@ -662,6 +1037,7 @@ async def create_produksi(data: ProduksiHarianCreate, _: dict = Depends(verify_t
                 "id": str(uuid.uuid4()),
                 "id_produksi": prod_id,
                 "id_karyawan": id_karyawan,
+                "tanggal_produksi": doc_prod['tanggal'],
                 "nominal": 0, 
                 "status_bayar": False,
                 "created_at": datetime.now(timezone.utc).isoformat()
@@ -670,7 +1046,16 @@ async def create_produksi(data: ProduksiHarianCreate, _: dict = Depends(verify_t
                 nama_pekerja_list.append(nama_map[id_karyawan])
     
         await db.gaji.insert_many(docs_gaji)
-    
+    await bus.terbitkan(ProduksiDicatat(
+        tanggal=(doc_prod['tanggal'],),
+        perubahan=(delta_hari(
+            "produksi", doc_prod['tanggal'], stok=delta_dari_doc("prod", doc_prod),
+            ringkasan={"total_produksi": doc_prod['total_produksi']}
+        ),),
+        id_karyawan=tuple(data.pekerja),
+        user=user.get("username")
+    ))
+
     # Return data (gabungkan data db + data barusan untuk response)
     return {
         **doc_prod, 
@@ -678,20 +1063,15 @@ async def create_produksi(data: ProduksiHarianCreate, _: dict = Depends(verify_t
         "nama_pekerja": nama_pekerja_list
     }
 
-# --- [UPDATE ENDPOINT GET - INI YANG PALING PENTING] ---
-@api_router.get("/produksi", response_model=List[ProduksiHarianResponse])
-async def get_produksi(_: dict = Depends(verify_token)):
-    # 1. Ambil Semua Data Produksi
-    produksi_list = await db.produksi_harian.find({}, {"_id": 0}).sort("tanggal", -1).to_list(1000)
-    if not produksi_list: return []
-
+# Isi jumlah_pekerja / nama_pekerja / paid_karyawan_ids dari tabel gaji (dipakai GET /produksi & /stok)
+async def lengkapi_pekerja(produksi_list: List[dict]) -> List[dict]:
     prod_ids = [p['id'] for p in produksi_list]
 
-    # 2. Ambil Data Gaji
-    gaji_list = await db.gaji.find({"id_produksi": {"$in": prod_ids}}).to_list(2000)
+    # Ambil Data Gaji
+    gaji_list = await db.gaji.find({"id_produksi": {"$in": prod_ids}}).to_list(None)
     
     karyawan_ids = list(set([g['id_karyawan'] for g in gaji_list]))
-    karyawan_list = await db.karyawan.find({"id": {"$in": karyawan_ids}}).to_list(1000)
+    karyawan_list = await db.karyawan.find({"id": {"$in": karyawan_ids}}).to_list(None)
     
     karyawan_map = {k['id']: k['nama'] for k in karyawan_list}
     
@@ -713,7 +1093,7 @@ async def get_produksi(_: dict = Depends(verify_token)):
             if pid not in prod_paid_map: prod_paid_map[pid] = []
             prod_paid_map[pid].append(kid) # Simpan ID Karyawan
 
-    # 3. Gabungkan Data Akhir
+    # Gabungkan Data Akhir
     final_result = []
     for p in produksi_list:
         workers = prod_worker_map.get(p['id'], [])
@@ -727,8 +1107,22 @@ async def get_produksi(_: dict = Depends(verify_token)):
 
     return final_result
 
+# --- [UPDATE ENDPOINT GET - INI YANG PALING PENTING] ---
+@api_router.get("/produksi", response_model=List[ProduksiHarianResponse])
+async def get_produksi(
+    response: Response,
+    halaman: Halaman = Depends(param_halaman),
+    _: dict = Depends(verify_token),
+    _etag=etag("produksi_harian", "gaji", "karyawan")
+):
+    # 1. Ambil Data Produksi (per halaman)
+    produksi_list = await get_halaman(db.produksi_harian, {}, "tanggal", halaman, response, proyeksi(ProduksiHarianResponse))
+    if not produksi_list: return respon_list(ProduksiHarianResponse, [], response)
+
+    return respon_list(ProduksiHarianResponse, await lengkapi_pekerja(produksi_list), response)
+
 @api_router.put("/produksi/{id_produksi}", response_model=ProduksiHarianResponse)
-async def update_produksi(id_produksi: str, data: ProduksiHarianCreate, _: dict = Depends(verify_token)):
+async def update_produksi(id_produksi: str, data: ProduksiHarianCreate, user: dict = Depends(verify_token)):
     # 1. Cek keberadaan data produksi
     existing_doc = await db.produksi_harian.find_one({"id": id_produksi})
     if not existing_doc:
@@ -738,7 +1132,7 @@ async def update_produksi(id_produksi: str, data: ProduksiHarianCreate, _: dict
     total_produksi = data.tempe_3k_produksi + data.tempe_5k_produksi + data.tempe_10k_produksi
     
     update_data = {
-        "tanggal": data.tanggal.isoformat(),
+        **kolom_tanggal(data.tanggal),
         "kedelai_kg": data.kedelai_kg,
         "tempe_3k_produksi": data.tempe_3k_produksi,
         "tempe_5k_produksi": data.tempe_5k_produksi,
@@ -747,74 +1141,116 @@ async def update_produksi(id_produksi: str, data: ProduksiHarianCreate, _: dict
         # Field 'pekerja' dan 'jumlah_pekerja' TIDAK diupdate disini secara langsung
     }
 
-    await db.produksi_harian.update_one(
-        {"id": id_produksi},
-        {"$set": update_data}
-    )
-
-    # --- 3. LOGIKA SINKRONISASI PEKERJA (TABEL GAJI) ---
-    
-    # A. Ambil daftar gaji/pekerja yang sudah ada di DB untuk produksi ini
-    existing_gaji_list = await db.gaji.find({"id_produksi": id_produksi}).to_list(1000)
-    
-    # Map: ID_Karyawan -> Data Gaji Lengkap
-    existing_map = {g['id_karyawan']: g for g in existing_gaji_list}
-    existing_ids = set(existing_map.keys())
-    
-    # B. Ambil daftar ID pekerja baru dari Form Frontend
-    new_ids = set(data.pekerja)
-
-    # C. Tentukan mana yang harus DITAMBAH (Insert)
-    ids_to_add = new_ids - existing_ids
-    
-    # D. Tentukan mana yang harus DIHAPUS (Delete)
-    ids_to_remove = existing_ids - new_ids
-
-    import uuid
-
-    # E. Eksekusi HAPUS (Hanya jika BELUM DIBAYAR)
-    for kid in ids_to_remove:
-        gaji_record = existing_map[kid]
-        if gaji_record.get('status_bayar') == True:
-            # Jika sudah dibayar, SKIP (Jangan dihapus walau user uncheck)
-            continue 
+    # Sesuaikan ledger stok: keluarkan angka lama, masukkan angka baru
+    delta_lama = delta_dari_doc("prod", existing_doc, tanda=-1)
+    delta_baru = delta_dari_doc("prod", update_data)
+    pindah_tanggal = existing_doc['tanggal'] != update_data['tanggal']
+
+    # B. Ambil daftar ID pekerja baru dari Form Frontend (urutan dipertahankan)
+    new_ids = list(dict.fromkeys(data.pekerja))
+
+    async def _simpan(session):
+        await db.produksi_harian.update_one(
+            {"id": id_produksi},
+            {"$set": update_data},
+            session=session
+        )
+        if not pindah_tanggal:
+            await catat_stok(db, update_data['tanggal'], gabung_delta(delta_lama, delta_baru), session=session)
         else:
-            # Jika belum dibayar, boleh dihapus
-            await db.gaji.delete_one({"id": gaji_record['id']})
-
-    # F. Eksekusi TAMBAH
-    if ids_to_add:
-        docs_to_insert = []
-        for kid in ids_to_add:
-            docs_to_insert.append({
+            await catat_stok(db, existing_doc['tanggal'], delta_lama, session=session)
+            await catat_stok(db, update_data['tanggal'], delta_baru, session=session)
+            # Status expired ikut pindah tanggal
+            if existing_doc.get('stat_exp'):
+                await set_stat_exp_harian(db, existing_doc['tanggal'], False, session=session)
+                await set_stat_exp_harian(db, update_data['tanggal'], True, session=session)
+
+        # --- 3. LOGIKA SINKRONISASI PEKERJA (TABEL GAJI) ---
+
+        # A. Ambil daftar gaji/pekerja yang sudah ada di DB untuk produksi ini
+        existing_gaji_list = await db.gaji.find(
+            {"id_produksi": id_produksi},
+            {"_id": 0, "id": 1, "id_karyawan": 1, "status_bayar": 1},
+            session=session
+        ).to_list(None)
+        existing_ids = {g['id_karyawan'] for g in existing_gaji_list}
+        ops = []
+
+        # Tanggal produksi ikut disalin ke gaji (dipakai untuk sort halaman gaji)
+        if pindah_tanggal:
+            ops.append(UpdateMany(
+                {"id_produksi": id_produksi},
+                {"$set": {"tanggal_produksi": update_data['tanggal']}}
+            ))
+
+        # C. HAPUS pekerja yang di-uncheck (Hanya jika BELUM DIBAYAR)
+        # Yang sudah dibayar tetap dipertahankan walau user uncheck
+        pekerja_final = []
+        for g in existing_gaji_list:
+            if g['id_karyawan'] in new_ids or g.get('status_bayar'):
+                pekerja_final.append(g)
+            else:
+                ops.append(DeleteOne({"id": g['id'], "status_bayar": {"$ne": True}}))
+
+        # D. TAMBAH pekerja baru
+        for kid in new_ids:
+            if kid in existing_ids:
+                continue
+            doc_gaji = {
                 "id": str(uuid.uuid4()),
                 "id_produksi": id_produksi,
                 "id_karyawan": kid,
+                "tanggal_produksi": update_data['tanggal'],
                 "nominal": 0,
                 "status_bayar": False,
                 "created_at": datetime.now(timezone.utc).isoformat()
-            })
-        if docs_to_insert:
-            await db.gaji.insert_many(docs_to_insert)
+            }
+            ops.append(InsertOne(doc_gaji))
+            pekerja_final.append(doc_gaji)
 
-    # --- 4. PERSIAPAN DATA RESPONSE ---
-    
-    # Ambil ulang data gaji terbaru setelah update untuk menghitung jumlah & nama
-    final_gaji_list = await db.gaji.find({"id_produksi": id_produksi}).to_list(1000)
-    
-    # Ambil nama karyawan
-    final_karyawan_ids = [g['id_karyawan'] for g in final_gaji_list]
-    karyawan_data = await db.karyawan.find({"id": {"$in": final_karyawan_ids}}).to_list(1000)
+        # E. Semua perubahan gaji dalam satu round trip
+        if ops:
+            await db.gaji.bulk_write(ops, ordered=True, session=session)
+        return pekerja_final
+
+    try:
+        pekerja_final = await jalankan_transaksi(_simpan)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail=f"Data produksi tanggal {data.tanggal} sudah ada!")
+    total_lama = existing_doc.get('total_produksi', 0)
+    if not pindah_tanggal:
+        perubahan = (delta_hari(
+            "produksi", update_data['tanggal'], stok=gabung_delta(delta_lama, delta_baru),
+            ringkasan={"total_produksi": total_produksi - total_lama}
+        ),)
+    else:
+        perubahan = (
+            delta_hari("produksi", existing_doc['tanggal'], stok=delta_lama, ringkasan={"total_produksi": -total_lama}),
+            delta_hari("produksi", update_data['tanggal'], stok=delta_baru, ringkasan={"total_produksi": total_produksi}),
+        )
+    await bus.terbitkan(ProduksiDiubah(
+        tanggal=tuple(dict.fromkeys((existing_doc['tanggal'], update_data['tanggal']))),
+        perubahan=perubahan,
+        id_karyawan=tuple(g['id_karyawan'] for g in pekerja_final),
+        user=user.get("username"),
+        stok_dimuat_ulang=pindah_tanggal and bool(existing_doc.get('stat_exp'))
+    ))
+
+    # --- 4. PERSIAPAN DATA RESPONSE (dari hasil diff di memori, tanpa baca ulang gaji) ---
+    final_karyawan_ids = [g['id_karyawan'] for g in pekerja_final]
+    karyawan_data = await db.karyawan.find(
+        {"id": {"$in": final_karyawan_ids}}, {"_id": 0, "id": 1, "nama": 1}
+    ).to_list(None)
     nama_map = {k['id']: k['nama'] for k in karyawan_data}
-    
+
     nama_pekerja_list = [nama_map.get(kid, "Unknown") for kid in final_karyawan_ids]
-    paid_ids = [g['id_karyawan'] for g in final_gaji_list if g.get('status_bayar')]
+    paid_ids = [g['id_karyawan'] for g in pekerja_final if g.get('status_bayar')]
 
     # Gabungkan data untuk dikirim balik ke Frontend
     response_data = {
         **existing_doc,     # Data lama (ID, created_at)
         **update_data,      # Data baru (tempe, kedelai)
-        "jumlah_pekerja": len(final_gaji_list),
+        "jumlah_pekerja": len(pekerja_final),
         "nama_pekerja": nama_pekerja_list,
         "paid_karyawan_ids": paid_ids
     }
@@ -822,78 +1258,37 @@ async def update_produksi(id_produksi: str, data: ProduksiHarianCreate, _: dict
     return response_data
 
 @api_router.patch("/produksi/{id_produksi}/update-exp")
-async def update_status_exp(id_produksi: str, data: StatusExpUpdate, _: dict = Depends(verify_token)):
-    # Update field stat_exp saja berdasarkan ID
-    result = await db.produksi_harian.update_one(
-        {"id": id_produksi},
-        {"$set": {"stat_exp": data.stat_exp}}
-    )
-
-    if result.matched_count == 0:
+async def update_status_exp(id_produksi: str, data: StatusExpUpdate, user: dict = Depends(verify_token)):
+    # Update field stat_exp + sesuaikan stok berjalan dalam satu transaksi
+    async def _simpan(session):
+        produksi = await db.produksi_harian.find_one_and_update(
+            {"id": id_produksi},
+            {"$set": {"stat_exp": data.stat_exp}},
+            projection={"_id": 0, "tanggal": 1},
+            session=session
+        )
+        if produksi:
+            await set_stat_exp_harian(db, produksi['tanggal'], data.stat_exp, session=session)
+        return produksi
+
+    produksi = await jalankan_transaksi(_simpan)
+    if not produksi:
         raise HTTPException(status_code=404, detail="Data produksi tidak ditemukan")
+    await bus.terbitkan(StatusExpDiubah(tanggal=(produksi['tanggal'],), user=user.get("username")))
 
     return {"message": "Status expired berhasil diupdate", "id": id_produksi, "new_status": data.stat_exp}
 
 
 @api_router.get("/stok/mon", response_model=StokSummary)
-async def get_current_stok(_: dict = Depends(verify_token)):
-    # --- LANGKAH 1: Cari Daftar Tanggal yang Expired ---
-    # Kita perlu tahu tanggal mana saja yang stat_exp = True
-    expired_docs = await db.produksi_harian.find(
-        {"stat_exp": True}, 
-        {"tanggal": 1, "_id": 0}
-    ).to_list(10000)
-    
-    # Buat list tanggal yang harus diabaikan (Blacklist Dates)
-    excluded_dates = [doc['tanggal'] for doc in expired_docs]
-
-    # Buat Stage Matcher umum (Gunakan $nin / Not In)
-    # Artinya: Ambil data yang tanggalnya TIDAK ADA di dalam list excluded_dates
-    common_filter = {"$match": {"tanggal": {"$nin": excluded_dates}}}
-
-    # --- LANGKAH 2: Hitung Total Produksi ---
-    pipeline_prod = [
-        common_filter, # Filter tanggal expired
-        {"$group": {
-            "_id": None,
-            "total_3k": {"$sum": "$tempe_3k_produksi"},
-            "total_5k": {"$sum": "$tempe_5k_produksi"},
-            "total_10k": {"$sum": "$tempe_10k_produksi"}
-        }}
-    ]
-    prod_res = await db.produksi_harian.aggregate(pipeline_prod).to_list(1)
-    prod = prod_res[0] if prod_res else {"total_3k": 0, "total_5k": 0, "total_10k": 0}
-
-    # --- LANGKAH 3: Hitung Total Penjualan ---
-    pipeline_jual = [
-        common_filter, # Filter tanggal expired (Penjualan di hari basi tidak dihitung)
-        {"$group": {
-            "_id": None,
-            "total_3k": {"$sum": "$tempe_3k_pcs"},
-            "total_5k": {"$sum": "$tempe_5k_pcs"},
-            "total_10k": {"$sum": "$tempe_10k_pcs"}
-        }}
-    ]
-    jual_res = await db.penjualan.aggregate(pipeline_jual).to_list(1)
-    jual = jual_res[0] if jual_res else {"total_3k": 0, "total_5k": 0, "total_10k": 0}
-
-    # --- LANGKAH 4: Hitung Total Return ---
-    pipeline_ret = [
-        common_filter, # Filter tanggal expired (Return di hari basi tidak dihitung)
-        {"$group": {
-            "_id": None,
-            "total_3k": {"$sum": "$tempe_3k_return"},
-            "total_5k": {"$sum": "$tempe_5k_return"},
-            "total_10k": {"$sum": "$tempe_10k_return"}
-        }}
-    ]
-    ret_res = await db.return_penjualan.aggregate(pipeline_ret).to_list(1)
-    ret = ret_res[0] if ret_res else {"total_3k": 0, "total_5k": 0, "total_10k": 0}
+async def get_current_stok(_: dict = Depends(verify_token), _etag=etag("stok")):
+    # Stok berjalan per SKU (sudah tidak termasuk hari yang expired),
+    # dijaga oleh setiap penulisan produksi/penjualan/return/expired
+    counters = await db.stok_berjalan.find({}, {"_id": 0}).to_list(None)
+    stok = {c['sku']: c.get('stok', 0) for c in counters}
 
-    # --- LANGKAH 5: Kalkulasi Akhir ---
-    stok_3k = prod["total_3k"] - jual["total_3k"] + ret["total_3k"]
-    stok_5k = prod["total_5k"] - jual["total_5k"] + ret["total_5k"]
-    stok_10k = prod["total_10k"] - jual["total_10k"] + ret["total_10k"]
+    stok_3k = stok.get("3k", 0)
+    stok_5k = stok.get("5k", 0)
+    stok_10k = stok.get("10k", 0)
 
     return StokSummary(
         stok_3k=stok_3k,
@@ -904,48 +1299,11 @@ async def get_current_stok(_: dict = Depends(verify_token)):
     )
 
 @api_router.get("/stok/riwayat", response_model=List[RiwayatStokHarian])
-async def get_riwayat_stok(_: dict = Depends(verify_token)):
-    # 1. Ambil semua data dan kelompokkan by Tanggal (YYYY-MM-DD)
-    # Kita menggunakan dictionary untuk menggabungkan data dari 3 koleksi
-    daily_map = {}
-
-    # Helper untuk inisialisasi tanggal di map
-    def init_date(date_str):
-        if date_str not in daily_map:
-            daily_map[date_str] = {
-                "prod_3k": 0, "prod_5k": 0, "prod_10k": 0,
-                "jual_3k": 0, "jual_5k": 0, "jual_10k": 0,
-                "ret_3k": 0,  "ret_5k": 0,  "ret_10k": 0
-            }
-
-    # --- A. Ambil Data Produksi ---
-    async for doc in db.produksi_harian.find({}, {"_id": 0}):
-        date_key = doc["tanggal"][:10] # Ambil YYYY-MM-DD
-        init_date(date_key)
-        daily_map[date_key]["prod_3k"] += doc["tempe_3k_produksi"]
-        daily_map[date_key]["prod_5k"] += doc["tempe_5k_produksi"]
-        daily_map[date_key]["prod_10k"] += doc["tempe_10k_produksi"]
-
-    # --- B. Ambil Data Penjualan ---
-    async for doc in db.penjualan.find({}, {"_id": 0}):
-        date_key = doc["tanggal"][:10]
-        init_date(date_key)
-        daily_map[date_key]["jual_3k"] += doc["tempe_3k_pcs"]
-        daily_map[date_key]["jual_5k"] += doc["tempe_5k_pcs"]
-        daily_map[date_key]["jual_10k"] += doc["tempe_10k_pcs"]
-
-    # --- C. Ambil Data Return ---
-    async for doc in db.return_penjualan.find({}, {"_id": 0}):
-        date_key = doc["tanggal"][:10]
-        init_date(date_key)
-        daily_map[date_key]["ret_3k"] += doc["tempe_3k_return"]
-        daily_map[date_key]["ret_5k"] += doc["tempe_5k_return"]
-        daily_map[date_key]["ret_10k"] += doc["tempe_10k_return"]
+async def get_riwayat_stok(response: Response, _: dict = Depends(verify_token), _etag=etag("stok")):
+    # 1. Ambil ledger harian (sudah teragregasi per tanggal, urut terlama dulu)
+    ledger = await db.stok_harian.find({}, {"_id": 0}).sort("tanggal", 1).to_list(None)
 
     # 2. Kalkulasi Running Balance (Saldo Berjalan)
-    # Urutkan tanggal dari terlama ke terbaru
-    sorted_dates = sorted(daily_map.keys())
-
     riwayat_list = []
     
     # Akumulator stok
@@ -953,17 +1311,15 @@ async def get_riwayat_stok(_: dict = Depends(verify_token)):
     current_5k = 0
     current_10k = 0
 
-    for date in sorted_dates:
-        d = daily_map[date]
-        
+    for d in ledger:
         # Hitung Masuk (Prod + Return) dan Keluar (Jual) hari ini
-        masuk_3k = d["prod_3k"] + d["ret_3k"]
-        masuk_5k = d["prod_5k"] + d["ret_5k"]
-        masuk_10k = d["prod_10k"] + d["ret_10k"]
+        masuk_3k = d.get("prod_3k", 0) + d.get("ret_3k", 0)
+        masuk_5k = d.get("prod_5k", 0) + d.get("ret_5k", 0)
+        masuk_10k = d.get("prod_10k", 0) + d.get("ret_10k", 0)
         
-        keluar_3k = d["jual_3k"]
-        keluar_5k = d["jual_5k"]
-        keluar_10k = d["jual_10k"]
+        keluar_3k = d.get("jual_3k", 0)
+        keluar_5k = d.get("jual_5k", 0)
+        keluar_10k = d.get("jual_10k", 0)
 
         # Update Saldo Berjalan (Akumulasi sampai hari tersebut)
         current_3k += (masuk_3k - keluar_3k)
@@ -976,7 +1332,7 @@ async def get_riwayat_stok(_: dict = Depends(verify_token)):
         total_sisa = current_3k + current_5k + current_10k
 
         riwayat_list.append({
-            "tanggal": date,
+            "tanggal": d["tanggal"],
             "masuk_pcs": total_masuk,
             "keluar_pcs": total_keluar,
             "sisa_stok_3k": current_3k,
@@ -986,178 +1342,236 @@ async def get_riwayat_stok(_: dict = Depends(verify_token)):
         })
 
     # 3. Return data (dibalik agar tanggal terbaru di atas)
-    return list(reversed(riwayat_list))
+    return respon_list(RiwayatStokHarian, reversed(riwayat_list), response)
 
-@api_router.get("/stok", response_model=List[ProduksiHarian])
-async def get_stok(_: dict = Depends(verify_token)):
-    # Get the most recent produksi data
-    stok_list = await db.produksi_harian.find({}, {"_id": 0}).sort("tanggal", -1).to_list(1)
-    return [ProduksiHarian(**p) for p in stok_list]
+@api_router.get("/stok", response_model=List[ProduksiHarianResponse])
+async def get_stok(response: Response, _: dict = Depends(verify_token), _etag=etag("produksi_harian", "gaji", "karyawan")):
+    # Produksi terbaru, bentuknya sama dengan item GET /produksi
+    stok_list = await db.produksi_harian.find({}, proyeksi(ProduksiHarianResponse)).sort("tanggal", -1).limit(1).to_list(1)
+    return respon_list(ProduksiHarianResponse, await lengkapi_pekerja(stok_list), response)
 
 @api_router.get("/stok/produk")
-async def get_riwayat_stok(_: dict = Depends(verify_token)):
-    # 1. Ambil semua data dan kelompokkan by Tanggal (YYYY-MM-DD)
-    # Kita menggunakan dictionary untuk menggabungkan data dari 3 koleksi
-    daily_map = {}
-
-    # Helper untuk inisialisasi tanggal di map
-    def init_date(date_str):
-        if date_str not in daily_map:
-            daily_map[date_str] = {
-                "prod_3k": 0, "prod_5k": 0, "prod_10k": 0,
-                "jual_3k": 0, "jual_5k": 0, "jual_10k": 0,
-                "ret_3k": 0,  "ret_5k": 0,  "ret_10k": 0,
-                "rsk_3k": 0,  "rsk_5k": 0,  "rsk_10k": 0,
-                "stat_exp": False
-            }
-
-    # --- A. Ambil Data Produksi ---
-    async for doc in db.produksi_harian.find({}, {"_id": 0}):
-        date_key = doc["tanggal"][:10] # Ambil YYYY-MM-DD
-        init_date(date_key)
-        daily_map[date_key]["prod_3k"] += doc["tempe_3k_produksi"]
-        daily_map[date_key]["prod_5k"] += doc["tempe_5k_produksi"]
-        daily_map[date_key]["prod_10k"] += doc["tempe_10k_produksi"]
-        is_exp = doc.get("stat_exp", False)
-        if is_exp:
-            daily_map[date_key]["stat_exp"] = True
-
-    # --- B. Ambil Data Penjualan ---
-    async for doc in db.penjualan.find({}, {"_id": 0}):
-        date_key = doc["tanggal"][:10]
-        init_date(date_key)
-        daily_map[date_key]["jual_3k"] += doc["tempe_3k_pcs"]
-        daily_map[date_key]["jual_5k"] += doc["tempe_5k_pcs"]
-        daily_map[date_key]["jual_10k"] += doc["tempe_10k_pcs"]
-
-    # --- C. Ambil Data Return ---
-    async for doc in db.return_penjualan.find({}, {"_id": 0}):
-        date_key = doc["tanggal"][:10]
-        init_date(date_key)
-        daily_map[date_key]["ret_3k"] += doc["tempe_3k_return"]
-        daily_map[date_key]["ret_5k"] += doc["tempe_5k_return"]
-        daily_map[date_key]["ret_10k"] += doc["tempe_10k_return"]
-        # daily_map[date_key]["rsk_3k"] += doc["tempe_3k_rusak"]
-        # daily_map[date_key]["rsk_5k"] += doc["tempe_5k_rusak"]
-        # daily_map[date_key]["rsk_10k"] += doc["tempe_10k_rusak"]
-
-    # 2. Kalkulasi Running Balance (Saldo Berjalan)
-    # Urutkan tanggal dari terlama ke terbaru
-    sorted_dates = sorted(daily_map.keys())
+async def get_stok_produk(response: Response, _: dict = Depends(verify_token), _etag=etag("stok")):
+    # Satu kali baca ledger harian, terbaru di atas
+    ledger = await db.stok_harian.find({}, {"_id": 0}).sort("tanggal", -1).to_list(None)
 
     riwayat_list = []
-    
-    for date in sorted_dates:
-        d = daily_map[date]
-        
+    for d in ledger:
+        prod = {sku: d.get(f"prod_{sku}", 0) for sku in SKUS}
+        jual = {sku: d.get(f"jual_{sku}", 0) for sku in SKUS}
+        ret = {sku: d.get(f"ret_{sku}", 0) for sku in SKUS}
+        # Tempe rusak belum dicatat, selalu 0
+        rsk = {sku: 0 for sku in SKUS}
+
         riwayat_list.append({
-            "tanggal": date,
-            "stat_exp": d["stat_exp"],
-            "prod_stok_3k":  d["prod_3k"],
-            "prod_stok_5k": d["prod_5k"],
-            "prod_stok_10k": d["prod_10k"],
-            "sell_stok_3k": d["jual_3k"],
-            "sell_stok_5k": d["jual_5k"],
-            "sell_stok_10k": d["jual_10k"],
-            "res_stok_3k":  d["ret_3k"],
-            "res_stok_5k": d["ret_5k"],
-            "res_stok_10k": d["ret_10k"],
-            "rsk_stok_3k":  d["rsk_3k"],
-            "rsk_stok_5k": d["rsk_5k"],
-            "rsk_stok_10k": d["rsk_10k"],
-            "sisa_stok_3k":  d["prod_3k"] +  d["ret_3k"] - d["jual_3k"] - d["rsk_3k"],
-            "sisa_stok_5k": d["prod_5k"] +  d["ret_5k"] - d["jual_5k"] - d["rsk_5k"],
-            "sisa_stok_10k": d["prod_10k"] +  d["ret_10k"] - d["jual_10k"] - d["rsk_10k"]
+            "tanggal": d["tanggal"],
+            "stat_exp": d.get("stat_exp", False),
+            "prod_stok_3k":  prod["3k"],
+            "prod_stok_5k": prod["5k"],
+            "prod_stok_10k": prod["10k"],
+            "sell_stok_3k": jual["3k"],
+            "sell_stok_5k": jual["5k"],
+            "sell_stok_10k": jual["10k"],
+            "res_stok_3k":  ret["3k"],
+            "res_stok_5k": ret["5k"],
+            "res_stok_10k": ret["10k"],
+            "rsk_stok_3k":  rsk["3k"],
+            "rsk_stok_5k": rsk["5k"],
+            "rsk_stok_10k": rsk["10k"],
+            "sisa_stok_3k":  prod["3k"] + ret["3k"] - jual["3k"] - rsk["3k"],
+            "sisa_stok_5k": prod["5k"] + ret["5k"] - jual["5k"] - rsk["5k"],
+            "sisa_stok_10k": prod["10k"] + ret["10k"] - jual["10k"] - rsk["10k"]
         })
 
-    # 3. Return data (dibalik agar tanggal terbaru di atas)
-    return list(reversed(riwayat_list))
+    return JSONCepat(riwayat_list, headers=dict(response.headers)) if JSON_CEPAT else riwayat_list
 
 @api_router.post("/pengeluaran", response_model=Pengeluaran)
-async def create_pengeluaran(data: PengeluaranCreate, _: dict = Depends(verify_token)):
+async def create_pengeluaran(data: PengeluaranCreate, user: dict = Depends(verify_token)):
     import uuid
     doc = {
         "id": str(uuid.uuid4()),
-        "tanggal": data.tanggal.isoformat(),
+        **kolom_tanggal(data.tanggal),
         "kategori_pengeluaran": data.kategori_pengeluaran.value,
         "jumlah": data.jumlah,
         "keterangan": data.keterangan,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.pengeluaran.insert_one(doc)
+    await bus.terbitkan(PengeluaranDicatat(
+        tanggal=(doc['tanggal'],),
+        perubahan=(delta_hari("pengeluaran", doc['tanggal'], ringkasan={"total_pengeluaran": doc['jumlah']}),),
+        user=user.get("username")
+    ))
     return Pengeluaran(**doc)
 
 @api_router.get("/pengeluaran", response_model=List[Pengeluaran])
-async def get_pengeluaran(_: dict = Depends(verify_token)):
-    pengeluaran_list = await db.pengeluaran.find({}, {"_id": 0}).sort("tanggal", -1).to_list(1000)
-    return [Pengeluaran(**p) for p in pengeluaran_list]
+async def get_pengeluaran(response: Response, halaman: Halaman = Depends(param_halaman), _: dict = Depends(verify_token), _etag=etag("pengeluaran")):
+    pengeluaran_list = await get_halaman(db.pengeluaran, {}, "tanggal", halaman, response, proyeksi(Pengeluaran))
+    return respon_list(Pengeluaran, pengeluaran_list, response)
+
+
+@api_router.get("/harga", response_model=List[HargaVersi])
+async def get_harga(response: Response, _: dict = Depends(verify_token), _etag=etag("harga")):
+    # Semua versi harga, terbaru di atas (dibaca dari tabel in-memory)
+    return respon_list(HargaVersi, reversed(tabel_harga.semua()), response)
+
+@api_router.post("/harga", response_model=HargaVersi)
+async def create_harga(data: HargaVersiCreate, user: dict = Depends(verify_token)):
+    # Tambah versi harga baru yang berlaku mulai tanggal tertentu.
+    # Penjualan lama tetap memakai versi yang tersimpan di dokumennya.
+    def ke_sku(h: HargaKategori) -> dict:
+        return {"3k": h.tempe_3k, "5k": h.tempe_5k, "10k": h.tempe_10k}
+
+    doc = None
+    for _percobaan in range(3):
+        terbaru = await db.harga.find_one({}, {"_id": 0, "versi": 1}, sort=[("versi", -1)])
+        doc = {
+            "versi": (terbaru['versi'] if terbaru else 0) + 1,
+            "berlaku_mulai": data.berlaku_mulai.isoformat(),
+            "harga": {
+                KategoriPembeli.eceran.value: ke_sku(data.eceran),
+                KategoriPembeli.grosir.value: ke_sku(data.grosir),
+            },
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        try:
+            await db.harga.insert_one(doc)
+            break
+        except DuplicateKeyError:
+            # Nomor versi direbut request lain, coba nomor berikutnya
+            doc = None
+    if doc is None:
+        raise HTTPException(status_code=409, detail="Gagal membuat versi harga, coba lagi")
+
+    await bus.terbitkan(HargaDiubah(tanggal=(doc['berlaku_mulai'],), user=user.get("username")))
+    return HargaVersi(**doc)
+
+@api_router.get("/pembeli", response_model=List[Pembeli])
+async def get_pembeli(
+    response: Response,
+    q: str = "",
+    limit: int = Query(10, ge=1, le=100),
+    _: dict = Depends(verify_token),
+    _etag=etag("pembeli")
+):
+    # Autocomplete form penjualan: cari pembeli berdasarkan awalan nama
+    return respon_list(Pembeli, await cari_pembeli(db, q, limit), response)
+
+@api_router.get("/piutang", response_model=PiutangRingkasan)
+async def get_piutang(limit: int = Query(10, ge=1, le=100), _: dict = Depends(verify_token), _etag=etag("piutang", "pembeli", harian=True)):
+    # Total & umur piutang + pembeli dengan tagihan terbesar.
+    # Dibaca dari ledger piutang (hanya piutang terbuka), bukan scan seluruh penjualan.
+    umur, top = await asyncio.gather(
+        umur_piutang(db, date.today()),
+        top_debitur(db, limit),
+    )
+    return PiutangRingkasan(
+        total_piutang=umur['total'],
+        umur=umur['umur'],
+        top_debitur=[PiutangPembeli(**p) for p in top]
+    )
 
+@api_router.post("/live/tiket")
+async def buat_tiket_live(user: dict = Depends(verify_token)):
+    # EventSource tidak bisa mengirim header Authorization, jadi /live butuh kredensial di URL.
+    # Yang masuk URL (dan log proxy) hanya tiket ini: umur pendek & khusus /live,
+    # token login tidak pernah ditaruh di query string.
+    exp = datetime.now(timezone.utc) + timedelta(seconds=LIVE_TIKET_DETIK)
+    tiket = jwt.encode({"username": user['username'], "tujuan": TUJUAN_LIVE, "exp": exp}, SECRET_KEY, algorithm=ALGORITHM)
+    return {"tiket": tiket, "berlaku_detik": LIVE_TIKET_DETIK}
+
+@api_router.get("/live")
+async def live(request: Request, tiket: str):
+    # Server-Sent Events untuk Dashboard & Stok: delta dikirim setiap ada penulisan,
+    # jadi halaman yang terbuka tidak perlu polling. Tiket hanya dicek saat membuka
+    # koneksi; sambung ulang (putus / LIVE_DURASI_DETIK) minta tiket baru.
+    if decode_token(tiket).get("tujuan") != TUJUAN_LIVE:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return StreamingResponse(
+        hub_live.aliran(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-@api_router.get("/laporan/laba", response_model=List[LaporanLabaItem])
-async def get_laporan_laba(period: str = "daily", limit: int = 30, _: dict = Depends(verify_token)):
-    # --- 1. OPTIMASI: Hitung Batas Tanggal ---
-    # Jangan ambil semua data dari awal sejarah, ambil secukupnya sesuai limit
-    # Kita lebihkan sedikit (+5 hari) untuk safety margin
-    today = date.today()
-    start_date = (today - timedelta(days=limit + 5)).isoformat()
-    
-    query_filter = {"tanggal": {"$gte": start_date}}
+# Koleksi yang bisa diexport: nama di URL -> (koleksi, field tanggal, kolom)
+EXPORT_SPEC = {
+    "penjualan": ("penjualan", "tanggal", list(Penjualan.model_fields)),
+    "return": ("return_penjualan", "tanggal", list(ReturnPenjualan.model_fields)),
+    "pengeluaran": ("pengeluaran", "tanggal", list(Pengeluaran.model_fields)),
+    "gaji": ("gaji", "tanggal_produksi", [
+        "id", "id_produksi", "id_karyawan", "tanggal_produksi", "nominal", "status_bayar", "created_at"
+    ]),
+}
+
+@api_router.get("/export/{nama}")
+async def export_data(
+    nama: str,
+    format: Literal["csv", "ndjson"] = "csv",
+    dari: Optional[date] = Query(None, alias="from"),
+    sampai: Optional[date] = Query(None, alias="to"),
+    _: dict = Depends(verify_token)
+):
+    # Data dialirkan langsung dari cursor Motor ke response,
+    # jadi pemakaian memori tetap kecil berapapun rentang tanggalnya
+    if nama not in EXPORT_SPEC:
+        raise HTTPException(status_code=404, detail=f"Export '{nama}' tidak tersedia")
+    koleksi, field_tanggal, kolom = EXPORT_SPEC[nama]
+
+    projection = {"_id": 0, **{k: 1 for k in kolom}}
+    cursor = db[koleksi].find(filter_tanggal(field_tanggal, dari, sampai), projection) \
+        .sort([(field_tanggal, 1), ("id", 1)]) \
+        .batch_size(EXPORT_BATCH_SIZE)
+
+    if format == FORMAT_CSV:
+        body, media_type = tulis_csv(cursor, kolom), "text/csv; charset=utf-8"
+    else:
+        body, media_type = tulis_ndjson(cursor, kolom), "application/x-ndjson"
 
-    # --- 2. GET DATA (Dengan Filter Tanggal) ---
-    penjualan_list = await db.penjualan.find(query_filter, {"_id": 0}).to_list(10000)
-    return_list = await db.return_penjualan.find(query_filter, {"_id": 0}).to_list(10000)
-    pengeluaran_list = await db.pengeluaran.find(query_filter, {"_id": 0}).to_list(10000)
-    
-    # --- 3. GROUPING ---
-    from collections import defaultdict
-    data_by_date = defaultdict(lambda: {"omzet": 0, "pengeluaran": 0})
-    
-    # Proses Penjualan (HANYA YANG LUNAS)
-    for p in penjualan_list:
-        # Default ke 'Lunas' jika data lama tidak punya field status
-        status = p.get('status_pembayaran', 'Lunas')
-        
-        # LOGIKA INTI: Hanya hitung jika Lunas
-        if status == 'Lunas':
-            data_by_date[p['tanggal']]['omzet'] += p['total_penjualan']
-        # Jika Tempo, uang belum masuk -> Jangan tambah ke Omzet
-    
-    # Proses Return (Mengurangi Omzet)
-    for r in return_list:
-        data_by_date[r['tanggal']]['omzet'] -= r['total_return']
-    
-    # Proses Pengeluaran
-    for p in pengeluaran_list:
-        data_by_date[p['tanggal']]['pengeluaran'] += p['jumlah']
-    
-    # --- 4. FORMATTING ---
-    result = []
-    # Ambil tanggal yang tersedia, urutkan terbaru dulu untuk dipotong sesuai limit
-    sorted_dates_desc = sorted(data_by_date.keys(), reverse=True)[:limit]
-    
-    for tanggal in sorted_dates_desc:
-        data = data_by_date[tanggal]
-        laba = data['omzet'] - data['pengeluaran']
-        
-        result.append(LaporanLabaItem(
-            tanggal=tanggal,
-            omzet=data['omzet'],
-            pengeluaran=data['pengeluaran'],
-            laba=laba
-        ))
-    
-    # Return urut dari tanggal tua ke muda (Ascending) untuk grafik Frontend
-    return sorted(result, key=lambda x: x.tanggal)
+    nama_file = f"{nama}_{dari or 'awal'}_{sampai or 'akhir'}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nama_file}"'}
+    )
+
+@api_router.get("/laporan/laba", response_model=List[LaporanLabaItem])
+async def get_laporan_laba(
+    response: Response,
+    period: Literal["daily", "weekly", "monthly", "yearly"] = "daily",
+    limit: int = Query(30, ge=1, le=3660),
+    _: dict = Depends(verify_token),
+    _etag=etag("penjualan", "return_penjualan", "pengeluaran", harian=True)
+):
+    # Omzet (hanya Lunas, dikurangi Return) & pengeluaran per periode.
+    # Periode yang sudah tutup diambil dari rollup tersimpan, periode berjalan dihitung langsung.
+    # Hasil urut dari periode tua ke muda (Ascending) untuk grafik Frontend
+    hasil = await get_laba_periode(db, period, limit, date.today())
+    return respon_list(LaporanLabaItem, hasil, response)
 
 # Include router
 app.include_router(api_router)
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    # Format teks Prometheus: latency per route + waktu perintah Mongo per route/koleksi/operasi
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/health/ready", include_in_schema=False)
+async def health_ready():
+    # Probe load balancer: 200 hanya jika worker sudah warm-up, ping MongoDB cepat
+    # dan pool koneksi belum hampir penuh. Selain itu 503 (jangan kirim traffic ke sini).
+    siap, detail = await cek_kesiapan(client)
+    return JSONResponse({"status": "ready" if siap else "not_ready", **detail}, status_code=200 if siap else 503)
+
+app.add_middleware(metrics.MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
 logging.basicConfig(
@@ -1166,10 +1580,97 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# --- Cache per worker ---
+# Dibersihkan lewat pelacak versi, bukan event bus: event hanya terlihat di worker yang
+# menangani penulisan, dokumen versi terlihat di semua worker (lihat versi.PelacakVersi).
+pelacak_versi.saat_berubah("produksi_harian", "penjualan", "return_penjualan", "pengeluaran")(dashboard_cache.clear)
+
+@pelacak_versi.saat_berubah("harga")
+async def muat_ulang_harga():
+    await tabel_harga.muat(db)
+
+# SSE: hub hanya mengirim delta penulisan di worker ini. Penulisan di worker lain terlihat
+# dari dokumen versi -> layar yang tersambung ke worker ini diminta memuat ulang datanya.
+@pelacak_versi.saat_berubah("stok", hanya_worker_lain=True)
+def live_stok_worker_lain():
+    hub_live.muat_ulang("stok")
+
+@pelacak_versi.saat_berubah("produksi_harian", "penjualan", "return_penjualan", "pengeluaran", hanya_worker_lain=True)
+def live_ringkasan_worker_lain():
+    hub_live.muat_ulang("ringkasan")
+
+# --- Subscriber event bus ---
+# Subscriber wajib dijalankan berurutan sebelum endpoint tulis mengirim response.
+# Versi ETag dinaikkan paling akhir; cache & tabel harga ikut diperbarui saat itu.
+
+@bus.langganan(PenjualanDicatat, StatusPenjualanDiubah, ReturnDicatat, PengeluaranDicatat, GajiDibayar, wajib=True)
+async def tandai_rollup_basi(event: Event):
+    # Rollup laba periode tertutup dihitung ulang saat dibaca berikutnya (hanya periode yang basi)
+    await hapus_rollup(db, *event.tanggal)
+
+@bus.langganan(wajib=True)
+async def naikkan_versi_event(event: Event):
+    await naikkan_versi(db, *event.VERSI)
+
+@bus.langganan()
+async def kirim_live(event: Event):
+    if isinstance(event, StatusExpDiubah):
+        hub_live.muat_ulang("stok")
+    elif isinstance(event, ProduksiDiubah) and event.stok_dimuat_ulang:
+        hub_live.muat_ulang("stok", "ringkasan")
+    else:
+        hub_live.delta(*event.perubahan)
+
+@bus.langganan()
+async def catat_audit(event: Event):
+    await db.audit.insert_one({
+        "jenis": type(event).__name__,
+        "tanggal": list(event.tanggal),
+        "sku": list(event.sku),
+        "pembeli": event.pembeli,
+        "id_karyawan": list(event.id_karyawan),
+        "user": event.user,
+        "waktu": datetime.now(timezone.utc).isoformat()
+    })
+
 @app.on_event("startup")
 async def startup_event():
+    pencatat_lambat.aktifkan(client)
+    await init_transaksi(client)
+    # Ledger piutang lama (kunci nama) dibuang dulu, dibangun ulang per id_pembeli di bawah
+    await migrasi_sekali(db, "piutang_id_pembeli", lambda: buang_ledger_nama(db))
+    await ensure_indexes(db, strict=INDEX_STRICT)
     await init_admin()
+    # Data lama: tanggal string/timestamp -> kunci hari + BSON date (sekali per database)
+    migrasi_tgl = await migrasi_sekali(db, "tanggal", lambda: migrasi_tanggal(db))
+    if migrasi_tgl and migrasi_tgl['hari_berubah']:
+        await hapus_rollup(db, *migrasi_tgl['hari_berubah'])
+    await migrasi_sekali(db, "tanggal_gaji", backfill_tanggal_gaji)
+    await migrasi_sekali(db, "retur_penjualan", backfill_retur_penjualan)
+    # Deploy pertama: ledger/stok berjalan masih kosong padahal sudah ada transaksi
+    if not await db.stok_berjalan.find_one({}) and await db.produksi_harian.find_one({}):
+        await rebuild_stok_harian(db)
+    migrasi = await migrasi_sekali(db, "pembeli", lambda: migrasi_pembeli(db))
+    # Penjualan lama baru ditautkan ke id_pembeli -> ledger piutang (kunci id_pembeli) dibangun ulang
+    if migrasi and migrasi['pembeli'] and await db.piutang.find_one({}):
+        await rebuild_piutang(db)
+    if not await db.piutang.find_one({}) and await db.penjualan.find_one({"status_pembayaran": StatusPembayaran.tempo.value}):
+        await rebuild_piutang(db)
+    await tabel_harga.muat(db)
+    bus.mulai()
+    # Backfill/rebuild di atas dan perubahan bentuk response antar deploy: semua ETag lama dibuang
+    await naikkan_versi(db, *SEMUA_VERSI)
+    background_tasks.append(asyncio.create_task(loop_pantau_versi(db)))
+    # Terakhir: pool minimal & index panas dulu, baru /health/ready menjawab 200
+    await pemanasan(client, db)
+    tandai_siap(True)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    tandai_siap(False)
+    for task in background_tasks:
+        task.cancel()
+    await bus.berhenti()
+    hub_live.tutup()
     client.close()
+    password.shutdown()
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from pymongo import monitoring
+
+from metrics import RUTE_LATAR, konteks_request
+
+logger = logging.getLogger("slowquery")
+
+# Perintah Mongo yang lebih lama dari ini (ms) dicatat sebagai query lambat (0 = mati)
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+# Peluang query lambat diikuti explain (0..1)
+SLOW_QUERY_EXPLAIN_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_RATE', '1'))
+# Bentuk query yang sama paling banyak di-explain sekali per interval ini (detik)
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', '300'))
+
+# Perintah yang bisa di-explain
+BISA_EXPLAIN = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Field sesi/transaksi yang tidak boleh ikut dalam perintah explain
+FIELD_SESI = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+
+def bentuk(nilai):
+    # Bentuk query tanpa nilai: {"tanggal": {"$gte": "2025-01-01"}} -> {"tanggal": {"$gte": "str"}}
+    if isinstance(nilai, dict):
+        return {k: bentuk(v) for k, v in nilai.items()}
+    if isinstance(nilai, (list, tuple)):
+        return [bentuk(v) for v in nilai[:20]]
+    if isinstance(nilai, (int, float)) and not isinstance(nilai, bool):
+        # Angka kecil biasanya arah sort / projection / limit, dibiarkan
+        return nilai if -1 <= nilai <= 1 else type(nilai).__name__
+    if isinstance(nilai, str) and nilai.startswith("$"):
+        # Referensi field di pipeline ("$tanggal") bukan data pengguna
+        return nilai
+    return type(nilai).__name__
+
+
+def bentuk_perintah(command_name: str, command: dict) -> dict:
+    # Nama koleksi dibiarkan, sisanya (filter, pipeline, update, ...) hanya bentuknya
+    return {
+        k: v if k == command_name else bentuk(v)
+        for k, v in command.items()
+        if not k.startswith("$") and k not in FIELD_SESI
+    }
+
+
+def cari_stage(plan, stage: str) -> bool:
+    # Cari stage tertentu di dalam winningPlan (classic: inputStage/inputStages, SBE: queryPlan)
+    if isinstance(plan, dict):
+        if plan.get("stage") == stage:
+            return True
+        return any(cari_stage(v, stage) for v in plan.values())
+    if isinstance(plan, list):
+        return any(cari_stage(v, stage) for v in plan)
+    return False
+
+
+def winning_plans(explain) -> list:
+    # Semua winningPlan di hasil explain (aggregate bisa punya beberapa, mis. di $cursor / $lookup)
+    hasil = []
+    if isinstance(explain, dict):
+        for k, v in explain.items():
+            if k == "winningPlan":
+                hasil.append(v)
+            else:
+                hasil.extend(winning_plans(v))
+    elif isinstance(explain, list):
+        for v in explain:
+            hasil.extend(winning_plans(v))
+    return hasil
+
+
+def nama_index(plan) -> list:
+    if isinstance(plan, dict):
+        sendiri = [plan["indexName"]] if "indexName" in plan else []
+        return sendiri + [n for v in plan.values() for n in nama_index(v)]
+    if isinstance(plan, list):
+        return [n for v in plan for n in nama_index(v)]
+    return []
+
+
+class PencatatQueryLambat(monitoring.CommandListener):
+    # Didaftarkan saat membuat client bersama listener metrics.
+    # Callback berjalan di thread pymongo, explain dijadwalkan ke event loop lewat call_soon_threadsafe.
+
+    def __init__(self):
+        self._berjalan: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+        self._terakhir_explain: Dict[str, float] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client = None
+        self._tasks = set()
+
+    def aktifkan(self, client):
+        # Dipanggil saat startup (di dalam event loop) supaya explain bisa dijalankan
+        self._loop = asyncio.get_running_loop()
+        self._client = client
+
+    def started(self, event):
+        if SLOW_QUERY_MS <= 0 or event.command_name == "explain":
+            return
+        konteks = konteks_request.get()
+        with self._lock:
+            self._berjalan[(event.connection_id, event.request_id)] = (
+                event.command if event.command_name in BISA_EXPLAIN else None,
+                konteks.rute if konteks else RUTE_LATAR,
+            )
+
+    def _selesai(self, event):
+        with self._lock:
+            data = self._berjalan.pop((event.connection_id, event.request_id), None)
+        if data is None:
+            return None
+        ms = event.duration_micros / 1000
+        if ms < SLOW_QUERY_MS:
+            return None
+        return data, ms
+
+    def succeeded(self, event):
+        hasil = self._selesai(event)
+        if hasil is None:
+            return
+        (command, rute), ms = hasil
+        koleksi = command.get(event.command_name) if command else None
+        shape = bentuk_perintah(event.command_name, command) if command else {"command": event.command_name}
+        shape_json = json.dumps(shape, default=str, sort_keys=True)
+        logger.warning(
+            "Query lambat %.0fms route=%s db=%s koleksi=%s perintah=%s bentuk=%s",
+            ms, rute, event.database_name, koleksi or "-", event.command_name, shape_json
+        )
+        if command and self._perlu_explain(shape_json):
+            self._jadwalkan_explain(event.database_name, event.command_name, command, rute, shape_json)
+
+    def failed(self, event):
+        self._selesai(event)
+
+    def _perlu_explain(self, kunci: str) -> bool:
+        if self._loop is None or random.random() >= SLOW_QUERY_EXPLAIN_RATE:
+            return False
+        sekarang = time.monotonic()
+        with self._lock:
+            if sekarang - self._terakhir_explain.get(kunci, -SLOW_QUERY_EXPLAIN_INTERVAL) < SLOW_QUERY_EXPLAIN_INTERVAL:
+                return False
+            self._terakhir_explain[kunci] = sekarang
+        return True
+
+    def _jadwalkan_explain(self, db_name, command_name, command, rute, shape_json):
+        perintah = {k: v for k, v in command.items() if not k.startswith("$") and k not in FIELD_SESI}
+
+        def mulai():
+            task = self._loop.create_task(self._explain(db_name, command_name, perintah, rute, shape_json))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        try:
+            self._loop.call_soon_threadsafe(mulai)
+        except RuntimeError:
+            # Event loop sudah ditutup (shutdown)
+            pass
+
+    async def _explain(self, db_name, command_name, perintah, rute, shape_json):
+        try:
+            hasil = await self._client[db_name].command({"explain": perintah, "verbosity": "queryPlanner"})
+        except Exception as e:
+            logger.info("Explain gagal untuk %s (%s): %s", command_name, rute, e)
+            return
+
+        plans = winning_plans(hasil)
+        index = sorted(set(n for p in plans for n in nama_index(p)))
+        if any(cari_stage(p, "COLLSCAN") for p in plans):
+            logger.error(
+                "!!! COLLSCAN !!! route=%s koleksi=%s perintah=%s bentuk=%s index_dipakai=%s plan=%s",
+                rute, perintah.get(command_name), command_name, shape_json, index or "-",
+                json.dumps(plans, default=str)[:4000]
+            )
+        else:
+            logger.warning(
+                "Explain query lambat route=%s koleksi=%s perintah=%s index_dipakai=%s",
+                rute, perintah.get(command_name), command_name, index or "-"
+            )
+
+
+pencatat_lambat = PencatatQueryLambat()
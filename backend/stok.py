@@ -0,0 +1,172 @@
+import logging
+
+from pymongo import ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Ukuran tempe yang dijual
+SKUS = ("3k", "5k", "10k")
+
+# Sumber data ledger: jenis -> (koleksi, pola nama field jumlah)
+SUMBER = {
+    "prod": ("produksi_harian", "tempe_{}_produksi"),
+    "jual": ("penjualan", "tempe_{}_pcs"),
+    "ret": ("return_penjualan", "tempe_{}_return"),
+}
+
+COUNTER_FIELDS = [f"{jenis}_{sku}" for jenis in SUMBER for sku in SKUS]
+
+
+def delta_dari_doc(jenis: str, doc: dict, tanda: int = 1) -> dict:
+    # Ubah dokumen produksi/penjualan/return jadi counter ledger, mis. {"jual_3k": 5}
+    _, pola = SUMBER[jenis]
+    return {f"{jenis}_{sku}": tanda * int(doc.get(pola.format(sku), 0) or 0) for sku in SKUS}
+
+
+def gabung_delta(*deltas: dict) -> dict:
+    hasil = {}
+    for d in deltas:
+        for k, v in d.items():
+            hasil[k] = hasil.get(k, 0) + v
+    return hasil
+
+
+def net_per_sku(counter: dict) -> dict:
+    # Sisa stok dari counter ledger: produksi + return - penjualan
+    return {
+        sku: counter.get(f"prod_{sku}", 0) + counter.get(f"ret_{sku}", 0) - counter.get(f"jual_{sku}", 0)
+        for sku in SKUS
+    }
+
+
+async def ubah_stok_berjalan(db, net: dict, session=None):
+    ops = [UpdateOne({"sku": sku}, {"$inc": {"stok": n}}, upsert=True) for sku, n in net.items() if n]
+    if ops:
+        await db.stok_berjalan.bulk_write(ops, ordered=False, session=session)
+
+
+async def catat_stok(db, tanggal: str, delta: dict, session=None):
+    # Update counter harian secara atomik. Dokumen hari dibuat otomatis (upsert).
+    # Stok berjalan ikut berubah kecuali hari tersebut sudah ditandai expired.
+    delta = {k: v for k, v in delta.items() if v}
+    if not delta:
+        return
+    hari = await db.stok_harian.find_one_and_update(
+        {"tanggal": tanggal},
+        {"$inc": delta, "$setOnInsert": {"stat_exp": False}},
+        projection={"_id": 0, "stat_exp": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+    if not hari.get("stat_exp"):
+        await ubah_stok_berjalan(db, net_per_sku(delta), session=session)
+
+
+async def set_stat_exp_harian(db, tanggal: str, stat_exp: bool, session=None):
+    # Tandai hari expired. Saat status berubah, sisa stok hari itu
+    # dikeluarkan dari (atau dikembalikan ke) stok berjalan.
+    sebelum = await db.stok_harian.find_one_and_update(
+        {"tanggal": tanggal},
+        {"$set": {"stat_exp": stat_exp}},
+        projection={"_id": 0},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE,
+        session=session,
+    )
+    if not sebelum or bool(sebelum.get("stat_exp")) == stat_exp:
+        return
+    tanda = -1 if stat_exp else 1
+    net = net_per_sku(sebelum)
+    await ubah_stok_berjalan(db, {sku: tanda * n for sku, n in net.items()}, session=session)
+
+
+def hitung_stok_berjalan(daily_map: dict) -> dict:
+    total = {sku: 0 for sku in SKUS}
+    for hari in daily_map.values():
+        if hari.get("stat_exp"):
+            continue
+        for sku, n in net_per_sku(hari).items():
+            total[sku] += n
+    return total
+
+
+async def hitung_ulang_harian(db) -> dict:
+    # Hitung counter per hari langsung dari koleksi mentah
+    daily_map = {}
+    for jenis, (koleksi, pola) in SUMBER.items():
+        group = {"_id": "$tanggal"}
+        for sku in SKUS:
+            group[f"{jenis}_{sku}"] = {"$sum": f"${pola.format(sku)}"}
+        async for row in db[koleksi].aggregate([{"$group": group}]):
+            hari = daily_map.setdefault(row["_id"], {"tanggal": row["_id"], "stat_exp": False})
+            for sku in SKUS:
+                hari[f"{jenis}_{sku}"] = row[f"{jenis}_{sku}"]
+
+    async for doc in db.produksi_harian.find({"stat_exp": True}, {"_id": 0, "tanggal": 1}):
+        hari = daily_map.get(doc["tanggal"])
+        if hari:
+            hari["stat_exp"] = True
+
+    for hari in daily_map.values():
+        for field in COUNTER_FIELDS:
+            hari.setdefault(field, 0)
+    return daily_map
+
+
+async def rebuild_stok_harian(db) -> int:
+    # Bangun ulang ledger ke koleksi sementara lalu rename (pembaca tidak melihat ledger setengah jadi).
+    # Jalankan saat tidak ada input transaksi, karena increment yang masuk selama rebuild bisa hilang.
+    daily_map = await hitung_ulang_harian(db)
+
+    tmp = db.stok_harian_rebuild
+    await tmp.drop()
+    await tmp.create_index("tanggal", name="tanggal_unik", unique=True)
+    if daily_map:
+        await tmp.insert_many(sorted(daily_map.values(), key=lambda d: d["tanggal"]))
+    await tmp.rename("stok_harian", dropTarget=True)
+
+    # Stok berjalan di-set ulang dari hasil hitung yang sama
+    stok = hitung_stok_berjalan(daily_map)
+    await db.stok_berjalan.bulk_write(
+        [UpdateOne({"sku": sku}, {"$set": {"stok": n}}, upsert=True) for sku, n in stok.items()]
+    )
+
+    logger.info("Ledger stok_harian dibangun ulang: %d hari, stok berjalan %s", len(daily_map), stok)
+    return len(daily_map)
+
+
+async def cek_konsistensi_stok(db) -> dict:
+    # Bandingkan ledger & stok berjalan dengan hasil hitung ulang dari koleksi mentah.
+    # Hasil kosong berarti konsisten.
+    daily_map = await hitung_ulang_harian(db)
+    drift = {}
+
+    ledger = {d["tanggal"]: d async for d in db.stok_harian.find({}, {"_id": 0})}
+    hari_beda = []
+    for tanggal in sorted(set(daily_map) | set(ledger)):
+        harus = daily_map.get(tanggal, {})
+        ada = ledger.get(tanggal, {})
+        beda = {
+            f: {"ledger": ada.get(f, 0), "hitung_ulang": harus.get(f, 0)}
+            for f in COUNTER_FIELDS + ["stat_exp"]
+            if ada.get(f, 0) != harus.get(f, 0)
+        }
+        if beda:
+            hari_beda.append({"tanggal": tanggal, "beda": beda})
+    if hari_beda:
+        drift["stok_harian"] = hari_beda
+
+    harus = hitung_stok_berjalan(daily_map)
+    ada = {d["sku"]: d.get("stok", 0) async for d in db.stok_berjalan.find({}, {"_id": 0})}
+    sku_beda = {
+        sku: {"counter": ada.get(sku, 0), "hitung_ulang": harus[sku], "selisih": ada.get(sku, 0) - harus[sku]}
+        for sku in SKUS
+        if ada.get(sku, 0) != harus[sku]
+    }
+    if sku_beda:
+        drift["stok_berjalan"] = sku_beda
+
+    if drift:
+        logger.warning("Drift stok terdeteksi: %s", drift)
+    return drift
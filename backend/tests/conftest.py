@@ -0,0 +1,56 @@
+import os
+import sys
+
+import httpx
+import pytest
+
+# Test jalan tanpa MongoDB: mongomock-motor in-memory, dipasang sebelum server di-import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DB_NAME"] = "tempe_test"
+# Jalur cepat respon_list dibandingkan dengan response_model di setiap response
+os.environ["JSON_CEPAT_CEK"] = "1"
+
+from tests.mock_mongo import pasang_mongomock  # noqa: E402
+
+pasang_mongomock()
+
+import server  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def app():
+    # Startup (index, admin, event bus) sekali per sesi: shutdown menutup client & executor.
+    # Database dipakai bersama semua test, jadi setiap test memakai tanggal/nama sendiri.
+    for handler in server.app.router.on_startup:
+        await handler()
+    yield server.app
+    for handler in server.app.router.on_shutdown:
+        await handler()
+
+
+@pytest.fixture(scope="session")
+async def client(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+        r = await c.post("/api/auth/login", json={"username": "admin", "password": "admin123"})
+        c.headers["Authorization"] = "Bearer " + r.json()["token"]
+        yield c
+
+
+@pytest.fixture
+def db(app):
+    return server.db
+
+
+@pytest.fixture
+def kirim(client):
+    # POST ke API dan pastikan 200: dipakai test alur (penjualan, return, produksi, ...)
+    async def _kirim(path, **data):
+        r = await client.post(path, json=data)
+        assert r.status_code == 200, r.text
+        return r.json()
+    return _kirim
@@ -0,0 +1,37 @@
+# MongoDB in-memory (mongomock-motor) untuk test & `bench.py --mock`.
+# Harus dipanggil sebelum server di-import: server.py membuat client Mongo saat import.
+import os
+
+
+def tambal_mongomock():
+    # mongomock: find_one_and_update dengan projection {"_id": 0} selalu mengembalikan None
+    # (MongoDB asli tidak). Tanpa tambalan ini toggle-status dkk selalu 409.
+    import mongomock.collection
+
+    asli = mongomock.collection.Collection.find_one_and_update
+    if getattr(asli, "_tertambal", False):
+        return
+
+    def find_one_and_update(self, filter, update, projection=None, *args, **kwargs):
+        buang_id = isinstance(projection, dict) and projection.get("_id") == 0
+        if buang_id:
+            projection = {k: v for k, v in projection.items() if k != "_id"} or None
+        doc = asli(self, filter, update, projection, *args, **kwargs)
+        if doc is not None and buang_id:
+            doc.pop("_id", None)
+        return doc
+
+    find_one_and_update._tertambal = True
+    mongomock.collection.Collection.find_one_and_update = find_one_and_update
+
+
+def pasang_mongomock():
+    # ImportError dibiarkan naik: pemanggil yang memutuskan pesan errornya
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient
+
+    motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    # mongomock tidak mengenal command hello/transaksi
+    os.environ["MONGO_TRANSACTIONS"] = "off"
+    tambal_mongomock()
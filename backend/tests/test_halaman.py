@@ -0,0 +1,26 @@
+import pytest
+
+from pagination import NEXT_CURSOR_HEADER
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cursor_tanggal_kembar_tidak_dobel(client, kirim):
+    # Lima pengeluaran di tanggal yang sama + satu sehari sebelumnya: cursor harus
+    # memecah tanggal kembar dengan id, tanpa baris hilang atau terulang.
+    ids = [(await kirim("/api/pengeluaran", tanggal="2021-03-10", kategori_pengeluaran="ragi", jumlah=1000))["id"]
+           for _ in range(5)]
+    lama = await kirim("/api/pengeluaran", tanggal="2021-03-09", kategori_pengeluaran="ragi", jumlah=1000)
+
+    params = {"limit": 2, "from": "2021-03-09", "to": "2021-03-10"}
+    hasil = []
+    while True:
+        r = await client.get("/api/pengeluaran", params=params)
+        assert r.status_code == 200, r.text
+        assert len(r.json()) <= 2
+        hasil += r.json()
+        if not r.headers.get(NEXT_CURSOR_HEADER):
+            break
+        params["cursor"] = r.headers[NEXT_CURSOR_HEADER]
+
+    assert [p["id"] for p in hasil] == sorted(ids, reverse=True) + [lama["id"]]
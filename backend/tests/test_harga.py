@@ -0,0 +1,22 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_versi_harga_dipilih_dari_tanggal_penjualan(kirim):
+    # Versi baru berlaku di masa depan supaya tidak mengubah harga test lain
+    harga = {"tempe_3k": 3500, "tempe_5k": 6000, "tempe_10k": 12000}
+    versi = await kirim("/api/harga", berlaku_mulai="2030-01-01", eceran=harga, grosir=harga)
+
+    def jual(tanggal):
+        return kirim("/api/penjualan", tanggal=tanggal, pembeli="Versi Harga", kategori_pembeli="Eceran",
+                     tempe_10k_pcs=2, status_pembayaran="Lunas")
+
+    sebelum = await jual("2029-12-31")
+    assert sebelum["harga_versi"] < versi["versi"]
+    assert sebelum["total_penjualan"] == 2 * 10000
+
+    # Hari pertama berlaku sudah memakai harga baru
+    sesudah = await jual("2030-01-01")
+    assert sesudah["harga_versi"] == versi["versi"]
+    assert sesudah["total_penjualan"] == 2 * 12000
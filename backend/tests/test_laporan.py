@@ -0,0 +1,25 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def laba_tahun(client, tahun):
+    r = await client.get("/api/laporan/laba", params={"period": "yearly", "limit": 50})
+    assert r.status_code == 200, r.text
+    return next(d for d in r.json() if d["tanggal"] == tahun)
+
+
+async def test_rollup_basi_setelah_penulisan_mundur(client, db, kirim):
+    # Tahun 2019 sudah tutup: hasil pertama disimpan sebagai rollup
+    jual = await kirim("/api/penjualan", tanggal="2019-07-10", pembeli="Laporan Laba", kategori_pembeli="Grosir",
+                       tempe_10k_pcs=3, status_pembayaran="Lunas")
+    laba = await laba_tahun(client, "2019")
+    assert (laba["omzet"], laba["pengeluaran"]) == (jual["total_penjualan"], 0)
+    rollup = await db.laba_rollup.find_one({"period": "yearly", "kunci": "2019"}, {"_id": 0})
+    assert rollup["valid"] is True
+
+    # Pengeluaran back-dated menandai rollup basi, request berikutnya menghitung ulang
+    await kirim("/api/pengeluaran", tanggal="2019-07-20", kategori_pengeluaran="plastik", jumlah=4000)
+    laba = await laba_tahun(client, "2019")
+    assert laba["pengeluaran"] == 4000
+    assert laba["laba"] == jual["total_penjualan"] - 4000
@@ -0,0 +1,34 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def piutang(client, id_pembeli):
+    r = await client.get("/api/piutang", params={"limit": 100})
+    assert r.status_code == 200, r.text
+    data = r.json()
+    saldo = next((p["saldo"] for p in data["top_debitur"] if p["id_pembeli"] == id_pembeli), 0)
+    return data["total_piutang"], data["umur"]["30+"], saldo
+
+
+async def test_saldo_tempo_return_lalu_lunas(client, kirim):
+    awal_total, awal_lama, _ = await piutang(client, None)
+    jual = await kirim("/api/penjualan", tanggal="2022-03-01", pembeli="Piutang Tempo", kategori_pembeli="Grosir",
+                       tempe_10k_pcs=5, status_pembayaran="Tempo")
+    nota = jual["total_penjualan"]
+
+    total, lama, saldo = await piutang(client, jual["id_pembeli"])
+    assert saldo == nota
+    assert (total - awal_total, lama - awal_lama) == (nota, nota)
+
+    # Return atas nota Tempo mengurangi tagihan sebesar nilai return
+    retur = await kirim("/api/return", tanggal="2022-03-05", penjualan_id=jual["id"], tempe_10k_return=2)
+    total, _, saldo = await piutang(client, jual["id_pembeli"])
+    assert saldo == nota - retur["total_return"]
+    assert total - awal_total == saldo
+
+    # Dilunasi: pembeli keluar dari daftar debitur dan total kembali seperti semula
+    r = await client.patch(f"/api/penjualan/{jual['id']}/toggle-status")
+    assert r.status_code == 200, r.text
+    total, lama, saldo = await piutang(client, jual["id_pembeli"])
+    assert (total, lama, saldo) == (awal_total, awal_lama, 0)
@@ -0,0 +1,91 @@
+import mongomock.collection
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def buat_karyawan(client, *nama):
+    ids = []
+    for n in nama:
+        r = await client.post("/api/karyawan", json={"nama": n, "nomor": "0812", "gaji_harian": 50000})
+        assert r.status_code == 200, r.text
+        ids.append(r.json()["id"])
+    return ids
+
+
+async def buat_produksi(client, tanggal, pekerja):
+    r = await client.post("/api/produksi", json={"tanggal": tanggal, "kedelai_kg": 1, "pekerja": pekerja})
+    assert r.status_code == 200, r.text
+    return r.json()["id"]
+
+
+async def gaji_produksi(db, id_produksi):
+    docs = await db.gaji.find({"id_produksi": id_produksi}, {"_id": 0}).to_list(None)
+    return {g["id_karyawan"]: g for g in docs}
+
+
+async def test_pekerja_sudah_dibayar_tidak_dihapus(client, db):
+    ani, budi = await buat_karyawan(client, "Ani", "Budi")
+    pid = await buat_produksi(client, "2025-02-01", [ani, budi])
+    gaji = await gaji_produksi(db, pid)
+    r = await client.post("/api/gaji/bayar-batch", json={
+        "ids": [gaji[budi]["id"]], "total_nominal": 50000, "nama_karyawan": "Budi"
+    })
+    assert r.status_code == 200, r.text
+
+    # Budi di-uncheck, tapi gajinya sudah dibayar
+    r = await client.put(f"/api/produksi/{pid}", json={"tanggal": "2025-02-01", "kedelai_kg": 1, "pekerja": [ani]})
+    assert r.status_code == 200, r.text
+
+    gaji = await gaji_produksi(db, pid)
+    assert set(gaji) == {ani, budi}
+    assert gaji[budi]["status_bayar"] is True
+    assert r.json()["paid_karyawan_ids"] == [budi]
+    assert r.json()["jumlah_pekerja"] == 2
+
+
+async def test_pekerja_baru_dapat_gaji(client, db):
+    cici, dodi, eka = await buat_karyawan(client, "Cici", "Dodi", "Eka")
+    pid = await buat_produksi(client, "2025-02-02", [cici, dodi])
+
+    # Dodi (belum dibayar) dihapus, Eka ditambah, tanggal ikut pindah
+    r = await client.put(f"/api/produksi/{pid}", json={"tanggal": "2025-02-03", "kedelai_kg": 1, "pekerja": [cici, eka]})
+    assert r.status_code == 200, r.text
+
+    gaji = await gaji_produksi(db, pid)
+    assert set(gaji) == {cici, eka}
+    assert gaji[eka]["nominal"] == 0
+    assert gaji[eka]["status_bayar"] is False
+    assert {g["tanggal_produksi"] for g in gaji.values()} == {"2025-02-03"}
+
+
+async def test_response_sama_dengan_data_tersimpan(client, db, monkeypatch):
+    fani, gita, hadi = await buat_karyawan(client, "Fani", "Gita", "Hadi")
+    pid = await buat_produksi(client, "2025-02-04", [fani, gita])
+    gaji = await gaji_produksi(db, pid)
+    await client.post("/api/gaji/bayar-batch", json={
+        "ids": [gaji[gita]["id"]], "total_nominal": 50000, "nama_karyawan": "Gita"
+    })
+
+    # Hitung find() ke koleksi gaji selama PUT: hanya satu baca untuk diff
+    asli = mongomock.collection.Collection.find
+    baca_gaji = []
+
+    def find(self, *args, **kwargs):
+        if self.name == "gaji":
+            baca_gaji.append(args)
+        return asli(self, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "find", find)
+    r = await client.put(f"/api/produksi/{pid}", json={"tanggal": "2025-02-04", "kedelai_kg": 2, "pekerja": [fani, hadi]})
+    monkeypatch.undo()
+    assert r.status_code == 200, r.text
+    assert len(baca_gaji) == 1
+
+    body = r.json()
+    gaji = await gaji_produksi(db, pid)
+    karyawan = {k["id"]: k["nama"] for k in await db.karyawan.find({"id": {"$in": list(gaji)}}).to_list(None)}
+    assert body["jumlah_pekerja"] == len(gaji) == 3
+    assert sorted(body["nama_pekerja"]) == sorted(karyawan[kid] for kid in gaji)
+    assert body["paid_karyawan_ids"] == [kid for kid, g in gaji.items() if g["status_bayar"]] == [gita]
+    assert body["kedelai_kg"] == 2
@@ -0,0 +1,22 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_return_melebihi_sisa_ditolak(client, db, kirim):
+    jual = await kirim("/api/penjualan", tanggal="2021-06-01", pembeli="Return Lebih", kategori_pembeli="Eceran",
+                       tempe_3k_pcs=5, tempe_5k_pcs=2, status_pembayaran="Lunas")
+    await kirim("/api/return", tanggal="2021-06-02", penjualan_id=jual["id"], tempe_3k_return=3)
+
+    # Sisa 3k tinggal 2: return 3 ditolak meski di bawah jumlah terjual;
+    # satu SKU lebih sudah cukup untuk menolak seluruh return
+    for lebih in ({"tempe_3k_return": 3}, {"tempe_3k_return": 1, "tempe_5k_return": 3}):
+        r = await client.post("/api/return", json={"tanggal": "2021-06-02", "penjualan_id": jual["id"], **lebih})
+        assert r.status_code == 400, r.text
+        assert r.json()["detail"] == "Jumlah return melebihi sisa penjualan yang belum diretur"
+
+    # Yang ditolak tidak meninggalkan jejak; sisa pas masih diterima
+    await kirim("/api/return", tanggal="2021-06-02", penjualan_id=jual["id"], tempe_3k_return=2, tempe_5k_return=2)
+    doc = await db.penjualan.find_one({"id": jual["id"]}, {"_id": 0})
+    assert (doc["retur_3k_pcs"], doc["retur_5k_pcs"]) == (5, 2)
+    assert await db.return_penjualan.count_documents({"penjualan_id": jual["id"]}) == 2
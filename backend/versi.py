@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import inspect
+import logging
+import os
+import uuid
+from datetime import date
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Satu dokumen di koleksi `versi` berisi nomor versi per data (penjualan, stok, ...).
+# Endpoint tulis menaikkan versi data yang diubahnya, endpoint GET membaca dokumen ini
+# sekali untuk membuat ETag. Request ulang dengan If-None-Match yang cocok dijawab 304.
+ID_VERSI = "koleksi"
+
+# Nama versi (bukan selalu nama koleksi Mongo: "stok" = ledger stok_harian + stok_berjalan)
+SEMUA_VERSI = (
+    "penjualan", "return_penjualan", "produksi_harian", "gaji", "karyawan",
+    "pengeluaran", "stok", "piutang", "harga", "pembeli",
+)
+
+# Browser boleh menyimpan response tapi wajib tanya ulang (If-None-Match) setiap dipakai
+CACHE_CONTROL = "private, no-cache"
+
+# Interval cek dokumen versi (ms): batas lama cache worker lain tertinggal setelah penulisan
+VERSI_POLL_MS = int(os.environ.get('VERSI_POLL_MS', '500'))
+
+
+class PelacakVersi:
+    # Salinan terakhir dokumen versi yang dilihat proses ini + callback per nama versi.
+    # Setiap worker uvicorn punya pelacak sendiri; karena dokumen versi ada di Mongo,
+    # penulisan di worker mana pun terlihat di semua worker lewat:
+    #   - naikkan_versi (worker penulis, langsung),
+    #   - cek_etag (setiap GET yang memakai ETag sudah membaca dokumen versi),
+    #   - loop_pantau_versi (poll berkala untuk worker yang sedang sepi).
+    # Callback (mis. hapus cache, muat ulang tabel harga) dipanggil saat versi yang
+    # dipantaunya berubah. Pengamatan pertama dianggap semua berubah.
+    # hanya_worker_lain=True: dilewati untuk kenaikan versi oleh worker ini sendiri
+    # (mis. SSE, yang untuk penulisan lokal sudah dikirim sebagai delta lewat event bus).
+
+    def __init__(self):
+        self._terakhir: Optional[dict] = None
+        self._callback: List[Tuple[Tuple[str, ...], bool, Callable]] = []
+        self._lock = asyncio.Lock()
+
+    def saat_berubah(self, *nama: str, hanya_worker_lain: bool = False):
+        # Dekorator / fungsi: pelacak_versi.saat_berubah("harga")(fn). fn boleh sync atau async.
+        def daftar(fn: Callable) -> Callable:
+            self._callback.append((nama, hanya_worker_lain, fn))
+            return fn
+        return daftar
+
+    async def terima(self, versi: Optional[dict], lokal: bool = False):
+        if not versi:
+            return
+        async with self._lock:
+            lama = self._terakhir
+            if lama is not None:
+                if lama.get("epoch") != versi.get("epoch"):
+                    berubah = None
+                else:
+                    # Dokumen yang lebih lama (race antar request) tidak menimpa yang lebih baru
+                    berubah = {n for n in SEMUA_VERSI if versi.get(n, 0) > lama.get(n, 0)}
+                    if not berubah:
+                        return
+                    versi = {**lama, **{n: versi.get(n, 0) for n in berubah}}
+            else:
+                berubah = None
+            self._terakhir = versi
+            for nama, hanya_worker_lain, fn in self._callback:
+                if berubah is not None and berubah.isdisjoint(nama):
+                    continue
+                if lokal and hanya_worker_lain:
+                    continue
+                try:
+                    hasil = fn()
+                    if inspect.isawaitable(hasil):
+                        await hasil
+                except Exception:
+                    logger.exception("Callback versi %s gagal", getattr(fn, "__name__", fn))
+
+
+pelacak_versi = PelacakVersi()
+
+
+async def loop_pantau_versi(db):
+    while True:
+        await asyncio.sleep(VERSI_POLL_MS / 1000)
+        try:
+            await pelacak_versi.terima(await db.versi.find_one({"_id": ID_VERSI}))
+        except Exception:
+            logger.exception("Gagal membaca dokumen versi")
+
+
+async def naikkan_versi(db, *nama: str):
+    # Dipanggil SETELAH data tersimpan (di luar transaksi), jadi ETag baru tidak pernah
+    # menunjuk data lama. Epoch dibuat sekali: jika dokumen versi hilang/direset,
+    # ETag lama di browser tidak akan cocok lagi walau nomor versinya sama.
+    if not nama:
+        return
+    versi = await db.versi.find_one_and_update(
+        {"_id": ID_VERSI},
+        {"$inc": {n: 1 for n in set(nama)}, "$setOnInsert": {"epoch": uuid.uuid4().hex}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    # Cache di worker ini langsung dibersihkan, worker lain menyusul lewat poll/ETag
+    await pelacak_versi.terima(versi, lokal=True)
+
+
+def hitung_etag(request: Request, versi: dict, nama: Iterable[str], harian: bool = False) -> str:
+    # URL lengkap ikut di-hash: limit/cursor/filter berbeda = response berbeda.
+    # harian: isi response bergantung tanggal hari ini (periode berjalan, umur piutang).
+    bagian = [request.url.path, request.url.query, str(versi.get("epoch", ""))]
+    bagian += [f"{n}={versi.get(n, 0)}" for n in nama]
+    if harian:
+        bagian.append(date.today().isoformat())
+    return 'W/"' + hashlib.sha1("|".join(bagian).encode()).hexdigest()[:20] + '"'
+
+
+def cocok(if_none_match: Optional[str], etag: str) -> bool:
+    # Perbandingan lemah (RFC 9110): awalan W/ diabaikan
+    if not if_none_match:
+        return False
+    tag = etag.removeprefix("W/")
+    for t in if_none_match.split(","):
+        t = t.strip()
+        if t == "*" or t.removeprefix("W/") == tag:
+            return True
+    return False
+
+
+async def cek_etag(db, request: Request, response: Response, nama: Iterable[str], harian: bool = False):
+    # Satu baca dokumen versi. Cocok -> 304 tanpa body (query data tidak dijalankan),
+    # tidak cocok -> header ETag dipasang di response lalu endpoint jalan seperti biasa.
+    versi = await db.versi.find_one({"_id": ID_VERSI}) or {}
+    # Cache yang dipakai endpoint tidak boleh lebih tua dari versi di ETag ini
+    await pelacak_versi.terima(versi)
+    etag = hitung_etag(request, versi, nama, harian)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if cocok(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
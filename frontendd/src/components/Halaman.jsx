@@ -0,0 +1,39 @@
+import { Button } from '@/components/ui/button';
+import { Input } from '@/components/ui/input';
+import { Label } from '@/components/ui/label';
+
+// Filter rentang tanggal untuk list berhalaman (pasangan hook useHalaman)
+export function FilterTanggal({ rentang, setRentang }) {
+  const ubah = (field) => (e) => setRentang({ ...rentang, [field]: e.target.value });
+  const aktif = rentang.from || rentang.to;
+
+  return (
+    <div className="flex flex-wrap items-end gap-3 mb-4">
+      <div>
+        <Label htmlFor="filter-from" className="text-xs text-gray-500">Dari</Label>
+        <Input id="filter-from" type="date" value={rentang.from} max={rentang.to || undefined} onChange={ubah('from')} />
+      </div>
+      <div>
+        <Label htmlFor="filter-to" className="text-xs text-gray-500">Sampai</Label>
+        <Input id="filter-to" type="date" value={rentang.to} min={rentang.from || undefined} onChange={ubah('to')} />
+      </div>
+      {aktif && (
+        <Button type="button" variant="ghost" onClick={() => setRentang({ from: '', to: '' })}>
+          Semua tanggal
+        </Button>
+      )}
+    </div>
+  );
+}
+
+// Tombol halaman berikutnya, hanya tampil jika backend mengirim X-Next-Cursor
+export function MuatLagi({ adaLagi, loading, muatLagi }) {
+  if (!adaLagi) return null;
+  return (
+    <div className="flex justify-center mt-4">
+      <Button type="button" variant="outline" disabled={loading} onClick={() => muatLagi()}>
+        {loading ? 'Memuat...' : 'Muat data lebih lama'}
+      </Button>
+    </div>
+  );
+}
@@ -0,0 +1,51 @@
+import { useCallback, useEffect, useRef, useState } from "react";
+import axios from "axios";
+
+const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+const getToken = () => localStorage.getItem("token");
+
+// Ambil list dari endpoint berhalaman (GET /api/<path>?limit&cursor&from&to).
+// Backend mengirim header X-Next-Cursor jika masih ada data yang lebih lama;
+// muatLagi() mengambil halaman berikutnya dan menambahkannya di bawah list.
+// rentang = { from, to } (YYYY-MM-DD, kosong = tanpa batas), ubah lewat setRentang.
+export function useHalaman(path, { params } = {}) {
+  const [items, setItems] = useState([]);
+  const [cursor, setCursor] = useState(null);
+  const [loading, setLoading] = useState(false);
+  const [rentang, setRentang] = useState({ from: "", to: "" });
+  // Nomor request terakhir: response dari filter lama diabaikan
+  const nomorRef = useRef(0);
+  const paramsKey = JSON.stringify(params || {});
+
+  const muat = useCallback(async (lanjutDari) => {
+    const nomor = ++nomorRef.current;
+    setLoading(true);
+    try {
+      const query = { ...JSON.parse(paramsKey) };
+      if (rentang.from) query.from = rentang.from;
+      if (rentang.to) query.to = rentang.to;
+      if (lanjutDari) query.cursor = lanjutDari;
+      const response = await axios.get(`${API}/${path}`, {
+        headers: { Authorization: `Bearer ${getToken()}` },
+        params: query,
+      });
+      if (nomor !== nomorRef.current) return;
+      setItems((lama) => (lanjutDari ? [...lama, ...response.data] : response.data));
+      setCursor(response.headers["x-next-cursor"] || null);
+    } finally {
+      if (nomor === nomorRef.current) setLoading(false);
+    }
+  }, [path, paramsKey, rentang.from, rentang.to]);
+
+  // Halaman pertama dimuat ulang setiap filter berubah
+  const muatUlang = useCallback(() => muat(null), [muat]);
+  const muatLagi = useCallback(() => (cursor ? muat(cursor) : Promise.resolve()), [muat, cursor]);
+
+  useEffect(() => {
+    muatUlang().catch((error) => console.error(`Error fetching ${path}:`, error));
+  }, [muatUlang, path]);
+
+  return { items, setItems, adaLagi: Boolean(cursor), loading, rentang, setRentang, muatUlang, muatLagi };
+}
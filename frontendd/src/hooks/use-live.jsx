@@ -0,0 +1,77 @@
+import { useEffect, useRef } from "react";
+import axios from "axios";
+
+const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+const getToken = () => localStorage.getItem("token");
+
+// Jeda sebelum sambung ulang (sama dengan retry yang dikirim backend)
+const JEDA_SAMBUNG_ULANG_MS = 3000;
+
+// Berlangganan update realtime dari backend (Server-Sent Events, GET /api/live).
+// EventSource tidak bisa mengirim header, jadi setiap koneksi memakai tiket SSE
+// berumur pendek (POST /api/live/tiket), bukan token login.
+// handler.onDelta(list)      -> perubahan per tanggal: { tanggal, stok: {prod_3k, jual_5k, ...}, ringkasan: {...} }
+// handler.onMuatUlang(bagian) -> perubahan yang tidak bisa dikirim sebagai delta, ambil ulang data
+// handler.onSambungUlang()    -> koneksi tersambung lagi setelah putus, ambil ulang data
+export function useLive(handler) {
+  const handlerRef = useRef(handler);
+  handlerRef.current = handler;
+
+  useEffect(() => {
+    if (!getToken()) return undefined;
+
+    let source = null;
+    let timer = null;
+    let berhenti = false;
+    let pernahTersambung = false;
+
+    const jadwalkan = () => {
+      if (!berhenti) timer = setTimeout(sambung, JEDA_SAMBUNG_ULANG_MS);
+    };
+
+    const sambung = async () => {
+      let tiket;
+      try {
+        const response = await axios.post(`${API}/live/tiket`, null, {
+          headers: { Authorization: `Bearer ${getToken()}` },
+        });
+        tiket = response.data.tiket;
+      } catch (error) {
+        // Sudah logout / token tidak berlaku: berhenti, selain itu coba lagi
+        if (error.response?.status !== 401) jadwalkan();
+        return;
+      }
+      if (berhenti) return;
+
+      source = new EventSource(`${API}/live?tiket=${encodeURIComponent(tiket)}`);
+      source.addEventListener("halo", () => {
+        // "halo" pertama bersamaan dengan fetch awal halaman, yang berikutnya = sambung ulang
+        if (pernahTersambung) handlerRef.current.onSambungUlang?.();
+        pernahTersambung = true;
+      });
+      source.addEventListener("delta", (e) => {
+        handlerRef.current.onDelta?.(JSON.parse(e.data));
+      });
+      source.addEventListener("muat_ulang", (e) => {
+        handlerRef.current.onMuatUlang?.(JSON.parse(e.data).bagian);
+      });
+      // Tiket lama sudah kedaluwarsa: jangan biarkan EventSource sambung ulang sendiri
+      source.onerror = () => {
+        source.close();
+        jadwalkan();
+      };
+    };
+
+    sambung();
+    return () => {
+      berhenti = true;
+      clearTimeout(timer);
+      source?.close();
+    };
+  }, []);
+}
+
+// Tanggal hari ini (waktu lokal) dalam format YYYY-MM-DD, sama dengan tanggal dari backend
+export const hariIni = () => new Date().toLocaleDateString("sv-SE");
@@ -3,6 +3,7 @@ import axios from 'axios';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { BarChart, Bar, LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import { Package, ShoppingCart, Wallet, TrendingUp } from 'lucide-react';
+import { useLive, hariIni } from '@/hooks/use-live';
 
 const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -18,6 +19,47 @@ export default function Dashboard() {
     fetchData();
   }, []);
 
+  // Update realtime: angka hari ini & grafik laba harian ditambah delta dari server (tanpa polling)
+  const terapkanDelta = (list) => {
+    const today = hariIni();
+    for (const { tanggal, ringkasan } of list) {
+      if (!ringkasan) continue;
+      const produksi = ringkasan.total_produksi || 0;
+      const omzet = ringkasan.total_penjualan || 0;
+      const pengeluaran = ringkasan.total_pengeluaran || 0;
+
+      if (tanggal === today) {
+        setSummary((s) => s && {
+          ...s,
+          total_produksi_hari_ini: s.total_produksi_hari_ini + produksi,
+          total_penjualan_hari_ini: s.total_penjualan_hari_ini + omzet,
+          total_pengeluaran_hari_ini: s.total_pengeluaran_hari_ini + pengeluaran,
+          laba_hari_ini: s.laba_hari_ini + omzet - pengeluaran,
+        });
+      }
+      if (omzet || pengeluaran) {
+        setLaporanData((data) => {
+          if (!Array.isArray(data)) return data;
+          const ada = data.some((d) => d.tanggal === tanggal);
+          if (!ada && tanggal !== today) return data;
+          const baris = ada ? data : [...data, { tanggal, omzet: 0, pengeluaran: 0, laba: 0 }];
+          return baris.map((d) => d.tanggal !== tanggal ? d : {
+            ...d,
+            omzet: d.omzet + omzet,
+            pengeluaran: d.pengeluaran + pengeluaran,
+            laba: d.laba + omzet - pengeluaran,
+          });
+        });
+      }
+    }
+  };
+
+  useLive({
+    onDelta: terapkanDelta,
+    onMuatUlang: (bagian) => { if (bagian.includes('ringkasan')) fetchData(); },
+    onSambungUlang: fetchData,
+  });
+
   const fetchData = async () => {
     try {
       const [summaryRes, laporanRes] = await Promise.all([
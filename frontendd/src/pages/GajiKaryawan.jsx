@@ -1,4 +1,4 @@
-import { useState, useEffect, useMemo } from "react";
+import { useState, useMemo } from "react";
 import axios from "axios";
 import { Button } from "@/components/ui/button";
 import {
@@ -17,6 +17,8 @@ import {
   TableRow,
 } from "@/components/ui/table";
 import { toast } from "sonner";
+import { useHalaman } from "@/hooks/use-halaman";
+import { FilterTanggal, MuatLagi } from "@/components/Halaman";
 import { CheckCircle, CalendarDays, Clock, CheckCheck } from "lucide-react";
 
 const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
@@ -25,19 +27,13 @@ const API = `${BACKEND_URL}/api`;
 const getToken = () => localStorage.getItem("token");
 
 export default function GajiPage() {
-  const [gajiList, setGajiList] = useState([]);
+  const halaman = useHalaman("gaji");
+  const gajiList = halaman.items;
   const [loading, setLoading] = useState(false);
 
-  useEffect(() => {
-    fetchGaji();
-  }, []);
-
   const fetchGaji = async () => {
     try {
-      const response = await axios.get(`${API}/gaji`, {
-        headers: { Authorization: `Bearer ${getToken()}` },
-      });
-      setGajiList(response.data);
+      await halaman.muatUlang();
     } catch (error) {
       console.error("Error fetching gaji:", error);
       toast.error("Gagal mengambil data gaji");
@@ -230,6 +226,7 @@ export default function GajiPage() {
           <CardTitle>Rincian Gaji Harian (Verifikasi)</CardTitle>
         </CardHeader>
         <CardContent>
+          <FilterTanggal rentang={halaman.rentang} setRentang={halaman.setRentang} />
           <div className="overflow-x-auto">
             <Table>
               <TableHeader className="bg-slate-100">
@@ -329,6 +326,7 @@ export default function GajiPage() {
               </TableBody>
             </Table>
           </div>
+          <MuatLagi adaLagi={halaman.adaLagi} loading={halaman.loading} muatLagi={halaman.muatLagi} />
         </CardContent>
       </Card>
     </div>
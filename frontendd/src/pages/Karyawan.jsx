@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState } from "react";
 import axios from "axios";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
@@ -21,6 +21,8 @@ import {
 } from "@/components/ui/select";
 import { toast } from "sonner";
 import { Plus, Edit, User } from "lucide-react";
+import { useHalaman } from "@/hooks/use-halaman";
+import { MuatLagi } from "@/components/Halaman";
 
 const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -29,7 +31,9 @@ const getToken = () => localStorage.getItem("token");
 
 export default function KaryawanPage() {
   const [showForm, setShowForm] = useState(false);
-  const [karyawanList, setKaryawanList] = useState([]);
+  // Urut karyawan terbaru dulu; tanpa filter tanggal (rentang di backend = created_at)
+  const halaman = useHalaman("karyawan");
+  const karyawanList = halaman.items;
   const [loading, setLoading] = useState(false);
   const [editId, setEditId] = useState(null);
 
@@ -40,16 +44,9 @@ export default function KaryawanPage() {
     status_aktif: "true", // String agar kompatibel dengan Select
   });
 
-  useEffect(() => {
-    fetchKaryawan();
-  }, []);
-
   const fetchKaryawan = async () => {
     try {
-      const response = await axios.get(`${API}/karyawan`, {
-        headers: { Authorization: `Bearer ${getToken()}` },
-      });
-      setKaryawanList(response.data);
+      await halaman.muatUlang();
     } catch (error) {
       console.error("Error fetching karyawan:", error);
     }
@@ -309,6 +306,7 @@ export default function KaryawanPage() {
               </TableBody>
             </Table>
           </div>
+          <MuatLagi adaLagi={halaman.adaLagi} loading={halaman.loading} muatLagi={halaman.muatLagi} />
         </CardContent>
       </Card>
     </div>
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState } from 'react';
 import axios from 'axios';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
@@ -9,6 +9,8 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '@/components/ui/table';
 import { toast } from 'sonner';
 import { Plus } from 'lucide-react';
+import { useHalaman } from '@/hooks/use-halaman';
+import { FilterTanggal, MuatLagi } from '@/components/Halaman';
 
 const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -17,7 +19,8 @@ const getToken = () => localStorage.getItem('token');
 
 export default function Pengeluaran() {
   const [showForm, setShowForm] = useState(false);
-  const [pengeluaranList, setPengeluaranList] = useState([]);
+  const halaman = useHalaman('pengeluaran');
+  const pengeluaranList = halaman.items;
   const [loading, setLoading] = useState(false);
   const [formData, setFormData] = useState({
     tanggal: new Date().toISOString().split('T')[0],
@@ -26,16 +29,9 @@ export default function Pengeluaran() {
     keterangan: '',
   });
 
-  useEffect(() => {
-    fetchPengeluaran();
-  }, []);
-
   const fetchPengeluaran = async () => {
     try {
-      const response = await axios.get(`${API}/pengeluaran`, {
-        headers: { Authorization: `Bearer ${getToken()}` },
-      });
-      setPengeluaranList(response.data);
+      await halaman.muatUlang();
     } catch (error) {
       console.error('Error fetching pengeluaran:', error);
     }
@@ -230,6 +226,7 @@ export default function Pengeluaran() {
           <CardTitle>Daftar Pengeluaran</CardTitle>
         </CardHeader>
         <CardContent>
+          <FilterTanggal rentang={halaman.rentang} setRentang={halaman.setRentang} />
           <div className="overflow-x-auto">
             <Table>
               <TableHeader>
@@ -264,6 +261,7 @@ export default function Pengeluaran() {
               </TableBody>
             </Table>
           </div>
+          <MuatLagi adaLagi={halaman.adaLagi} loading={halaman.loading} muatLagi={halaman.muatLagi} />
         </CardContent>
       </Card>
     </div>
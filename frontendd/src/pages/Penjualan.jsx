@@ -21,6 +21,8 @@ import {
 } from "@/components/ui/table";
 import { toast } from "sonner";
 import { Plus } from "lucide-react";
+import { FilterTanggal, MuatLagi } from "@/components/Halaman";
+import { useHalaman } from "@/hooks/use-halaman";
 
 const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -29,7 +31,8 @@ const getToken = () => localStorage.getItem("token");
 
 export default function Penjualan() {
   const [showForm, setShowForm] = useState(false);
-  const [penjualanList, setPenjualanList] = useState([]);
+  const halaman = useHalaman("penjualan");
+  const penjualanList = halaman.items;
   const [riwayatList, setRiwayatList] = useState([]);
   
   const [loading, setLoading] = useState(false);
@@ -51,11 +54,14 @@ export default function Penjualan() {
     status_pembayaran: "Lunas",
   });
 
+  // Saran nama pembeli (autocomplete dari master pembeli)
+  const [saranPembeli, setSaranPembeli] = useState([]);
+
   // State untuk harga aktif (untuk preview UI)
   const [prices, setPrices] = useState({ p3k: 3000, p5k: 5000, p10k: 10000 });
 
+  // Riwayat penjualan dimuat oleh useHalaman
   useEffect(() => {
-    fetchPenjualan();
     fetchProduksiOptions();
     fetchRiwayatStok(); // Ambil data riwayat stok saat load
   }, []);
@@ -95,12 +101,26 @@ export default function Penjualan() {
     }
   };
 
-  const fetchPenjualan = async () => {
+  const handlePembeliChange = async (nama) => {
+    setFormData((prev) => ({ ...prev, pembeli: nama }));
+    if (!nama.trim()) {
+      setSaranPembeli([]);
+      return;
+    }
     try {
-      const response = await axios.get(`${API}/penjualan`, {
+      const response = await axios.get(`${API}/pembeli`, {
         headers: { Authorization: `Bearer ${getToken()}` },
+        params: { q: nama, limit: 10 },
       });
-      setPenjualanList(response.data);
+      setSaranPembeli(response.data);
+    } catch (error) {
+      console.error("Gagal ambil saran pembeli:", error);
+    }
+  };
+
+  const fetchPenjualan = async () => {
+    try {
+      await halaman.muatUlang();
     } catch (error) {
       console.error("Error fetching penjualan:", error);
     }
@@ -309,12 +329,17 @@ export default function Penjualan() {
                     id="pembeli"
                     type="text"
                     placeholder="Masukkan nama pembeli"
+                    list="daftar-pembeli"
+                    autoComplete="off"
                     value={formData.pembeli}
-                    onChange={(e) =>
-                      setFormData({ ...formData, pembeli: e.target.value })
-                    }
+                    onChange={(e) => handlePembeliChange(e.target.value)}
                     required
                   />
+                  <datalist id="daftar-pembeli">
+                    {saranPembeli.map((p) => (
+                      <option key={p.id} value={p.nama} />
+                    ))}
+                  </datalist>
                 </div>
 
                 <div>
@@ -485,6 +510,7 @@ export default function Penjualan() {
           <CardTitle>Riwayat Penjualan</CardTitle>
         </CardHeader>
         <CardContent>
+          <FilterTanggal rentang={halaman.rentang} setRentang={halaman.setRentang} />
           <div className="overflow-x-auto">
             <Table>
               <TableHeader>
@@ -564,6 +590,7 @@ export default function Penjualan() {
               </TableBody>
             </Table>
           </div>
+          <MuatLagi adaLagi={halaman.adaLagi} loading={halaman.loading} muatLagi={halaman.muatLagi} />
         </CardContent>
       </Card>
     </div>
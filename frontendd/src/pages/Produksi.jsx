@@ -15,6 +15,8 @@ import {
 import { toast } from "sonner";
 import { Plus, Edit, AlertTriangle, X, Check } from "lucide-react";
 import { Checkbox } from "@/components/ui/checkbox";
+import { FilterTanggal, MuatLagi } from "@/components/Halaman";
+import { useHalaman } from "@/hooks/use-halaman";
 
 const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -23,7 +25,8 @@ const getToken = () => localStorage.getItem("token");
 
 export default function ProduksiPage() {
   const [showForm, setShowForm] = useState(false);
-  const [produksiList, setProduksiList] = useState([]);
+  const halaman = useHalaman("produksi");
+  const produksiList = halaman.items;
   const [karyawanList, setKaryawanList] = useState([]);
   const [lockedWorkers, setLockedWorkers] = useState([]);
   const [loading, setLoading] = useState(false);
@@ -44,8 +47,8 @@ export default function ProduksiPage() {
     tempe_10k_produksi: 0,
   });
 
+  // List produksi dimuat oleh useHalaman, karyawan aktif untuk form
   useEffect(() => {
-    fetchProduksi();
     fetchKaryawan();
   }, []);
 
@@ -78,10 +81,7 @@ export default function ProduksiPage() {
   };
   const fetchProduksi = async () => {
     try {
-      const response = await axios.get(`${API}/produksi`, {
-        headers: { Authorization: `Bearer ${getToken()}` },
-      });
-      setProduksiList(response.data);
+      await halaman.muatUlang();
     } catch (error) {
       console.error("Error fetching produksi:", error);
     }
@@ -428,6 +428,7 @@ export default function ProduksiPage() {
           <CardTitle>Daftar Produksi</CardTitle>
         </CardHeader>
         <CardContent>
+          <FilterTanggal rentang={halaman.rentang} setRentang={halaman.setRentang} />
           <div className="overflow-x-auto">
             <Table>
               <TableHeader>
@@ -546,6 +547,7 @@ export default function ProduksiPage() {
               </TableBody>
             </Table>
           </div>
+          <MuatLagi adaLagi={halaman.adaLagi} loading={halaman.loading} muatLagi={halaman.muatLagi} />
         </CardContent>
       </Card>
 
@@ -9,6 +9,8 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '@/components/ui/table';
 import { toast } from 'sonner';
 import { Plus } from 'lucide-react';
+import { FilterTanggal, MuatLagi } from '@/components/Halaman';
+import { useHalaman } from '@/hooks/use-halaman';
 
 const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -17,7 +19,8 @@ const getToken = () => localStorage.getItem('token');
 
 export default function ReturnPage() {
   const [showForm, setShowForm] = useState(false);
-  const [returnList, setReturnList] = useState([]);
+  const halaman = useHalaman('return');
+  const returnList = halaman.items;
   const [penjualanList, setPenjualanList] = useState([]);
   const [loading, setLoading] = useState(false);
   const [formData, setFormData] = useState({
@@ -29,22 +32,25 @@ export default function ReturnPage() {
     keterangan: '',
   });
 
+  // Daftar return dimuat oleh useHalaman, penjualan untuk pilihan di form
   useEffect(() => {
-    fetchData();
+    fetchPenjualan();
   }, []);
 
+  const fetchPenjualan = async () => {
+    try {
+      const response = await axios.get(`${API}/penjualan`, {
+        headers: { Authorization: `Bearer ${getToken()}` },
+      });
+      setPenjualanList(response.data);
+    } catch (error) {
+      console.error('Error fetching penjualan:', error);
+    }
+  };
+
   const fetchData = async () => {
     try {
-      const [returnRes, penjualanRes] = await Promise.all([
-        axios.get(`${API}/return`, {
-          headers: { Authorization: `Bearer ${getToken()}` },
-        }),
-        axios.get(`${API}/penjualan`, {
-          headers: { Authorization: `Bearer ${getToken()}` },
-        }),
-      ]);
-      setReturnList(returnRes.data);
-      setPenjualanList(penjualanRes.data);
+      await Promise.all([halaman.muatUlang(), fetchPenjualan()]);
     } catch (error) {
       console.error('Error fetching data:', error);
     }
@@ -245,6 +251,7 @@ export default function ReturnPage() {
           <CardTitle>Daftar Return</CardTitle>
         </CardHeader>
         <CardContent>
+          <FilterTanggal rentang={halaman.rentang} setRentang={halaman.setRentang} />
           <div className="overflow-x-auto">
             <Table>
               <TableHeader>
@@ -298,6 +305,7 @@ export default function ReturnPage() {
               </TableBody>
             </Table>
           </div>
+          <MuatLagi adaLagi={halaman.adaLagi} loading={halaman.loading} muatLagi={halaman.muatLagi} />
         </CardContent>
       </Card>
     </div>
@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import axios from "axios";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
@@ -20,6 +20,7 @@ import {
   ArrowUp,
 } from "lucide-react";
 import { toast } from "sonner";
+import { useLive } from "@/hooks/use-live";
 
 const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -44,6 +45,58 @@ export default function StokPage() {
     fetchData();
   }, []);
 
+  // Update realtime dari server: counter ledger per tanggal ditambahkan ke baris tabel & card
+  const SKUS = ["3k", "5k", "10k"];
+  const riwayatRef = useRef(riwayatList);
+  riwayatRef.current = riwayatList;
+
+  const terapkanDelta = (list) => {
+    for (const { tanggal, stok } of list) {
+      if (!stok) continue;
+      const n = (jenis, sku) => stok[`${jenis}_${sku}`] || 0;
+      const net = Object.fromEntries(
+        SKUS.map((sku) => [sku, n("prod", sku) + n("ret", sku) - n("jual", sku)])
+      );
+
+      setRiwayatList((list) => {
+        const ada = list.find((d) => d.tanggal === tanggal);
+        const baris = ada || Object.fromEntries([
+          ["tanggal", tanggal],
+          ["stat_exp", false],
+          ...SKUS.flatMap((sku) => ["prod", "sell", "res", "rsk", "sisa"].map((k) => [`${k}_stok_${sku}`, 0])),
+        ]);
+        const baru = { ...baris };
+        for (const sku of SKUS) {
+          baru[`prod_stok_${sku}`] += n("prod", sku);
+          baru[`sell_stok_${sku}`] += n("jual", sku);
+          baru[`res_stok_${sku}`] += n("ret", sku);
+          baru[`sisa_stok_${sku}`] += net[sku];
+        }
+        const hasil = ada ? list.map((d) => (d === ada ? baru : d)) : [baru, ...list];
+        return hasil.sort((a, b) => b.tanggal.localeCompare(a.tanggal));
+      });
+
+      // Hari yang sudah expired tidak dihitung di stok berjalan
+      const hari = riwayatRef.current.find((d) => d.tanggal === tanggal);
+      if (!hari?.stat_exp) {
+        setStokTotal((s) => ({
+          ...s,
+          stok_3k: s.stok_3k + net["3k"],
+          stok_5k: s.stok_5k + net["5k"],
+          stok_10k: s.stok_10k + net["10k"],
+          total_pcs: s.total_pcs + net["3k"] + net["5k"] + net["10k"],
+          last_updated: new Date().toISOString(),
+        }));
+      }
+    }
+  };
+
+  useLive({
+    onDelta: terapkanDelta,
+    onMuatUlang: (bagian) => { if (bagian.includes("stok")) fetchData(); },
+    onSambungUlang: fetchData,
+  });
+
   const fetchData = async () => {
     setLoading(true);
     try {